@@ -3,6 +3,88 @@
 import { exec } from 'child_process';
 import path from 'path';
 
+// URL of the warm worker started with `python scripts/generate_candidate.py --serve`.
+// Without it, or when it cannot be reached, the script is executed per request.
+const WORKER_URL = process.env.KG_WORKER_URL;
+const WORKER_TIMEOUT_MS = 120000;
+const POLL_INTERVAL_MS = 500;
+
+class WorkerError extends Error {
+  constructor(message, status) {
+    super(message);
+    this.status = status;
+  }
+}
+
+// Returns the job in a worker response, or throws a WorkerError for an error response
+async function readJob(response) {
+  if (response.ok) {
+    return response.json();
+  }
+  if (response.status === 503) {
+    throw new WorkerError('Candidate worker is busy, try again later', 503);
+  }
+  const body = await response.json().catch(() => ({}));
+  throw new WorkerError(body.error || `Candidate worker returned ${response.status}`, response.status);
+}
+
+// Runs the job on the worker. Returns false if the worker is unreachable.
+async function generateWithWorker(batchDirectory) {
+  const deadline = Date.now() + WORKER_TIMEOUT_MS;
+  let response;
+  try {
+    response = await fetch(`${WORKER_URL}/jobs?wait=${WORKER_TIMEOUT_MS / 1000}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ batchDirectory }),
+      signal: AbortSignal.timeout(WORKER_TIMEOUT_MS + 5000),
+    });
+  } catch (error) {
+    console.error(`Candidate worker unreachable, falling back to exec: ${error.message}`);
+    return false;
+  }
+
+  let job = await readJob(response);
+
+  // Poll when the job was still running when the worker stopped waiting
+  while (job.status === 'queued' || job.status === 'running') {
+    if (Date.now() > deadline) {
+      throw new WorkerError(`Candidate job ${job.id} timed out`, 504);
+    }
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    job = await readJob(await fetch(`${WORKER_URL}/jobs/${job.id}`));
+  }
+  if (job.status === 'failed') {
+    throw new WorkerError(job.error, 500);
+  }
+  console.log(`Candidate job ${job.id} finished in ${(job.finishedAt - job.startedAt).toFixed(3)}s`);
+  return true;
+}
+
+function generateWithExec(batchDirectory) {
+  // Define the command to execute the Python script
+  // Adjust the script path and arguments as needed
+  const scriptPath = path.join(process.cwd(), 'scripts', 'generate_candidate.py');
+  const command = `python "${scriptPath}" "${batchDirectory}"`;
+
+  return new Promise((resolve, reject) => {
+    exec(command, (error, stdout, stderr) => {
+      if (error) {
+        console.error(`Error executing Python script: ${error.message}`);
+        reject(error);
+        return;
+      }
+      if (stderr) {
+        console.error(`Python script stderr: ${stderr}`);
+      }
+      console.log(`Python script stdout: ${stdout}`);
+
+      // Resolve the promise when execution is successful
+      resolve();
+    });
+  });
+}
+
 export default async function handler(req, res) {
   if (req.method === 'POST') {
     const { projectId, batchId } = req.body;
@@ -30,34 +112,20 @@ export default async function handler(req, res) {
 
     console.log(`processing ${batchId}`)
 
-    // Define the command to execute the Python script
-    // Adjust the script path and arguments as needed
-    const scriptPath = path.join(process.cwd(), 'scripts', 'generate_candidate.py');
-    const command = `python "${scriptPath}" "${batchDirectory}"`;
-
     try {
-      await new Promise((resolve, reject) => {
-        exec(command, (error, stdout, stderr) => {
-          if (error) {
-            console.error(`Error executing Python script: ${error.message}`);
-            reject(error);
-            return;
-          }
-          if (stderr) {
-            console.error(`Python script stderr: ${stderr}`);
-          }
-          console.log(`Python script stdout: ${stdout}`);
-
-          // Resolve the promise when execution is successful
-          resolve();
-        });
-      });
-
-      // Send a success response after the script has executed
+      const handled = WORKER_URL ? await generateWithWorker(batchDirectory) : false;
+      if (!handled) {
+        await generateWithExec(batchDirectory);
+      }
+
+      // Send a success response after the candidate has been generated
       return res.status(200).json({ success: true });
     } catch (error) {
-      console.error(`Error executing Python script: ${error.message}`);
-      return res.status(500).json({ success: false, error: error.message });
+      console.error(`Error generating candidate graph: ${error.message}`);
+      if (error.status === 503) {
+        res.setHeader('Retry-After', '5');
+      }
+      return res.status(error.status || 500).json({ success: false, error: error.message });
     }
   } else {
     res.setHeader('Allow', ['POST']);
@@ -5,9 +5,82 @@ import path from 'path';
 import { read } from 'graphlib-dot';
 import { graphlibToVis } from '../../utils/graphlibToVis';
 
+// Render snapshot written next to kg_candidate.dot by kg_merger.render_snapshot
+const SNAPSHOT_DIRECTORY = 'snapshot';
+
+// Returns the snapshot manifest if it was built from the current kg_candidate.dot, otherwise null
+function readFreshManifest(snapshotDirectory, dotPath) {
+  const manifestPath = path.join(snapshotDirectory, 'manifest.json');
+  if (!fs.existsSync(manifestPath)) {
+    return null;
+  }
+  try {
+    const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+    const stat = fs.statSync(dotPath, { bigint: true });
+    const source = manifest.source;
+    if (!source || String(stat.size) !== String(source.size) || String(stat.mtimeNs) !== source.mtime_ns) {
+      return null;
+    }
+    return manifest;
+  } catch (error) {
+    console.error('Ignoring unreadable render snapshot:', error);
+    return null;
+  }
+}
+
+// Answers with 304 when the client already has this version
+function notModified(req, res, etag) {
+  res.setHeader('ETag', `"${etag}"`);
+  const ifNoneMatch = req.headers['if-none-match'];
+  if (ifNoneMatch && ifNoneMatch.split(',').map((tag) => tag.trim()).includes(`"${etag}"`)) {
+    res.status(304).end();
+    return true;
+  }
+  return false;
+}
+
+// Serves the snapshot:
+//   ?part=manifest  the manifest, revalidated on every use
+//   ?chunk=<etag>   one chunk of this or the previous snapshot, which clients that fetched the
+//                   previous manifest may still be loading; chunks are immutable, so they are
+//                   cached for a year
+//   otherwise       the whole graph assembled from the chunks, in the same shape as before
+function serveSnapshot(req, res, snapshotDirectory, manifest) {
+  const { part, chunk } = req.query;
+
+  if (chunk) {
+    const entry = [...manifest.chunks, ...(manifest.previous_chunks || [])].find((candidate) => candidate.etag === chunk);
+    if (!entry) {
+      return res.status(404).json({ success: false, error: 'Unknown chunk' });
+    }
+    res.setHeader('Cache-Control', 'public, max-age=31536000, immutable');
+    if (notModified(req, res, entry.etag)) {
+      return;
+    }
+    res.setHeader('Content-Type', 'application/json');
+    return res.status(200).send(fs.readFileSync(path.join(snapshotDirectory, entry.file)));
+  }
+
+  res.setHeader('Cache-Control', 'private, no-cache');
+  if (notModified(req, res, manifest.etag)) {
+    return;
+  }
+  if (part === 'manifest') {
+    return res.status(200).json({ success: true, manifest });
+  }
+
+  const kgCandidateData = { nodes: [], edges: [] };
+  manifest.chunks.forEach((entry) => {
+    const data = JSON.parse(fs.readFileSync(path.join(snapshotDirectory, entry.file), 'utf8'));
+    kgCandidateData.nodes.push(...data.nodes);
+    kgCandidateData.edges.push(...data.edges);
+  });
+  return res.status(200).json({ success: true, kgCandidateData });
+}
+
 export default function handler(req, res) {
   if (req.method === 'GET') {
-    const { projectId, batchId } = req.query;
+    const { projectId, batchId, chunk } = req.query;
 
      // Validate inputs
      if (!projectId || !batchId) {
@@ -18,6 +91,9 @@ export default function handler(req, res) {
     if (!/^[a-zA-Z0-9_-]+$/.test(projectId) || !/^[a-zA-Z0-9_-]+$/.test(batchId)) {
       return res.status(400).json({ success: false, error: 'Invalid projectId or batchId' });
     }
+    if (chunk && !/^[0-9a-f]+$/.test(chunk)) {
+      return res.status(400).json({ success: false, error: 'Invalid chunk' });
+    }
 
     const batchDirectory = path.join(
       process.cwd(),
@@ -31,26 +107,49 @@ export default function handler(req, res) {
 
     const kgCandidateDotPath = path.join(batchDirectory, 'kg_candidate.dot');
 
+    if (!fs.existsSync(kgCandidateDotPath)) {
+      return res.status(404).json({ success: false, error: 'kg_candidate.dot not found' });
+    }
+
+    // Serve the precompiled snapshot when it matches kg_candidate.dot
+    const snapshotDirectory = path.join(batchDirectory, SNAPSHOT_DIRECTORY);
+    const manifest = readFreshManifest(snapshotDirectory, kgCandidateDotPath);
+    if (manifest) {
+      try {
+        return serveSnapshot(req, res, snapshotDirectory, manifest);
+      } catch (error) {
+        if (req.query.part || chunk) {
+          // Only the whole graph can be parsed from kg_candidate.dot instead; a missing chunk is
+          // gone for good, anything else (e.g. a snapshot being rewritten) is worth a retry
+          console.error('Error reading the render snapshot:', error);
+          res.setHeader('Cache-Control', 'no-store');
+          res.removeHeader('ETag');
+          return error.code === 'ENOENT'
+            ? res.status(404).json({ success: false, error: 'Render snapshot chunk not found' })
+            : res.status(503).json({ success: false, error: 'Render snapshot unavailable' });
+        }
+        console.error('Error reading the render snapshot, parsing kg_candidate.dot instead:', error);
+      }
+    } else if (req.query.part || chunk) {
+      return res.status(404).json({ success: false, error: 'No render snapshot for kg_candidate.dot' });
+    }
+
     // Set headers to prevent caching
     res.setHeader('Cache-Control', 'no-store, no-cache, must-revalidate, proxy-revalidate');
     res.setHeader('Pragma', 'no-cache');
     res.setHeader('Expires', '0');
     res.setHeader('Surrogate-Control', 'no-store');
-    
-    // Check if kg_candidate.dot exists
-    if (fs.existsSync(kgCandidateDotPath)) {
-      try {
-        const kgCandidateDotContent = fs.readFileSync(kgCandidateDotPath, 'utf8');
-        const kgCandidateGraph = read(kgCandidateDotContent);
-        const kgCandidateData = graphlibToVis(kgCandidateGraph);
+    res.removeHeader('ETag');
 
-        return res.status(200).json({ success: true, kgCandidateData });
-      } catch (error) {
-        console.error('Error reading kg_candidate.dot:', error);
-        return res.status(500).json({ success: false, error: 'Failed to read kg_candidate.dot' });
-      }
-    } else {
-      return res.status(404).json({ success: false, error: 'kg_candidate.dot not found' });
+    try {
+      const kgCandidateDotContent = fs.readFileSync(kgCandidateDotPath, 'utf8');
+      const kgCandidateGraph = read(kgCandidateDotContent);
+      const kgCandidateData = graphlibToVis(kgCandidateGraph);
+
+      return res.status(200).json({ success: true, kgCandidateData });
+    } catch (error) {
+      console.error('Error reading kg_candidate.dot:', error);
+      return res.status(500).json({ success: false, error: 'Failed to read kg_candidate.dot' });
     }
   } else {
     res.setHeader('Allow', ['GET']);
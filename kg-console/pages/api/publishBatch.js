@@ -3,7 +3,7 @@
 import fs from 'fs';
 import path from 'path';
 import { Graph } from 'graphlib';
-import { write } from 'graphlib-dot';
+import { read, write } from 'graphlib-dot';
 
 const { exec } = require('child_process'); // for executing git commands
 
@@ -28,6 +28,7 @@ export default function handler(req, res) {
     );
 
     const metadataPath = path.join(batchDirectory, 'metadata.json');
+    const candidateStatsPath = path.join(batchDirectory, 'kg_candidate_stats.json');
     const kgPublishedDotPath = path.join(projectsDirectory, 'merged_graph.dot');
 
     try {
@@ -40,17 +41,53 @@ export default function handler(req, res) {
 
       fs.writeFileSync(metadataPath, JSON.stringify(metadata, null, 2));
 
-      // Convert kgCandidateDataState back to graphlib graph
-      const graph = new Graph({ directed: true });
-
-      // Add nodes
+      // The candidate is a delta against the published graph, so lay it over the published graph
+      const graph = fs.existsSync(kgPublishedDotPath)
+        ? read(fs.readFileSync(kgPublishedDotPath, 'utf8'))
+        : new Graph({ directed: true, multigraph: true });
+
+      // How the candidate matched its edges to published ones (kg_merger.candidate.PublishedGraph)
+      const edgeMerge = fs.existsSync(candidateStatsPath)
+        ? JSON.parse(fs.readFileSync(candidateStatsPath, 'utf8')).edge_merge || 'first'
+        : 'first';
+
+      // Drop the review annotations added by generate_candidate.py and the render attributes
+      // of the snapshot served by getGraphData (kg_merger.render_snapshot.RENDER_ATTRIBUTES)
+      const renderAttributes = ['x', 'y', 'rank', 'cluster'];
+      const withoutReviewAttributes = (data) =>
+        Object.fromEntries(
+          Object.entries(data).filter(
+            ([key]) => key !== 'status' && !key.startsWith('added_') && !renderAttributes.includes(key)
+          )
+        );
+
+      // Add or update nodes
       kgCandidateDataState.nodes.forEach((node) => {
-        graph.setNode(node.id, node);
+        graph.setNode(node.id, { ...(graph.node(node.id) || {}), ...withoutReviewAttributes(node) });
       });
 
-      // Add edges
+      // Replace updated edges, whose attributes already include the published values, and add
+      // new edges next to any published edges between the same nodes. With edge_merge 'label' an
+      // updated edge replaces the published edge with the same label, otherwise the first one.
+      const newEdgeName = (from, to) => {
+        let i = (graph.outEdges(from, to) || []).length;
+        while (graph.hasEdge(from, to, `edge${i}`)) {
+          i += 1;
+        }
+        return `edge${i}`;
+      };
       kgCandidateDataState.edges.forEach((edge) => {
-        graph.setEdge(edge.from, edge.to, edge);
+        const value = withoutReviewAttributes(edge);
+        const existing = edge.status === 'updated'
+          ? (graph.outEdges(edge.from, edge.to) || []).find(
+              (published) => edgeMerge !== 'label' || (graph.edge(published) || {}).label === value.label
+            )
+          : undefined;
+        if (existing) {
+          graph.setEdge(existing, value);
+        } else {
+          graph.setEdge(edge.from, edge.to, value, graph.isMultigraph() ? newEdgeName(edge.from, edge.to) : undefined);
+        }
       });
 
       // Convert graphlib graph to DOT format
@@ -1,39 +1,294 @@
 # scripts/generate_candidate.py
+"""
+Generates kg_candidate.dot for a batch: the delta of the batch's extracted graphs against the
+published merged_graph.dot (see kg_merger.candidate), with statistics in kg_candidate_stats.json.
 
-import sys
+One-off:
+    python generate_candidate.py <batch_directory>
+
+As a warm local worker (used by pages/api/generateCandidateGraph.js through KG_WORKER_URL):
+    python generate_candidate.py --serve [--host 127.0.0.1] [--port 8765] [--workers 2] [--queue-size 16]
+
+    POST /jobs                {"batchDirectory": "..."}  -> 202 {"id", "status", ...}, 503 if the queue is full
+    POST /jobs?wait=<seconds> same, but waits for the job (at most MAX_WAIT seconds) and returns 200
+                              when it has finished; 400 if wait is not a number of seconds
+    GET  /jobs/<id>           job status: queued, running, done or failed
+    GET  /health              worker and queue status
+"""
+
+import argparse
+import itertools
+import json
+import math
 import os
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python generate_candidate.py <batch_directory>")
-        sys.exit(1)
+try:
+    from kg_merger.candidate import PublishedGraph, generate_candidate
+except ImportError:
+    # Use the kg-merger package next to the console when it is not installed
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'kg-merger'))
+    from kg_merger.candidate import PublishedGraph, generate_candidate
 
-    batch_directory = sys.argv[1]
+DEFAULT_PORT = 8765
+MAX_FINISHED_JOBS = 1000
+MAX_WAIT = 300
 
-    # Ensure the batch directory exists
-    if not os.path.isdir(batch_directory):
-        print(f"Error: Batch directory '{batch_directory}' does not exist.")
-        sys.exit(1)
 
-    # Define the graph data
-    graph_content = """
-    digraph G {
-        node1 [label="Node 1"];
-        node2 [label="Node 2"];
-        node3 [label="Node 3"];
-
-        node1 -> node2 [label="Edge from Node 1 to Node 2"];
-        node2 -> node3 [label="Edge from Node 2 to Node 3"];
-        node3 -> node1 [label="Edge from Node 3 to Node 1"];
-    }
+class CandidateGenerator:
+    """
+    Generates the candidate graph of a batch. One instance is shared by all jobs of a worker,
+    so the synonym dictionary and the index of the published merged graph stay loaded between
+    requests; the index is rebuilt only when merged_graph.dot changes.
+    """
+
+    def __init__(self, published_path=None, synonyms=None, separator='___', edge_merge='first', id_scheme=None):
+        self.published_path = published_path
+        self.separator = separator
+        self.edge_merge = edge_merge
+        self.id_scheme = id_scheme
+        self.label_normalizer = None
+        if synonyms:
+            from kg_merger.synonym_dictionary import compile_dictionary, load_dictionary
+
+            self.label_normalizer = compile_dictionary(load_dictionary(synonyms)).canonicalizer()
+        self.lock = threading.Lock()
+        self.published_graphs = {}
+
+    def published(self, path):
+        signature = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        with self.lock:
+            cached = self.published_graphs.get(path)
+            if cached is None or cached[0] != signature:
+                published = PublishedGraph.load(path, self.separator, self.label_normalizer, self.edge_merge, self.id_scheme)
+                cached = self.published_graphs[path] = (signature, published)
+            return cached[1]
+
+    def generate(self, batch_directory):
+        # Ensure the batch directory exists
+        if not os.path.isdir(batch_directory):
+            raise FileNotFoundError(f"Batch directory '{batch_directory}' does not exist.")
+
+        # public/static/project/<projectId>/batches/<batchId> -> public/static/project/merged_graph.dot
+        published_path = self.published_path or os.path.join(batch_directory, '..', '..', '..', 'merged_graph.dot')
+        return generate_candidate(batch_directory, self.published(os.path.realpath(published_path)), self.label_normalizer)
+
+
+class Job:
+    def __init__(self, job_id, batch_directory):
+        self.id = job_id
+        self.batch_directory = batch_directory
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'batchDirectory': self.batch_directory,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded job queue processed by a fixed number of worker threads. Jobs of the same batch
+    run one at a time.
     """
 
-    # Write the graph data to kg_candidate.dot
-    kg_candidate_path = os.path.join(batch_directory, 'kg_candidate.dot')
-    with open(kg_candidate_path, 'w') as f:
-        f.write(graph_content)
+    def __init__(self, generator, workers=2, queue_size=16):
+        self.generator = generator
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.batch_locks = {}
+        self.ids = itertools.count(1)
+        self.threads = [
+            threading.Thread(target=self._work, name=f'candidate-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, batch_directory):
+        """
+        Queues a job, or raises queue.Full if the queue is at capacity.
+        """
+        with self.lock:
+            job = Job(str(next(self.ids)), batch_directory)
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.finished.is_set()]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    def _batch_lock(self, batch_directory):
+        with self.lock:
+            return self.batch_locks.setdefault(os.path.realpath(batch_directory), threading.Lock())
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            with self._batch_lock(job.batch_directory):
+                job.status = 'running'
+                job.started_at = time.time()
+                try:
+                    job.result = self.generator.generate(job.batch_directory)
+                    job.status = 'done'
+                except Exception as e:
+                    job.error = str(e)
+                    job.status = 'failed'
+                    print(f"Job {job.id} for '{job.batch_directory}' failed: {e}", file=sys.stderr)
+                job.finished_at = time.time()
+                job.finished.set()
+            self.queue.task_done()
+
+    def health(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            'workers': len(self.threads),
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'running': statuses.count('running'),
+        }
+
+
+def parse_wait(query):
+    """
+    Returns the ?wait= timeout in seconds, clamped to MAX_WAIT, or None if there is none.
+    Raises ValueError if it is not a non-negative number.
+    """
+    values = parse_qs(query).get('wait')
+    if not values:
+        return None
+    wait = float(values[0])
+    if not math.isfinite(wait) or wait < 0:
+        raise ValueError(f"Invalid wait '{values[0]}'.")
+    return min(wait, MAX_WAIT)
+
+
+def make_handler(jobs, root=None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/health':
+                return self._send(200, jobs.health())
+            if path.startswith('/jobs/'):
+                job = jobs.get(path[len('/jobs/'):])
+                if job is None:
+                    return self._send(404, {'error': 'Unknown job'})
+                return self._send(200, job.to_dict())
+            return self._send(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/jobs':
+                return self._send(404, {'error': 'Not found'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                batch_directory = os.path.realpath(body['batchDirectory'])
+            except (ValueError, KeyError, TypeError):
+                return self._send(400, {'error': 'Expected a JSON body with batchDirectory'})
+            if root is not None and os.path.commonpath([root, batch_directory]) != root:
+                return self._send(400, {'error': 'Batch directory is outside the worker root'})
+            try:
+                wait = parse_wait(url.query)
+            except ValueError:
+                return self._send(400, {'error': 'wait must be a non-negative number of seconds'})
+
+            try:
+                job = jobs.submit(batch_directory)
+            except queue.Full:
+                return self._send(503, {'error': 'Job queue is full'})
+
+            if wait is not None and job.finished.wait(wait):
+                return self._send(200, job.to_dict())
+            return self._send(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+    return Handler
+
+
+def serve(generator, host='127.0.0.1', port=DEFAULT_PORT, workers=2, queue_size=16, root=None):
+    jobs = JobQueue(generator, workers=workers, queue_size=queue_size)
+    server = ThreadingHTTPServer((host, port), make_handler(jobs, os.path.realpath(root) if root else None))
+    print(f"Candidate worker listening on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates kg_candidate.dot for a batch.")
+    parser.add_argument('batch_directory', nargs='?')
+    parser.add_argument('--serve', action='store_true', help="Run as a persistent local worker.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2, help="Number of concurrent jobs.")
+    parser.add_argument('--queue-size', type=int, default=16, help="Maximum number of queued jobs.")
+    parser.add_argument('--root', help="Only accept batch directories below this directory.")
+    parser.add_argument('--published', help="Published merged graph (default: merged_graph.dot three levels above the batch).")
+    parser.add_argument('--synonyms', help="Synonym dictionary (JSON/CSV) used to canonicalize labels.")
+    parser.add_argument('--separator', default='___', help="Separator of merged attribute values.")
+    parser.add_argument('--edge-merge', choices=['first', 'label'], default='first')
+    parser.add_argument('--id-scheme', choices=['concat', 'hash'],
+                        help="ID scheme of new nodes (default: the scheme of the published graph).")
+    args = parser.parse_args()
+
+    generator = CandidateGenerator(args.published, args.synonyms, args.separator, args.edge_merge, args.id_scheme)
+    if args.serve:
+        serve(generator, args.host, args.port, args.workers, args.queue_size, args.root)
+        return
+
+    if args.batch_directory is None:
+        print("Usage: python generate_candidate.py <batch_directory>")
+        sys.exit(1)
+
+    try:
+        result = generator.generate(args.batch_directory)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    print(f"kg_candidate.dot has been generated at {kg_candidate_path}")
+    print(f"kg_candidate.dot has been generated at {result['path']}: {result['new_nodes']} new nodes, "
+          f"{result['new_edges']} new edges, {result['updated_edges']} updated edges")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,130 @@
+"""
+Benchmark of the graph backends on a synthetic merged graph.
+
+Writes nodes/relationships CSV files like data_loader.dot_to_csv, loads them into each backend
+with load_csvs_into_neo4j and runs the same random subgraph queries against every backend:
+load time, query latency percentiles and throughput are reported, and the results of the
+backends are compared row by row.
+
+The in-memory backend always runs. Neo4j is added with --neo4j, using NEO4J_URI, NEO4J_USER
+and NEO4J_PASSWORD; --import-dir is the Neo4j import directory the CSV files are written to.
+
+Usage:
+    poetry run python benchmarks/bench_backends.py --nodes 20000 --edges 100000 --queries 200
+    poetry run python benchmarks/bench_backends.py --neo4j --import-dir /var/lib/neo4j/import
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from kg_merger.backends import InMemoryBackend, Neo4jBackend
+from kg_merger.csv_writer import export_edges, export_nodes
+from kg_merger.data_loader import load_csvs_into_neo4j
+
+ATTRIBUTES = {'label': 50, 'provider': 20, 'product': 200}
+
+
+def write_graph(directory, nodes, edges, seed):
+    rng = random.Random(seed)
+    nodes_csv = os.path.join(directory, 'nodes.csv')
+    relationships_csv = os.path.join(directory, 'relationships.csv')
+    export_nodes(((f'n{i}', {'label': f'Label {i}'}) for i in range(nodes)), nodes_csv, columns=['id', 'label'])
+
+    def relationships():
+        for _ in range(edges):
+            attrs = {
+                attr: [f'{attr}{rng.randrange(cardinality)}' for _ in range(rng.randint(1, 3))]
+                for attr, cardinality in ATTRIBUTES.items()
+            }
+            yield f'n{rng.randrange(nodes)}', f'n{rng.randrange(nodes)}', attrs
+
+    export_edges(relationships(), relationships_csv, columns=['source', 'target', *sorted(ATTRIBUTES)])
+    return nodes_csv, relationships_csv
+
+
+def random_criteria(rng):
+    attributes = rng.sample(sorted(ATTRIBUTES), rng.randint(1, 2))
+    return {
+        attr: [f'{attr}{rng.randrange(ATTRIBUTES[attr])}' for _ in range(rng.randint(1, 3))]
+        for attr in attributes
+    }
+
+
+def canonical(rows):
+    return sorted(
+        tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in sorted(row.items()))
+        for row in rows
+    )
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(backend, nodes_csv, relationships_csv, queries, keep=False):
+    start = time.perf_counter()
+    if not load_csvs_into_neo4j(nodes_csv, relationships_csv, None, None, None, backend=backend):
+        raise RuntimeError(f"Loading into the {backend.name} backend failed.")
+    load_seconds = time.perf_counter() - start
+    # Move the loaded graph out of the cyclic GC's view, as a long-running server would
+    gc.collect()
+    gc.freeze()
+
+    latencies, counts, results = [], [], []
+    start = time.perf_counter()
+    for criteria in queries:
+        query_start = time.perf_counter()
+        rows = backend.query_edges(criteria)
+        latencies.append(time.perf_counter() - query_start)
+        counts.append(len(rows))
+        # Keeping every result alive makes the cyclic GC dominate the latencies
+        if keep:
+            results.append(canonical(rows))
+    total = time.perf_counter() - start
+
+    print(f"{backend.name:<8} load {load_seconds:8.3f}s  "
+          f"p50 {1000 * statistics.median(latencies):8.2f}ms  p95 {1000 * percentile(latencies, 0.95):8.2f}ms  "
+          f"p99 {1000 * percentile(latencies, 0.99):8.2f}ms  {len(queries) / total:10.1f} queries/s  "
+          f"{statistics.mean(counts):8.1f} rows/query")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--edges', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--neo4j', action='store_true', help='Also benchmark the Neo4j backend.')
+    parser.add_argument('--import-dir', help='Neo4j import directory (default: a temporary directory).')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [random_criteria(rng) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.import_dir or tmp
+        nodes_csv, relationships_csv = write_graph(directory, args.nodes, args.edges, args.seed)
+        print(f"{args.nodes} nodes, {args.edges} relationships, {args.queries} queries")
+
+        backends = [InMemoryBackend()]
+        if args.neo4j:
+            backends.append(Neo4jBackend(os.getenv('NEO4J_URI'), os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD')))
+        results = {}
+        for backend in backends:
+            with backend:
+                results[backend.name] = run(backend, nodes_csv, relationships_csv, queries, keep=len(backends) > 1)
+
+    if len(results) > 1:
+        reference = results['memory']
+        mismatches = sum(expected != actual for expected, actual in zip(reference, results['neo4j']))
+        print(f"{mismatches} of {len(queries)} queries differ between the backends")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the startup time of the kg_merger entry points.
+
+Each entry point is imported in a fresh interpreter, the way a short CLI job or a worker
+spawned per request starts, and the import time and the optional heavy dependencies it
+pulled in are reported. `--help` of the command line tools is timed end to end as well.
+
+Usage:
+    poetry run python benchmarks/bench_startup.py --repeat 5
+    poetry run python benchmarks/bench_startup.py --importtime kg_merger.cli
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = [
+    'kg_merger.cli',
+    'kg_merger.merge',
+    'kg_merger.candidate',
+    'kg_merger.graph_diff',
+    'kg_merger.data_loader',
+    'kg_merger.query_subgraph',
+    'kg_merger.synonym_dictionary',
+    'kg_merger.columnar_export',
+    'kg_merger.streamlit_visualizer',
+]
+COMMANDS = [
+    ['-m', 'kg_merger.cli', '--help'],
+    ['-m', 'kg_merger.graph_diff', '--help'],
+    ['-m', 'kg_merger.synonym_dictionary', '--help'],
+]
+HEAVY_MODULES = ['neo4j', 'janome', 'pydot', 'matplotlib', 'streamlit', 'streamlit_agraph', 'pytest', 'dotenv']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe_import(module):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True,
+    )
+    if output.returncode != 0:
+        return None
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def time_command(args):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, *args], capture_output=True)
+    return time.perf_counter() - start if output.returncode == 0 else None
+
+
+def print_importtime(module, top=20):
+    """
+    Prints the slowest imports of a module by cumulative time (python -X importtime).
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True)
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--importtime', metavar='MODULE', help='Show the slowest imports of one module instead.')
+    args = parser.parse_args()
+
+    if args.importtime:
+        print_importtime(args.importtime)
+        return
+
+    print(f"{'entry point':<34} {'median ms':>10} {'min ms':>8}  heavy modules loaded")
+    for module in ENTRY_POINTS:
+        results = [probe_import(module) for _ in range(args.repeat)]
+        if None in results:
+            print(f"{module:<34} {'failed (missing dependency?)':>20}")
+            continue
+        seconds = [result['seconds'] for result in results]
+        heavy = ', '.join(results[0]['heavy']) or '-'
+        print(f"{module:<34} {1000 * statistics.median(seconds):>10.1f} {1000 * min(seconds):>8.1f}  {heavy}")
+
+    print()
+    print(f"{'command':<34} {'median ms':>10} {'min ms':>8}")
+    for command in COMMANDS:
+        seconds = [time_command(command) for _ in range(args.repeat)]
+        name = ' '.join(command[1:])
+        if None in seconds:
+            print(f"{name:<34} {'failed':>10}")
+            continue
+        print(f"{name:<34} {1000 * statistics.median(seconds):>10.1f} {1000 * min(seconds):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the synonym replacement backends.
+
+Compares the regex alternation (compile_pattern_with_extended_boundaries) with the
+Aho-Corasick automaton (compile_automaton) while scaling the dictionary size and the
+text length, and checks that both produce the same output.
+
+Usage:
+    poetry run python benchmarks/bench_synonyms.py --sizes 100 1000 10000 --text-lengths 1000 100000
+"""
+import argparse
+import random
+import time
+
+from kg_merger.synonym_transformer import (
+    compile_automaton,
+    compile_pattern,
+    compile_pattern_with_extended_boundaries,
+    replace_synonyms,
+)
+
+KATAKANA = [chr(c) for c in range(0x30A2, 0x30F3)]
+ASCII = list("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+SEPARATORS = list("、。 ・()/")
+
+
+def make_dictionary(size, rng):
+    synonym_map = {}
+    while len(synonym_map) < size:
+        alphabet = KATAKANA if rng.random() < 0.5 else ASCII
+        word = ''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 8)))
+        synonym_map[word] = f"T{len(synonym_map)}"
+    return synonym_map
+
+
+def make_text(synonym_map, length, rng):
+    words = list(synonym_map)
+    parts = []
+    total = 0
+    while total < length:
+        part = rng.choice(words) if rng.random() < 0.3 else rng.choice(KATAKANA + ASCII)
+        part += rng.choice(SEPARATORS) if rng.random() < 0.5 else ''
+        parts.append(part)
+        total += len(part)
+    return ''.join(parts)[:length]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--text-lengths', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--no-boundaries', action='store_true', help='Benchmark compile_pattern instead.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    boundaries = not args.no_boundaries
+    compile_regex = compile_pattern if args.no_boundaries else compile_pattern_with_extended_boundaries
+
+    print(f"{'dict':>8} {'text':>8} {'regex compile':>14} {'regex sub':>10} {'ac compile':>11} {'ac sub':>8}  same")
+    for size in args.sizes:
+        synonym_map = make_dictionary(size, rng)
+        pattern, regex_compile = timed(compile_regex, synonym_map)
+        automaton, ac_compile = timed(compile_automaton, synonym_map, boundaries)
+        for text_length in args.text_lengths:
+            text = make_text(synonym_map, text_length, rng)
+            expected, regex_sub = timed(replace_synonyms, text, pattern, synonym_map)
+            actual, ac_sub = timed(replace_synonyms, text, automaton, synonym_map)
+            print(
+                f"{size:>8} {text_length:>8} {regex_compile:>13.3f}s {regex_sub:>9.3f}s "
+                f"{ac_compile:>10.3f}s {ac_sub:>7.3f}s  {expected == actual}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Graph storage backends behind data_loader.load_csvs_into_neo4j and the query_subgraph functions.
+
+Neo4jBackend runs the Cypher statements against a live database. InMemoryBackend implements the
+same load, filter and return operations in process, so the query paths can be tested and
+benchmarked on machines without a database:
+
+    backend = InMemoryBackend()
+    load_csvs_into_neo4j(nodes_csv, relationships_csv, None, None, None, backend=backend)
+    G = query_subgraph_nx({'provider': ['P1']}, None, None, None, backend=backend)
+"""
+import csv
+import gzip
+import logging
+import os
+import time
+
+from kg_merger.facets import FacetCatalogue
+
+logger = logging.getLogger(__name__)
+
+def split_property(value, separator='___'):
+    """
+    Converts a CSV cell into the list property stored on relationships; empty cells become [].
+    """
+    return value.split(separator) if value else []
+
+
+def read_csv_rows(path):
+    """
+    Iterates over the rows of a CSV file written by csv_writer, gzip-compressed or not.
+    """
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+class GraphBackend:
+    """
+    Load and query operations on the merged graph.
+
+    Query rows are dicts with from_id, from_label, to_id, to_label and one entry per requested
+    relationship attribute (its list of values, or None when the relationship lacks it).
+    """
+
+    name = 'base'
+
+    def load_csvs(self, nodes_csv_path, relationships_csv_path, separator='___', facets_path=None):
+        """
+        Replaces the stored graph with the nodes and relationships CSV files written by
+        data_loader.dot_to_csv, stamps a new data version and stores the facet catalogue.
+
+        Returns:
+            int: The number of relationships loaded.
+        """
+        raise NotImplementedError
+
+    def query_edges(self, user_criteria, attributes=None):
+        """
+        Returns the distinct relationships matching user_criteria: for every attribute, ANY of
+        the given values is among the relationship's values.
+
+        Args:
+            user_criteria (dict): Attribute names mapped to lists of acceptable values.
+            attributes (iterable of str): Relationship attributes to return. Defaults to the
+                attributes of user_criteria.
+
+        Returns:
+            list of dict: The matching rows.
+        """
+        raise NotImplementedError
+
+    def data_version(self):
+        """
+        Returns the version stamp written by the last load, or None.
+        """
+        raise NotImplementedError
+
+    def facet_catalogue(self):
+        """
+        Returns the stored FacetCatalogue, or None.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Neo4jBackend(GraphBackend):
+    """
+    Backend on a Neo4j database. The driver is created on first use unless a shared one is
+    given, which is then left open for the caller.
+    """
+
+    name = 'neo4j'
+
+    def __init__(self, uri=None, user=None, password=None, driver=None):
+        self.uri = uri
+        self.user = user
+        self.password = password
+        self._driver = driver
+        self._owns_driver = driver is None
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            from neo4j import GraphDatabase, basic_auth
+
+            self._driver = GraphDatabase.driver(self.uri, auth=basic_auth(self.user, self.password))
+        return self._driver
+
+    def close(self):
+        if self._owns_driver and self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+    def load_csvs(self, nodes_csv_path, relationships_csv_path, separator='___', facets_path=None):
+        """
+        Loads the CSV files with LOAD CSV and the CALL { ... } IN TRANSACTIONS syntax. The files
+        must be in the Neo4j import directory.
+        """
+        with self.driver.session() as session:
+            # 1. Clear existing data
+            logger.info("Clearing existing data in Neo4j...")
+            session.run("MATCH (n) DETACH DELETE n")
+
+            # 2. Load nodes
+            logger.info("Loading nodes into Neo4j...")
+            load_nodes_query = f"""
+                CALL {{
+                    LOAD CSV WITH HEADERS FROM 'file:///{os.path.basename(nodes_csv_path)}' AS row
+                    CREATE (:Node {{id: row.id, label: row.label}})
+                }}
+                IN TRANSACTIONS OF 1000 ROWS
+            """
+            session.run(load_nodes_query)
+
+            # 3. Load relationships with dynamic attributes
+            logger.info("Loading relationships into Neo4j...")
+
+            # Dynamically determine the attributes from the relationships CSV header
+            with open(relationships_csv_path, 'r', encoding='utf-8') as csvfile:
+                reader = csv.reader(csvfile)
+                headers = next(reader)
+                relationship_attributes = headers[2:]  # Exclude 'source' and 'target'
+
+            logger.info(f"Relationship attributes detected: {relationship_attributes}")
+
+            # Construct the SET clause dynamically
+            set_clauses = []
+            for attr in relationship_attributes:
+                # Only add the attribute if it's not empty
+                set_clauses.append(f"{attr}: CASE WHEN row.{attr} <> '' THEN SPLIT(row.{attr}, '{separator}') ELSE [] END")
+            set_clause = ",\n        ".join(set_clauses)
+
+            load_relationships_query = f"""
+                CALL {{
+                    LOAD CSV WITH HEADERS FROM 'file:///{os.path.basename(relationships_csv_path)}' AS row
+                    MATCH (a:Node {{id: row.source}}), (b:Node {{id: row.target}})
+                    CREATE (a)-[:RELATED {{
+                        {set_clause}
+                    }}]->(b)
+                }}
+                IN TRANSACTIONS OF 1000 ROWS
+            """
+            session.run(load_relationships_query)
+
+            # Verify relationships have been loaded correctly
+            verify_query = """
+                MATCH ()-[r:RELATED]->()
+                RETURN COUNT(r) AS totalRelationships
+            """
+            result = session.run(verify_query)
+            total = result.single()["totalRelationships"]
+            logger.info(f"Total relationships loaded: {total}")
+
+            # 4. Stamp the data version so query result caches are invalidated
+            session.run(
+                "MERGE (m:DataVersion {name: 'kg'}) SET m.version = $version",
+                version=str(time.time_ns()),
+            )
+
+            # 5. Store the facet catalogue for the query UI
+            if facets_path and os.path.exists(facets_path):
+                logger.info("Storing facet catalogue in Neo4j...")
+                FacetCatalogue.load(facets_path).store_in_neo4j(session)
+        return total
+
+    def query_edges(self, user_criteria, attributes=None):
+        attributes = list(user_criteria if attributes is None else attributes)
+        with self.driver.session() as session:
+            # Dynamically build the WHERE clause based on user criteria
+            where_clauses = []
+            for attr in user_criteria.keys():
+                where_clauses.append(f"ANY(val IN $criteria.{attr} WHERE val IN r.{attr})")
+
+            # Combine all conditions with AND; no criteria match every relationship
+            where_statement = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
+            # Prepare the list of attributes to return directly (no pluralization)
+            return_attributes = "".join(f", r.{attr} AS {attr}" for attr in attributes)
+
+            # Final Cypher query
+            query = f"""
+                MATCH (a:Node)-[r:RELATED]->(b:Node)
+                {where_statement}
+                RETURN DISTINCT a.id AS from_id, a.label AS from_label,
+                                b.id AS to_id, b.label AS to_label{return_attributes}
+            """
+            result = session.run(query, criteria=user_criteria)
+            return [record.data() for record in result]
+
+    def data_version(self):
+        with self.driver.session() as session:
+            record = session.run("MATCH (m:DataVersion {name: 'kg'}) RETURN m.version AS version").single()
+        return record["version"] if record else None
+
+    def facet_catalogue(self):
+        with self.driver.session() as session:
+            return FacetCatalogue.from_neo4j(session)
+
+
+class InMemoryBackend(GraphBackend):
+    """
+    In-process stand-in for Neo4jBackend with the same semantics: relationships whose endpoints
+    are unknown are dropped, properties are lists of values and query rows are distinct.
+    An inverted index from (attribute, value) to relationships answers the criteria.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.nodes = {}
+        self.edges = []
+        self.index = {}
+        self.version = None
+        self.facets = None
+
+    def add_node(self, node_id, label):
+        self.nodes[node_id] = label
+
+    def add_edge(self, source, target, properties):
+        if source not in self.nodes or target not in self.nodes:
+            return False
+        position = len(self.edges)
+        # Values are kept as tuples so query rows can be deduplicated without copying
+        properties = {attr: tuple(values) for attr, values in properties.items()}
+        self.edges.append((source, target, properties))
+        for attr, values in properties.items():
+            by_value = self.index.setdefault(attr, {})
+            for value in values:
+                by_value.setdefault(value, set()).add(position)
+        return True
+
+    def load_csvs(self, nodes_csv_path, relationships_csv_path, separator='___', facets_path=None):
+        logger.info("Clearing existing data in memory...")
+        self.clear()
+        for row in read_csv_rows(nodes_csv_path):
+            self.add_node(row['id'], row['label'])
+        total = 0
+        for row in read_csv_rows(relationships_csv_path):
+            properties = {
+                key: split_property(value, separator)
+                for key, value in row.items() if key not in ('source', 'target')
+            }
+            total += self.add_edge(row['source'], row['target'], properties)
+        logger.info(f"Total relationships loaded: {total}")
+        self.version = str(time.time_ns())
+        if facets_path and os.path.exists(facets_path):
+            self.facets = FacetCatalogue.load(facets_path)
+        return total
+
+    def match(self, user_criteria):
+        """
+        Returns the positions of the relationships matching user_criteria in load order.
+        """
+        matched = None
+        # Intersect the most selective attributes first
+        candidates = []
+        for attr, values in user_criteria.items():
+            by_value = self.index.get(attr, {})
+            candidates.append(set().union(*(by_value.get(value, ()) for value in values)))
+        for positions in sorted(candidates, key=len):
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                return []
+        if matched is None:
+            return range(len(self.edges))
+        return sorted(matched)
+
+    def query_edges(self, user_criteria, attributes=None):
+        attributes = list(user_criteria if attributes is None else attributes)
+        edges, nodes = self.edges, self.nodes
+        seen = set()
+        rows = []
+        for position in self.match(user_criteria):
+            source, target, properties = edges[position]
+            values = tuple(map(properties.get, attributes))
+            key = (source, target, values)
+            if key in seen:
+                continue
+            seen.add(key)
+            row = {'from_id': source, 'from_label': nodes[source], 'to_id': target, 'to_label': nodes[target]}
+            for attr, value in zip(attributes, values):
+                row[attr] = None if value is None else list(value)
+            rows.append(row)
+        return rows
+
+    def data_version(self):
+        return self.version
+
+    def facet_catalogue(self):
+        return self.facets
@@ -0,0 +1,219 @@
+"""
+Candidate generation for the review console.
+
+A batch is merged against the published merged graph without re-merging history: the published
+graph is only indexed by label, the batch graphs are merged among themselves with GraphMerger,
+and only the delta is emitted:
+
+- new nodes (status="new") and the existing nodes they connect to (status="existing"),
+- new edges (status="new"),
+- existing edges the batch merges into (status="updated"). Their attributes are concatenated
+  exactly as merge_graphs would (see merge_edge_attributes), and the batch's values alone are
+  kept in added_<attribute>.
+
+The delta can therefore be laid over the published graph node by node and edge by edge.
+"""
+import json
+import logging
+import os
+import time
+
+import networkx as nx
+
+from kg_merger.merge import GraphMerger, clean_graph, load_dot_files, merge_edge_attributes
+
+logger = logging.getLogger(__name__)
+
+# Attributes the console adds to published edges, which are not provenance
+VIEW_ATTRIBUTES = ('id', 'from', 'to')
+
+
+class PublishedGraph:
+    """
+    Label and edge indexes over the published merged graph.
+
+    New nodes of a candidate get IDs of the id_scheme the published graph was merged with (see
+    merge_graphs). By default it is detected from the graph: 'hash' if its nodes keep their
+    source_ids, otherwise 'concat'.
+    """
+
+    def __init__(self, G, attribute_separator='___', label_normalizer=None, edge_merge='first', id_scheme=None):
+        if edge_merge not in ('first', 'label'):
+            raise ValueError(f"Unknown edge_merge '{edge_merge}'.")
+        if id_scheme is None:
+            id_scheme = 'hash' if any('source_ids' in attrs for _, attrs in G.nodes(data=True)) else 'concat'
+        if id_scheme not in ('concat', 'hash'):
+            raise ValueError(f"Unknown id_scheme '{id_scheme}'.")
+        self.graph = G
+        self.attribute_separator = attribute_separator
+        self.edge_merge = edge_merge
+        self.id_scheme = id_scheme
+        self.node_by_label = {}
+        for node_id, attrs in G.nodes(data=True):
+            label = attrs.get('label', node_id)
+            if label_normalizer is not None:
+                label = label_normalizer(label)
+            self.node_by_label.setdefault(label, node_id)
+        self.edges = {}
+        for u, v, attrs in G.edges(data=True):
+            self.edges.setdefault(self.edge_key(u, v, attrs), attrs)
+
+    def edge_key(self, u, v, attrs):
+        if self.edge_merge == 'label':
+            return u, v, attrs.get('label')
+        return u, v
+
+    @classmethod
+    def load(cls, path, attribute_separator='___', label_normalizer=None, edge_merge='first', id_scheme=None):
+        """
+        Reads the published graph, or starts from an empty graph if it does not exist yet.
+        """
+        if path and os.path.exists(path):
+            G = clean_graph(nx.drawing.nx_pydot.read_dot(path))
+        else:
+            G = nx.MultiDiGraph()
+        return cls(G, attribute_separator, label_normalizer, edge_merge, id_scheme)
+
+
+def candidate_delta(published, batch_graphs, label_normalizer=None):
+    """
+    Merges the batch graphs against the published graph and returns only the delta.
+
+    Args:
+        published (PublishedGraph): Index of the published merged graph.
+        batch_graphs (list of networkx.Graph): The extracted graphs of the batch.
+        label_normalizer (callable): Label canonicalization, as for merge_graphs.
+
+    Returns:
+        tuple: The delta as a networkx.MultiDiGraph and a dict of merge statistics.
+    """
+    sep = published.attribute_separator
+    merger = GraphMerger(sep, label_normalizer=label_normalizer, id_scheme=published.id_scheme,
+                          edge_merge=published.edge_merge)
+    for G in batch_graphs:
+        merger.add_graph(G)
+    batch = merger.result()
+
+    stats = {
+        'edge_merge': published.edge_merge,
+        'id_scheme': published.id_scheme,
+        'batch_graphs': len(batch_graphs),
+        'batch_nodes': batch.number_of_nodes(),
+        'batch_edges': batch.number_of_edges(),
+        'published_nodes': published.graph.number_of_nodes(),
+        'published_edges': published.graph.number_of_edges(),
+        'new_nodes': 0,
+        'existing_nodes': 0,
+        'new_edges': 0,
+        'updated_edges': 0,
+        'unchanged_edges': 0,
+    }
+
+    delta = nx.MultiDiGraph()
+    node_ids = {}
+    for node_id, attrs in batch.nodes(data=True):
+        existing = published.node_by_label.get(attrs['label'])
+        if existing is None:
+            node_ids[node_id] = node_id
+            delta.add_node(node_id, **{**attrs, 'status': 'new'})
+            stats['new_nodes'] += 1
+        else:
+            node_ids[node_id] = existing
+            stats['existing_nodes'] += 1
+
+    def add_endpoint(node_id):
+        if node_id not in delta:
+            delta.add_node(node_id, label=published.graph.nodes[node_id].get('label', node_id), status='existing')
+
+    merged_keys = ('label',) if published.edge_merge == 'label' else ()
+    for u, v, attrs in batch.edges(data=True):
+        merged_u, merged_v = node_ids[u], node_ids[v]
+        existing = published.edges.get(published.edge_key(merged_u, merged_v, attrs))
+        if existing is None:
+            add_endpoint(merged_u)
+            add_endpoint(merged_v)
+            delta.add_edge(merged_u, merged_v, **{**attrs, 'status': 'new'})
+            stats['new_edges'] += 1
+            continue
+
+        edge_attrs = {key: value for key, value in existing.items() if key not in VIEW_ATTRIBUTES}
+        added = merge_edge_attributes(edge_attrs, attrs, sep, skip=merged_keys)
+        if not added:
+            stats['unchanged_edges'] += 1
+            continue
+        add_endpoint(merged_u)
+        add_endpoint(merged_v)
+        for key, value in added.items():
+            edge_attrs[f'added_{key}'] = value
+        edge_attrs['status'] = 'updated'
+        delta.add_edge(merged_u, merged_v, **edge_attrs)
+        stats['updated_edges'] += 1
+
+    return delta, stats
+
+
+def quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def to_dot(G, name='candidate'):
+    """
+    Renders a graph as DOT with every ID and attribute quoted.
+    """
+    lines = [f'digraph {quote(name)} {{']
+    for node_id, attrs in G.nodes(data=True):
+        attributes = ', '.join(f'{key}={quote(value)}' for key, value in attrs.items())
+        lines.append(f'    {quote(node_id)} [{attributes}];')
+    for u, v, attrs in G.edges(data=True):
+        attributes = ', '.join(f'{key}={quote(value)}' for key, value in attrs.items())
+        lines.append(f'    {quote(u)} -> {quote(v)} [{attributes}];')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def batch_dot_files(batch_directory, exclude=('kg_candidate.dot',)):
+    """
+    Returns the extracted graphs of a batch: every .dot file except the candidate itself.
+    """
+    return sorted(
+        os.path.join(batch_directory, name)
+        for name in os.listdir(batch_directory)
+        if name.endswith('.dot') and name not in exclude
+    )
+
+
+def generate_candidate(batch_directory, published, label_normalizer=None, output_name='kg_candidate.dot',
+                       snapshot_name='snapshot'):
+    """
+    Writes the delta of a batch against the published graph to <batch>/kg_candidate.dot, its
+    render snapshot (see render_snapshot) to <batch>/snapshot unless snapshot_name is None, and
+    the merge statistics to <batch>/kg_candidate_stats.json.
+
+    Returns:
+        dict: The merge statistics, including the output paths.
+    """
+    start = time.perf_counter()
+    paths = batch_dot_files(batch_directory, exclude=(output_name,))
+    if not paths:
+        raise FileNotFoundError(f"No extracted graphs found in '{batch_directory}'.")
+    delta, stats = candidate_delta(published, load_dot_files(paths), label_normalizer)
+    stats['seconds'] = round(time.perf_counter() - start, 6)
+
+    candidate_path = os.path.join(batch_directory, output_name)
+    tmp_path = f"{candidate_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(to_dot(delta))
+    os.replace(tmp_path, candidate_path)
+    if snapshot_name:
+        from kg_merger.render_snapshot import build_snapshot
+
+        stats['snapshot_etag'] = build_snapshot(delta, os.path.join(batch_directory, snapshot_name), source=candidate_path)['etag']
+
+    stats_path = os.path.join(batch_directory, 'kg_candidate_stats.json')
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    stats['path'] = candidate_path
+    stats['stats_path'] = stats_path
+    logger.info(f"Candidate for '{batch_directory}': {stats['new_nodes']} new nodes, {stats['new_edges']} new edges, "
+                f"{stats['updated_edges']} updated edges in {stats['seconds']:.3f}s.")
+    return stats
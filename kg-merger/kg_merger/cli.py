@@ -0,0 +1,584 @@
+"""
+kg-merger command line: parse -> merge -> export -> load as one streaming pipeline.
+
+Batches are parsed in worker processes while the merge consumes them in order, and the merged
+rows are written to CSV while a loader thread sends the same rows to Neo4j in UNWIND batches.
+Bounded queues between the stages apply backpressure, so the end-to-end time approaches the time
+of the slowest stage instead of the sum of all stages.
+
+With --checkpoint-dir the merge state is saved every few batches and after each stage, and
+--resume continues from there; input files added after the merged ones are merged into the
+saved state. --dry-run only reports the expected volumes.
+
+Usage:
+    kg-merger graphs/ --out out/ [--neo4j] [--checkpoint-dir ckpt/ [--resume]] [--dry-run]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from kg_merger import instrumentation, profiling
+from kg_merger.csv_writer import edge_rows, format_value, write_csv
+from kg_merger.facets import FacetCatalogue
+from kg_merger.instrumentation import count, record, span
+from kg_merger.merge import GraphMerger, load_dot_files, provenance_table
+
+logger = logging.getLogger(__name__)
+
+DONE = object()
+POLL_INTERVAL = 0.1
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_BATCH_SIZE = 5000
+
+NODE_LINE = re.compile(r'^\s*("(?:[^"\\]|\\.)*"|[\w.]+)\s*\[')
+LABEL_ATTRIBUTE = re.compile(r'\blabel\s*=\s*("(?:[^"\\]|\\.)*"|[^\s,\]]+)')
+
+
+class Aborted(Exception):
+    """
+    Raised in a stage when another stage has failed.
+    """
+
+
+def put(q, item, abort):
+    while True:
+        if abort.is_set():
+            raise Aborted()
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
+
+
+def get(q, abort):
+    while True:
+        if abort.is_set():
+            raise Aborted()
+        try:
+            return q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+
+class StageThread(threading.Thread):
+    """
+    Runs one pipeline stage. An error sets the shared abort event so the other stages stop
+    instead of blocking on a full or empty queue.
+    """
+
+    def __init__(self, name, target, abort):
+        super().__init__(name=f'kg-merger-{name}', daemon=True)
+        self.target = target
+        self.abort = abort
+        self.error = None
+
+    def run(self):
+        try:
+            self.target()
+        except Aborted:
+            pass
+        except BaseException as e:
+            self.error = e
+            self.abort.set()
+
+    def join_and_raise(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def collect_dot_files(paths):
+    """
+    Expands directories into their .dot files, sorted by name.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.dot')))
+        else:
+            files.append(path)
+    return files
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _init_parse_worker():
+    # The parent records the parse stage, so a worker must not write reports of its own
+    instrumentation.disable()
+
+
+def parse_dot_file(path):
+    """
+    Parses one DOT file in a parse worker.
+
+    Returns:
+        tuple: The graph, the parse time in seconds and the number of nodes and edges.
+    """
+    start = time.perf_counter()
+    G = load_dot_files([path])[0]
+    return G, time.perf_counter() - start, G.number_of_nodes() + G.number_of_edges()
+
+
+def _parsed(future):
+    G, seconds, rows = future.result()
+    record('parse', seconds, rows=rows)
+    return G
+
+
+def produce_graphs(paths, out_queue, abort, workers=0, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Parses the DOT files, in worker processes if workers > 0, and puts (path, graph) pairs in
+    input order on out_queue. At most queue_size files are parsed ahead of the merge. The parse
+    stage of the workers is recorded in this process.
+    """
+    if workers <= 0:
+        for path in paths:
+            put(out_queue, (path, load_dot_files([path])[0]), abort)
+        put(out_queue, DONE, abort)
+        return
+
+    # Never fork: the pipeline threads are already running
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                               initializer=_init_parse_worker)
+    try:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(parse_dot_file, path)))
+            if len(pending) >= queue_size:
+                done_path, future = pending.popleft()
+                put(out_queue, (done_path, _parsed(future)), abort)
+        while pending:
+            done_path, future = pending.popleft()
+            put(out_queue, (done_path, _parsed(future)), abort)
+        put(out_queue, DONE, abort)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class Checkpoint:
+    """
+    Merge state and stage progress of a run, stored in a directory as manifest.json and
+    merger.pickle. Both are replaced atomically, the pickle first. The pickle holds the merger
+    together with the files merged into it, so a crash between the two writes cannot make a
+    resumed run merge a file twice.
+    """
+
+    def __init__(self, directory, options):
+        self.directory = directory
+        self.options = options
+        self.files = {}
+        self.stages = []
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.merger_path = os.path.join(directory, 'merger.pickle')
+
+    def load(self):
+        """
+        Reads a previous checkpoint.
+
+        Returns:
+            GraphMerger: The saved merger, or None if there is no checkpoint.
+        """
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['options'] != self.options:
+            raise ValueError(f"Checkpoint in '{self.directory}' was made with different options: {manifest['options']}.")
+        with open(self.merger_path, 'rb') as f:
+            state = pickle.load(f)
+        merger, files = state['merger'], state['files']
+        if merger.graph_count != len(files):
+            raise ValueError(f"Checkpoint in '{self.directory}' is inconsistent; start over without --resume.")
+        for path, signature in files.items():
+            if not os.path.exists(path) or file_signature(path) != signature:
+                raise ValueError(f"'{path}' changed since it was merged; start over without --resume.")
+        self.files = files
+        # A manifest listing other files was not written after the last merge state, so its
+        # stages do not describe that state
+        self.stages = manifest['stages'] if manifest['files'] == files else []
+        return merger
+
+    def remaining(self, paths):
+        """
+        Returns the paths still to be merged on resume. The merged files must be the first of
+        paths, in the same order, since the merge result depends on it. Paths added after them
+        are merged into the saved state, and the stages done after the merge are redone.
+        """
+        merged = list(self.files)
+        if paths[:len(merged)] != merged:
+            raise ValueError(f"The input files do not start with the {len(merged)} files merged in '{self.directory}' "
+                             f"in the same order; start over without --resume.")
+        remaining = paths[len(merged):]
+        if remaining and self.stages:
+            logger.info(f"{len(remaining)} new input files; redoing stages {self.stages}.")
+            self.stages = []
+        return remaining
+
+    def done(self, stage):
+        return stage in self.stages
+
+    def _write(self, path, data, mode):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            if 'b' in mode:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def save(self, merger=None):
+        os.makedirs(self.directory, exist_ok=True)
+        if merger is not None:
+            self._write(self.merger_path, {'merger': merger, 'files': dict(self.files)}, 'wb')
+        self._write(self.manifest_path, {'options': self.options, 'files': self.files, 'stages': self.stages}, 'w')
+
+    def mark(self, stage):
+        if stage not in self.stages:
+            self.stages.append(stage)
+        self.save()
+        logger.info(f"Checkpoint: stage '{stage}' done.")
+
+
+def estimate_volumes(paths, skipped=()):
+    """
+    Estimates the volumes of a run from a text scan of the DOT files, without parsing them.
+    """
+    totals = {'files': 0, 'bytes': 0, 'nodes': 0, 'edges': 0}
+    labels = set()
+    files = []
+    for path in paths:
+        nodes = edges = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if '->' in line or ' -- ' in line:
+                    edges += 1
+                elif (node := NODE_LINE.match(line)) and node.group(1) not in ('graph', 'node', 'edge'):
+                    nodes += 1
+                    match = LABEL_ATTRIBUTE.search(line)
+                    if match:
+                        labels.add(match.group(1).strip('"'))
+        size = os.path.getsize(path)
+        files.append({'path': path, 'bytes': size, 'nodes': nodes, 'edges': edges, 'skipped': path in skipped})
+        if path not in skipped:
+            totals['files'] += 1
+            totals['bytes'] += size
+            totals['nodes'] += nodes
+            totals['edges'] += edges
+    totals['merged_nodes_upper_bound'] = len(labels)
+    return {'totals': totals, 'files': files}
+
+
+class Neo4jLoader:
+    """
+    Loads node and edge row batches from a queue into Neo4j with UNWIND queries, replacing the
+    existing data like data_loader.load_csvs_into_neo4j.
+    """
+
+    NODES_QUERY = "UNWIND $rows AS row CREATE (:Node {id: row.id, label: row.label})"
+    EDGES_QUERY = """
+        UNWIND $rows AS row
+        MATCH (a:Node {id: row.source}), (b:Node {id: row.target})
+        CREATE (a)-[r:RELATED]->(b)
+        SET r = row.properties
+    """
+
+    def __init__(self, uri, user, password, separator='___'):
+        self.uri = uri
+        self.user = user
+        self.password = password
+        self.separator = separator
+        self.counts = {'nodes': 0, 'edges': 0}
+
+    def edge_parameters(self, rows):
+        return [
+            {
+                'source': row['source'],
+                'target': row['target'],
+                'properties': {
+                    key: value.split(self.separator) if value else []
+                    for key, value in row.items() if key not in ('source', 'target')
+                },
+            }
+            for row in rows
+        ]
+
+    def consume(self, load_queue, abort):
+        from neo4j import GraphDatabase, basic_auth
+
+        driver = GraphDatabase.driver(self.uri, auth=basic_auth(self.user, self.password))
+        try:
+            with span('load') as current, driver.session() as session:
+                logger.info("Clearing existing data in Neo4j...")
+                session.run("MATCH (n) DETACH DELETE n")
+                session.run("CREATE INDEX node_id IF NOT EXISTS FOR (n:Node) ON (n.id)")
+                while True:
+                    item = get(load_queue, abort)
+                    if item is DONE:
+                        break
+                    kind, payload = item
+                    if kind == 'nodes':
+                        session.execute_write(lambda tx: tx.run(self.NODES_QUERY, rows=payload).consume())
+                    elif kind == 'edges':
+                        rows = self.edge_parameters(payload)
+                        session.execute_write(lambda tx: tx.run(self.EDGES_QUERY, rows=rows).consume())
+                    elif kind == 'facets':
+                        payload.store_in_neo4j(session)
+                        continue
+                    self.counts[kind] += len(payload)
+                    current.count(rows=len(payload))
+                session.run(
+                    "MERGE (m:DataVersion {name: 'kg'}) SET m.version = $version",
+                    version=str(time.time_ns()),
+                )
+        finally:
+            driver.close()
+        logger.info(f"Loaded {self.counts['nodes']} nodes and {self.counts['edges']} relationships into Neo4j.")
+
+
+def tee_rows(rows, kind, separator, load_queue, abort, batch_size=DEFAULT_BATCH_SIZE, facets=None):
+    """
+    Formats rows for CSV and yields them, putting a copy of every batch_size rows on load_queue.
+    The rows are counted in the export stage.
+    """
+    batch = []
+    exported = 0
+    for row in rows:
+        row = {key: format_value(value, separator) for key, value in row.items()}
+        if facets is not None:
+            facets.add_edge(row)
+        if load_queue is not None:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                put(load_queue, (kind, batch), abort)
+                batch = []
+        exported += 1
+        yield row
+    if batch:
+        put(load_queue, (kind, batch), abort)
+    count('export', rows=exported)
+
+
+def export_and_load(G, directory, separator='___', loader=None, batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Writes nodes.csv, relationships.csv, facets.json and, for hashed IDs, provenance.csv, while
+    the loader (if any) loads the same rows into Neo4j from a bounded queue.
+
+    Returns:
+        dict: Number of rows written per file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    abort = threading.Event()
+    load_queue = queue.Queue(maxsize=queue_size) if loader is not None else None
+    loader_thread = None
+    if loader is not None:
+        loader_thread = StageThread('load', lambda: loader.consume(load_queue, abort), abort)
+        loader_thread.start()
+
+    facets = FacetCatalogue(separator=separator)
+    counts = {}
+    try:
+        with span('export') as current:
+            node_rows = ({'id': node_id, 'label': attrs.get('label', node_id)} for node_id, attrs in G.nodes(data=True))
+            counts['nodes'] = write_csv(
+                tee_rows(node_rows, 'nodes', separator, load_queue, abort, batch_size),
+                os.path.join(directory, 'nodes.csv'), columns=['id', 'label'], separator=separator,
+            )
+            attributes = sorted({key for _, _, attrs in G.edges(data=True) for key in attrs})
+            counts['relationships'] = write_csv(
+                tee_rows(edge_rows(G.edges(data=True)), 'edges', separator, load_queue, abort, batch_size, facets),
+                os.path.join(directory, 'relationships.csv'), columns=['source', 'target'] + attributes, separator=separator,
+            )
+            facets.save(os.path.join(directory, 'facets.json'))
+            if any('source_ids' in attrs for _, attrs in G.nodes(data=True)):
+                counts['provenance'] = write_csv(
+                    ({'id': merged_id, 'source_id': source_id} for merged_id, source_id in provenance_table(G, separator)),
+                    os.path.join(directory, 'provenance.csv'), columns=['id', 'source_id'],
+                )
+            current.count(bytes=sum(os.path.getsize(os.path.join(directory, f'{name}.csv')) for name in counts))
+        if load_queue is not None:
+            put(load_queue, ('facets', facets), abort)
+            put(load_queue, DONE, abort)
+    except Aborted:
+        pass
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        if loader_thread is not None:
+            loader_thread.join_and_raise()
+    return counts
+
+
+def merge_files(paths, merger, checkpoint=None, workers=0, queue_size=DEFAULT_QUEUE_SIZE, checkpoint_every=10):
+    """
+    Merges the DOT files into merger while later files are still being parsed. The merge stage
+    covers only the add_graph calls and counts the edges they add to the merged graph, so
+    waiting for the parser and edges restored from a checkpoint are left out.
+    """
+    abort = threading.Event()
+    graph_queue = queue.Queue(maxsize=queue_size)
+    parser = StageThread('parse', lambda: produce_graphs(paths, graph_queue, abort, workers, queue_size), abort)
+    parser.start()
+    merge_seconds = 0.0
+    edges_before = merger.graph.number_of_edges()
+    try:
+        with profiling.profile('merge'):
+            while True:
+                item = get(graph_queue, abort)
+                if item is DONE:
+                    break
+                path, G = item
+                start = time.perf_counter()
+                merger.add_graph(G)
+                merge_seconds += time.perf_counter() - start
+                logger.info(f"Merged '{path}' ({G.number_of_nodes()} nodes, {G.number_of_edges()} edges).")
+                if checkpoint is not None:
+                    checkpoint.files[path] = file_signature(path)
+                    if merger.graph_count % checkpoint_every == 0:
+                        checkpoint.save(merger)
+    except Aborted:
+        pass
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        parser.join_and_raise()
+    record('merge', merge_seconds, rows=merger.graph.number_of_edges() - edges_before)
+    return merger
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='kg-merger', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help="DOT files or directories of DOT files, merged in the given order.")
+    parser.add_argument('--out', default='out', help="Output directory for the CSVs and facets (default: out).")
+    parser.add_argument('--separator', default='___', help="Separator of merged attribute values.")
+    parser.add_argument('--id-scheme', choices=['concat', 'hash'], default='concat')
+    parser.add_argument('--edge-merge', choices=['first', 'label'], default='first')
+    parser.add_argument('--synonyms', help="Synonym dictionary (JSON/CSV) used to canonicalize labels.")
+    parser.add_argument('--write-dot', metavar='PATH', help="Also write the merged graph as DOT.")
+    parser.add_argument('--snapshot', metavar='DIR', help="Also write a render snapshot of the merged graph for kg-console.")
+    parser.add_argument('--neo4j', action='store_true', help="Load into Neo4j (NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD).")
+    parser.add_argument('--parse-workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Parser processes; 0 parses in a thread.")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="Capacity of the queues between stages.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per Neo4j UNWIND batch.")
+    parser.add_argument('--checkpoint-dir', help="Directory for resumable checkpoints.")
+    parser.add_argument('--checkpoint-every', type=int, default=10, help="Checkpoint the merge every N files.")
+    parser.add_argument('--resume', action='store_true', help="Resume from the checkpoint in --checkpoint-dir.")
+    parser.add_argument('--dry-run', action='store_true', help="Report the expected volumes and exit.")
+    return parser
+
+
+def run(args):
+    paths = collect_dot_files(args.paths)
+    if not paths:
+        raise ValueError("No DOT files found.")
+    if args.resume and not args.checkpoint_dir:
+        raise ValueError("--resume requires --checkpoint-dir.")
+
+    label_normalizer = None
+    dictionary_version = None
+    if args.synonyms:
+        from kg_merger.synonym_dictionary import compile_dictionary, load_dictionary
+
+        compiled = compile_dictionary(load_dictionary(args.synonyms))
+        label_normalizer = compiled.canonicalizer()
+        dictionary_version = compiled.version
+
+    options = {
+        'separator': args.separator,
+        'id_scheme': args.id_scheme,
+        'edge_merge': args.edge_merge,
+        'synonyms': dictionary_version,
+    }
+    checkpoint = Checkpoint(args.checkpoint_dir, options) if args.checkpoint_dir else None
+    merger = checkpoint.load() if checkpoint is not None and args.resume else None
+    if merger is None:
+        merger = GraphMerger(args.separator, label_normalizer=label_normalizer, id_scheme=args.id_scheme, edge_merge=args.edge_merge)
+    else:
+        merger.label_normalizer = label_normalizer
+        logger.info(f"Resuming from '{args.checkpoint_dir}': {merger.graph_count} files merged, stages done: {checkpoint.stages}.")
+    merged_paths = set(checkpoint.files) if checkpoint is not None else set()
+    remaining = checkpoint.remaining(paths) if checkpoint is not None else paths
+
+    if args.dry_run:
+        report = estimate_volumes(paths, skipped=merged_paths)
+        report['plan'] = {
+            'out': args.out,
+            'neo4j': os.getenv('NEO4J_URI') if args.neo4j else None,
+            'stages_done': checkpoint.stages if checkpoint is not None else [],
+        }
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return report
+
+    timings = {}
+    start = time.perf_counter()
+    if checkpoint is None or not checkpoint.done('merged'):
+        merge_files(remaining, merger, checkpoint, args.parse_workers, args.queue_size, args.checkpoint_every)
+        if checkpoint is not None:
+            checkpoint.save(merger)
+            checkpoint.mark('merged')
+    G = merger.result()
+    timings['parse+merge'] = time.perf_counter() - start
+    logger.info(f"Merged graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+
+    if args.write_dot:
+        from networkx.drawing.nx_pydot import write_dot
+
+        write_dot(G, args.write_dot)
+
+    if args.snapshot:
+        from kg_merger.render_snapshot import build_snapshot
+
+        start = time.perf_counter()
+        build_snapshot(G, args.snapshot, source=args.write_dot)
+        timings['snapshot'] = time.perf_counter() - start
+
+    final_stage = 'loaded' if args.neo4j else 'exported'
+    counts = {}
+    if checkpoint is None or not checkpoint.done(final_stage):
+        start = time.perf_counter()
+        loader = None
+        if args.neo4j:
+            loader = Neo4jLoader(os.getenv('NEO4J_URI'), os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD'), args.separator)
+        counts = export_and_load(G, args.out, args.separator, loader, args.batch_size, args.queue_size)
+        timings['export+load' if args.neo4j else 'export'] = time.perf_counter() - start
+        if checkpoint is not None:
+            checkpoint.mark(final_stage)
+
+    logger.info(f"Done: {counts}; " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    return counts
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    try:
+        run(args)
+    except (ValueError, FileNotFoundError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
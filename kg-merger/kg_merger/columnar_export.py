@@ -0,0 +1,218 @@
+"""
+Columnar export of merged nodes and edges.
+
+Next to the CSVs written by data_loader.dot_to_csv, the merged graph can be exported as
+Parquet (requires pyarrow) or as NumPy .npz archives. List-valued attributes (joined with the
+separator in DOT/CSV) become native list columns and strings are dictionary encoded, so
+analytics jobs can prune columns and filter by provider or product without re-parsing text.
+
+Usage:
+    python -m kg_merger.columnar_export merged_graph.dot out_dir [--format npz]
+"""
+import argparse
+import logging
+import os
+from itertools import islice
+
+import numpy as np
+
+from kg_merger.csv_writer import clean_data
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+SCALAR_NODE_COLUMNS = ('id', 'label')
+
+
+def _split(value, separator):
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(clean_data(v)) for v in value]
+    return str(clean_data(value)).split(separator)
+
+
+def node_records(G, separator='___'):
+    """
+    Yields node records with the scalar 'id' and 'label' and every other attribute as a list.
+    """
+    for node_id, attrs in G.nodes(data=True):
+        record = {'id': str(clean_data(node_id)), 'label': str(clean_data(attrs.get('label', node_id)))}
+        for key, value in attrs.items():
+            if key != 'label':
+                record[key] = _split(value, separator)
+        yield record
+
+
+def edge_records(G, separator='___'):
+    """
+    Yields edge records with scalar 'source'/'target' and every attribute as a list.
+    """
+    for source, target, attrs in G.edges(data=True):
+        record = {'source': str(clean_data(source)), 'target': str(clean_data(target))}
+        for key, value in attrs.items():
+            record[key] = _split(value, separator)
+        yield record
+
+
+def _columns(records, scalar_columns):
+    keys = set()
+    for record in records:
+        keys.update(record)
+    return list(scalar_columns) + sorted(keys - set(scalar_columns))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow); use format='npz' instead.") from e
+    return pa, pq
+
+
+def write_parquet(records, path, columns, scalar_columns, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Writes records to a Parquet file one row group at a time, so memory is bounded by the
+    row group size. Scalar string columns are dictionary encoded and list columns are
+    list<dictionary<string>>.
+
+    Returns:
+        int: Number of rows written.
+    """
+    pa, pq = _import_pyarrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([
+        pa.field(name, dictionary if name in scalar_columns else pa.list_(dictionary))
+        for name in columns
+    ])
+
+    count = 0
+    iterator = iter(records)
+    with pq.ParquetWriter(path, schema, compression='zstd', use_dictionary=True) as writer:
+        while True:
+            batch = list(islice(iterator, row_group_size))
+            if not batch:
+                break
+            arrays = []
+            for name in columns:
+                if name in scalar_columns:
+                    arrays.append(pa.array([record.get(name) for record in batch], pa.string()).dictionary_encode())
+                else:
+                    lists = pa.array([record.get(name, []) for record in batch], pa.list_(pa.string()))
+                    arrays.append(pa.ListArray.from_arrays(lists.offsets, lists.values.dictionary_encode()))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+            count += len(batch)
+    logger.info(f"{count} rows have been written to '{path}'.")
+    return count
+
+
+def write_npz(records, path, columns, scalar_columns):
+    """
+    Writes records to a compressed NumPy archive.
+
+    Each column is dictionary encoded: '<column>.categories' holds the distinct strings and
+    '<column>.codes' the int32 codes. List columns additionally have '<column>.offsets', so the
+    values of row i are codes[offsets[i]:offsets[i + 1]].
+
+    Returns:
+        int: Number of rows written.
+    """
+    categories = {name: {} for name in columns}
+    codes = {name: [] for name in columns}
+    offsets = {name: [0] for name in columns if name not in scalar_columns}
+    count = 0
+    for record in records:
+        count += 1
+        for name in columns:
+            lookup = categories[name]
+            if name in scalar_columns:
+                codes[name].append(lookup.setdefault(record.get(name, ''), len(lookup)))
+            else:
+                values = record.get(name, [])
+                codes[name].extend(lookup.setdefault(value, len(lookup)) for value in values)
+                offsets[name].append(offsets[name][-1] + len(values))
+
+    arrays = {'columns': np.array(columns), 'scalar_columns': np.array([c for c in columns if c in scalar_columns])}
+    for name in columns:
+        arrays[f'{name}.categories'] = np.array(list(categories[name]), dtype=str)
+        arrays[f'{name}.codes'] = np.array(codes[name], dtype=np.int32)
+        if name in offsets:
+            arrays[f'{name}.offsets'] = np.array(offsets[name], dtype=np.int64)
+    np.savez_compressed(path, **arrays)
+    logger.info(f"{count} rows have been written to '{path}'.")
+    return count
+
+
+def load_npz(path):
+    """
+    Reads an archive written by write_npz back into a dict of columns. Scalar columns are
+    returned as numpy string arrays and list columns as lists of lists.
+    """
+    with np.load(path) as data:
+        scalar_columns = set(data['scalar_columns'].tolist())
+        table = {}
+        for name in data['columns'].tolist():
+            values = data[f'{name}.categories'][data[f'{name}.codes']]
+            if name in scalar_columns:
+                table[name] = values
+            else:
+                offsets = data[f'{name}.offsets']
+                table[name] = [values[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+    return table
+
+
+def export_columnar(G, directory, separator='___', format='parquet', row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Exports the nodes and edges of a merged graph to `directory` as nodes/edges.parquet or
+    nodes/edges.npz.
+
+    Returns:
+        tuple: The paths of the node and edge files.
+    """
+    if format not in ('parquet', 'npz'):
+        raise ValueError(f"Unknown columnar format '{format}'.")
+    os.makedirs(directory, exist_ok=True)
+
+    outputs = []
+    for name, records, scalar_columns in (
+        ('nodes', node_records, SCALAR_NODE_COLUMNS),
+        ('edges', edge_records, ('source', 'target')),
+    ):
+        columns = _columns(records(G, separator), scalar_columns)
+        path = os.path.join(directory, f'{name}.{format}')
+        if format == 'parquet':
+            write_parquet(records(G, separator), path, columns, scalar_columns, row_group_size)
+        else:
+            write_npz(records(G, separator), path, columns, scalar_columns)
+        outputs.append(path)
+    return tuple(outputs)
+
+
+def dot_to_columnar(dot_file_path, directory, separator='___', format='parquet', row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Columnar counterpart of data_loader.dot_to_csv for a merged DOT file.
+    """
+    from networkx.drawing.nx_pydot import read_dot
+
+    from kg_merger.merge import clean_graph
+
+    G = clean_graph(read_dot(dot_file_path))
+    return export_columnar(G, directory, separator=separator, format=format, row_group_size=row_group_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dot_file', help="Merged graph (DOT).")
+    parser.add_argument('directory', help="Output directory.")
+    parser.add_argument('--format', choices=['parquet', 'npz'], default='parquet')
+    parser.add_argument('--separator', default='___')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    dot_to_columnar(args.dot_file, args.directory, args.separator, args.format, args.row_group_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
-import networkx as nx
 import csv
+import gzip
+import io
+import logging
+import os
+from itertools import chain, islice
 from pathlib import Path
 
-# Set up your directories and file paths
-graphdir = Path('graphs')
-csv_dir = Path('csvs')
-csv_dir.mkdir(exist_ok=True)  # Ensure the csv_dir exists
-# dot_file = graphdir / 'expected_graph.dot'
-dot_file = graphdir / 'graph.dot'
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_SIZE = 1000
+DEFAULT_CHUNK_ROWS = 10000
+DEFAULT_BUFFER_SIZE = 1 << 20
 
-# Read the DOT file into a NetworkX graph
-G = nx.drawing.nx_pydot.read_dot(dot_file)
 
 # Function to clean data
 def clean_data(value):
@@ -19,45 +20,166 @@ def clean_data(value):
         return value.strip().strip('"')
     return value
 
-# Paths for the output CSV files
-nodes_csv = csv_dir / 'nodes_csvwriter.csv'
-edges_csv = csv_dir / 'edges_csvwriter.csv'
-
-# Write nodes to 'nodes.csv'
-with nodes_csv.open('w', newline='', encoding='utf-8') as node_file:
-    # Determine the node attribute fields
-    node_attrs = set()
-    for _, data in G.nodes(data=True):
-        node_attrs.update(data.keys())
-    fieldnames = ['id'] + sorted(node_attrs)
-
-    # Configure the CSV writer to minimize quoting
-    writer = csv.DictWriter(node_file, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
-    writer.writeheader()
-
-    for node_id, data in G.nodes(data=True):
-        row = {'id': clean_data(node_id)}
-        # Clean and update data
-        row.update({k: clean_data(v) for k, v in data.items()})
-        writer.writerow(row)
-
-# Write edges to 'edges.csv'
-with edges_csv.open('w', newline='', encoding='utf-8') as edge_file:
-    # Determine the edge attribute fields
-    edge_attrs = set()
-    for _, _, data in G.edges(data=True):
-        edge_attrs.update(data.keys())
-    fieldnames = ['source', 'target'] + sorted(edge_attrs)
-
-    # Configure the CSV writer to minimize quoting
-    writer = csv.DictWriter(edge_file, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
-    writer.writeheader()
-
-    for source, target, data in G.edges(data=True):
-        row = {
-            'source': clean_data(source),
-            'target': clean_data(target)
-        }
-        # Clean and update data
-        row.update({k: clean_data(v) for k, v in data.items()})
-        writer.writerow(row)
+
+def format_value(value, separator='___'):
+    """
+    Formats an attribute value for CSV, joining list values with the separator.
+    """
+    if isinstance(value, (list, tuple)):
+        return separator.join(str(clean_data(v)) for v in value)
+    return clean_data(value)
+
+
+def open_csv(path, compress=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Opens a CSV file for writing with a large write buffer, gzip-compressed if compress is True
+    or, when compress is None, if the path ends with '.gz'.
+    """
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    if compress:
+        raw = gzip.GzipFile(path, mode='wb', compresslevel=6)
+        return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size), encoding='utf-8', newline='')
+    return open(path, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def discover_columns(rows, leading_columns=(), sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Discovers the CSV columns from a sample of the first rows.
+
+    Returns:
+        tuple: The columns (leading columns first, then the other keys sorted) and an iterator
+        over all rows, including the sampled ones.
+    """
+    iterator = iter(rows)
+    sample = list(islice(iterator, sample_size))
+    keys = set()
+    for row in sample:
+        keys.update(row.keys())
+    columns = list(leading_columns) + sorted(keys - set(leading_columns))
+    return columns, chain(sample, iterator)
+
+
+def write_csv(rows, path, columns=None, leading_columns=(), separator='___', sample_size=DEFAULT_SAMPLE_SIZE,
+              chunk_rows=DEFAULT_CHUNK_ROWS, compress=None, buffer_size=DEFAULT_BUFFER_SIZE, extrasaction='raise'):
+    """
+    Streams rows (dicts) into a CSV file in chunks without holding them all in memory.
+
+    Args:
+        rows (iterable of dict): Rows to write.
+        path (str or Path): Output path. A '.gz' suffix enables gzip compression.
+        columns (list of str): Declared schema. If None, columns are discovered from the first
+            sample_size rows; a later row with an unseen column then raises ValueError unless
+            extrasaction='ignore', which drops the unseen columns with a warning.
+        leading_columns (iterable of str): Columns to put first when discovering the schema.
+        separator (str): Separator used to join list values.
+        sample_size (int): Number of rows sampled for column discovery.
+        chunk_rows (int): Number of rows formatted and written per chunk.
+        compress (bool): Force gzip on or off.
+        buffer_size (int): Write buffer size in bytes.
+        extrasaction (str): 'raise' or 'ignore', for keys missing from the schema.
+
+    The rows are written to a temporary file that replaces path only once all rows are written,
+    so a failure never leaves a partial CSV behind.
+
+    Returns:
+        int: Number of rows written.
+    """
+    if extrasaction not in ('raise', 'ignore'):
+        raise ValueError(f"Unknown extrasaction '{extrasaction}'.")
+    if columns is None:
+        columns, rows = discover_columns(rows, leading_columns, sample_size)
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    schema = set(columns)
+    dropped = set()
+    count = 0
+    tmp_path = f"{path}.tmp"
+    try:
+        with open_csv(tmp_path, compress=compress, buffer_size=buffer_size) as f:
+            # Configure the CSV writer to minimize quoting
+            writer = csv.DictWriter(f, fieldnames=columns, quoting=csv.QUOTE_MINIMAL, extrasaction='ignore')
+            writer.writeheader()
+            for chunk in chunked(rows, chunk_rows):
+                for i, row in enumerate(chunk):
+                    extra = row.keys() - schema
+                    if extra and extrasaction == 'raise':
+                        raise ValueError(f"Row {count + i} of '{path}' has columns missing from the schema: {sorted(extra)}.")
+                    dropped.update(extra)
+                writer.writerows({k: format_value(v, separator) for k, v in row.items()} for row in chunk)
+                count += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if dropped:
+        logger.warning(f"Columns missing from the schema of '{path}' were dropped: {sorted(dropped)}.")
+    logger.info(f"{count} rows have been written to '{path}'.")
+    return count
+
+
+def node_rows(nodes):
+    """
+    Converts (node_id, attrs) pairs, e.g. G.nodes(data=True), into CSV rows.
+    """
+    for node_id, data in nodes:
+        row = {'id': node_id}
+        row.update(data)
+        yield row
+
+
+def edge_rows(edges):
+    """
+    Converts (source, target, attrs) triples, e.g. G.edges(data=True), into CSV rows.
+    """
+    for source, target, data in edges:
+        row = {'source': source, 'target': target}
+        row.update(data)
+        yield row
+
+
+def export_nodes(nodes, path, **kwargs):
+    return write_csv(node_rows(nodes), path, leading_columns=('id',), **kwargs)
+
+
+def export_edges(edges, path, **kwargs):
+    return write_csv(edge_rows(edges), path, leading_columns=('source', 'target'), **kwargs)
+
+
+def export_graph(G, nodes_path, edges_path, **kwargs):
+    """
+    Streams the nodes and edges of a (merged) graph into two CSV files.
+    """
+    return export_nodes(G.nodes(data=True), nodes_path, **kwargs), export_edges(G.edges(data=True), edges_path, **kwargs)
+
+
+def main():
+    import networkx as nx
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Set up your directories and file paths
+    graphdir = Path('graphs')
+    csv_dir = Path('csvs')
+    csv_dir.mkdir(exist_ok=True)  # Ensure the csv_dir exists
+    dot_file = graphdir / 'graph.dot'
+
+    # Read the DOT file into a NetworkX graph
+    G = nx.drawing.nx_pydot.read_dot(dot_file)
+
+    # Paths for the output CSV files
+    export_graph(G, csv_dir / 'nodes_csvwriter.csv', csv_dir / 'edges_csvwriter.csv')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,27 @@
-import pydot
-import csv
 import os
 import shutil
-from neo4j import GraphDatabase, basic_auth
-from dotenv import load_dotenv
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from kg_merger.backends import Neo4jBackend
+from kg_merger.csv_writer import clean_data, export_edges, export_nodes, write_csv
+from kg_merger.facets import FacetCatalogue
+from kg_merger.instrumentation import count, stage
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Retrieve configurations from environment variables
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
-DOT_FILE_PATH = os.getenv("DOT_FILE_PATH")
-IMPORT_DIR = os.getenv("IMPORT_DIR")
+def _file_sizes(*paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
 
-def dot_to_csv(dot_file_path, nodes_csv_path, relationships_csv_path, separator='___'):
+@stage('export')
+def dot_to_csv(dot_file_path, nodes_csv_path, relationships_csv_path, separator='___', facets_path=None, provenance_csv_path=None):
     """
     Parses the DOT file and generates nodes.csv and relationships.csv.
+    If facets_path is given, the facet catalogue of the relationships is written there as well.
+    If provenance_csv_path is given, the 'source_ids' of nodes merged with id_scheme='hash' are written
+    there as (id, source_id) rows, keeping them out of the node CSV and the Neo4j id index.
     """
+    import pydot
+
     try:
         # Parse the DOT file
         graphs = pydot.graph_from_dot_file(dot_file_path)
@@ -35,153 +33,130 @@ def dot_to_csv(dot_file_path, nodes_csv_path, relationships_csv_path, separator=
         # Extract nodes with IDs and labels
         nodes = graph.get_nodes()
         node_data = {}
+        provenance = []
         for node in nodes:
-            name = node.get_name().strip('"')
+            name = clean_data(node.get_name())
             if name.lower() in {'graph', 'node'}:
                 continue  # Skip default graph/node attributes
             attributes = node.get_attributes()
             node_id = name  # Assuming the name serves as the unique ID
-            label = attributes.get('label', name)  # Default label is the name if not provided
+            label = clean_data(attributes.get('label', name))  # Default label is the name if not provided
             node_data[node_id] = label
+            source_ids = clean_data(attributes.get('source_ids', ''))
+            if source_ids:
+                provenance.extend((node_id, source_id) for source_id in source_ids.split(separator))
 
-        # Extract edges with dynamic attributes
+        # Collect the relationship attribute keys; rows are streamed below without building a list
         edges = graph.get_edges()
-        relationships = []
         all_relationship_attributes = set()
         for edge in edges:
-            src = edge.get_source().strip('"')
-            dst = edge.get_destination().strip('"')
-            attrs = edge.get_attributes()
-
-            # Collect all attribute keys
-            attr_keys = set(attrs.keys())
+            all_relationship_attributes.update(edge.get_attributes().keys())
 
-            # Update the global set of attributes
-            all_relationship_attributes.update(attr_keys)
-
-            # Initialize a dictionary for the relationship
-            rel = {'source': src, 'target': dst}
-            for key in attr_keys:
-                rel[key] = attrs.get(key, '')
-            relationships.append(rel)
-
-        logger.info(f"Loaded {len(node_data)} nodes and {len(relationships)} relationships from DOT file.")
+        logger.info(f"Loaded {len(node_data)} nodes and {len(edges)} relationships from DOT file.")
 
         # Write nodes to CSV
-        with open(nodes_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['id', 'label'])  # Header
-            for node_id, label in sorted(node_data.items()):
-                writer.writerow([node_id, label])
+        node_count = export_nodes(
+            ((node_id, {'label': label}) for node_id, label in sorted(node_data.items())),
+            nodes_csv_path, columns=['id', 'label'], separator=separator,
+        )
 
         # Write relationships to CSV with dynamic attributes
+        facets = FacetCatalogue(separator=separator)
+
+        def relationships():
+            for edge in edges:
+                attrs = {key: clean_data(value) for key, value in edge.get_attributes().items()}
+                facets.add_edge(attrs)
+                yield clean_data(edge.get_source()), clean_data(edge.get_destination()), attrs
+
         sorted_attributes = sorted(all_relationship_attributes)
-        with open(relationships_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            header = ['source', 'target'] + sorted_attributes
-            writer.writerow(header)  # Header
-            for rel in relationships:
-                row = [rel.get('source', ''), rel.get('target', '')]
-                for attr in sorted_attributes:
-                    row.append(rel.get(attr, ''))
-                writer.writerow(row)
+        edge_count = export_edges(
+            relationships(), relationships_csv_path,
+            columns=['source', 'target'] + sorted_attributes, separator=separator,
+        )
+        count('export', rows=node_count + edge_count,
+              bytes=_file_sizes(nodes_csv_path, relationships_csv_path))
 
         logger.info(f"Nodes and relationships have been written to '{nodes_csv_path}' and '{relationships_csv_path}' respectively.")
+
+        if provenance_csv_path:
+            write_csv(
+                ({'id': node_id, 'source_id': source_id} for node_id, source_id in provenance),
+                provenance_csv_path, columns=['id', 'source_id'],
+            )
+            logger.info(f"{len(provenance)} provenance rows have been written to '{provenance_csv_path}'.")
+
+        if facets_path:
+            facets.save(facets_path)
         return True
 
     except Exception as e:
         logger.error(f"Error during DOT to CSV conversion: {e}")
         return False
 
-def load_csvs_into_neo4j(nodes_csv_path, relationships_csv_path, neo4j_uri, neo4j_user, neo4j_password, separator='___'):
+@stage('load')
+def load_csvs_into_neo4j(nodes_csv_path, relationships_csv_path, neo4j_uri, neo4j_user, neo4j_password, separator='___', facets_path=None, backend=None):
     """
     Loads nodes and relationships from CSV files into Neo4j using the CALL { ... } IN TRANSACTIONS syntax.
+    If facets_path points to a facet catalogue written by dot_to_csv, it is stored as (:Facet) nodes.
+    If backend (backends.GraphBackend) is given, the files are loaded into it instead of connecting
+    to neo4j_uri, e.g. into a backends.InMemoryBackend.
     """
+    owns_backend = backend is None
+    if owns_backend:
+        backend = Neo4jBackend(neo4j_uri, neo4j_user, neo4j_password)
     try:
-        driver = GraphDatabase.driver(neo4j_uri, auth=basic_auth(neo4j_user, neo4j_password))
-        with driver.session() as session:
-            # 1. Clear existing data
-            logger.info("Clearing existing data in Neo4j...")
-            session.run("MATCH (n) DETACH DELETE n")
-
-            # 2. Load nodes
-            logger.info("Loading nodes into Neo4j...")
-            load_nodes_query = f"""
-                CALL {{
-                    LOAD CSV WITH HEADERS FROM 'file:///{os.path.basename(nodes_csv_path)}' AS row
-                    CREATE (:Node {{id: row.id, label: row.label}})
-                }}
-                IN TRANSACTIONS OF 1000 ROWS
-            """
-            session.run(load_nodes_query)
-
-            # 3. Load relationships with dynamic attributes
-            logger.info("Loading relationships into Neo4j...")
-
-            # Dynamically determine the attributes from the relationships CSV header
-            with open(relationships_csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                headers = next(reader)
-                relationship_attributes = headers[2:]  # Exclude 'source' and 'target'
-
-            logger.info(f"Relationship attributes detected: {relationship_attributes}")
-
-            # Construct the SET clause dynamically
-            set_clauses = []
-            for attr in relationship_attributes:
-                # Only add the attribute if it's not empty
-                set_clauses.append(f"{attr}: CASE WHEN row.{attr} <> '' THEN SPLIT(row.{attr}, '{separator}') ELSE [] END")
-            set_clause = ",\n        ".join(set_clauses)
-
-            load_relationships_query = f"""
-                CALL {{
-                    LOAD CSV WITH HEADERS FROM 'file:///{os.path.basename(relationships_csv_path)}' AS row
-                    MATCH (a:Node {{id: row.source}}), (b:Node {{id: row.target}})
-                    CREATE (a)-[:RELATED {{
-                        {set_clause}
-                    }}]->(b)
-                }}
-                IN TRANSACTIONS OF 1000 ROWS
-            """
-            session.run(load_relationships_query)
-
-            # Verify relationships have been loaded correctly
-            verify_query = """
-                MATCH ()-[r:RELATED]->()
-                RETURN COUNT(r) AS totalRelationships
-            """
-            result = session.run(verify_query)
-            count = result.single()["totalRelationships"]
-            logger.info(f"Total relationships loaded: {count}")
-
-        driver.close()
-        logger.info("Data loaded into Neo4j successfully.")
+        total = backend.load_csvs(nodes_csv_path, relationships_csv_path, separator, facets_path)
+        count('load', rows=total,
+              bytes=_file_sizes(nodes_csv_path, relationships_csv_path))
+        logger.info(f"Data loaded into the {backend.name} backend successfully.")
         return True
 
     except Exception as e:
-        logger.error(f"Error during CSV loading into Neo4j: {e}")
+        logger.error(f"Error during CSV loading into {backend.name}: {e}")
         return False
+    finally:
+        if owns_backend:
+            backend.close()
 
 def main():
+    from dotenv import load_dotenv
+
+    # Configure logging and load environment variables
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+
+    # Retrieve configurations from environment variables
+    neo4j_uri = os.getenv("NEO4J_URI")
+    neo4j_user = os.getenv("NEO4J_USER")
+    neo4j_password = os.getenv("NEO4J_PASSWORD")
+    dot_file_path = os.getenv("DOT_FILE_PATH")
+    import_dir = os.getenv("IMPORT_DIR")
+    facets_path = os.getenv("FACETS_PATH")
+
     # Define CSV paths
     nodes_csv = 'nodes.csv'
     relationships_csv = 'relationships.csv'
 
-    # # 1. Convert DOT to CSV
-    # logger.info("Converting DOT file to CSV files...")
-    # success = dot_to_csv(DOT_FILE_PATH, nodes_csv, relationships_csv)
-    # if not success:
-    #     logger.error("DOT to CSV conversion failed. Exiting.")
-    #     return
-
     # 2. Move CSV files to Neo4j import directory
     # try:
     #     # Ensure the import directory exists
-    #     os.makedirs(IMPORT_DIR, exist_ok=True)
+    #     os.makedirs(import_dir, exist_ok=True)
 
     #     # Define destination paths
-    nodes_csv_dest = os.path.join(IMPORT_DIR, os.path.basename(nodes_csv))
-    relationships_csv_dest = os.path.join(IMPORT_DIR, os.path.basename(relationships_csv))
+    nodes_csv_dest = os.path.join(import_dir, os.path.basename(nodes_csv))
+    relationships_csv_dest = os.path.join(import_dir, os.path.basename(relationships_csv))
+
+    # 1. Convert DOT to CSV straight into the import directory, with the facet catalogue of the
+    # relationships, which is rebuilt on every export
+    if dot_file_path:
+        facets_path = facets_path or os.path.join(import_dir, 'facets.json')
+        os.makedirs(import_dir, exist_ok=True)
+        logger.info("Converting DOT file to CSV files...")
+        success = dot_to_csv(dot_file_path, nodes_csv_dest, relationships_csv_dest, facets_path=facets_path)
+        if not success:
+            logger.error("DOT to CSV conversion failed. Exiting.")
+            return
 
     #     # Remove existing CSVs in import directory to avoid duplicates
     #     if os.path.exists(nodes_csv_dest):
@@ -192,14 +167,14 @@ def main():
         # Move CSVs
     # shutil.move(nodes_csv, nodes_csv_dest)
     # shutil.move(relationships_csv, relationships_csv_dest)
-    # logger.info(f"Moved '{nodes_csv}' and '{relationships_csv}' to Neo4j import directory: '{IMPORT_DIR}'")
+    # logger.info(f"Moved '{nodes_csv}' and '{relationships_csv}' to Neo4j import directory: '{import_dir}'")
     # except Exception as e:
     #     logger.error(f"Error moving CSV files to import directory: {e}")
     #     return
 
     # 3. Load CSVs into Neo4j
     logger.info("Loading CSV files into Neo4j...")
-    success = load_csvs_into_neo4j(nodes_csv_dest, relationships_csv_dest, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    success = load_csvs_into_neo4j(nodes_csv_dest, relationships_csv_dest, neo4j_uri, neo4j_user, neo4j_password, facets_path=facets_path)
     if not success:
         logger.error("Loading CSVs into Neo4j failed. Exiting.")
         return
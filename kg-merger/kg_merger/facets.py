@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+from collections import Counter
+from functools import lru_cache
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+
+def split_values(value, separator='___'):
+    """
+    Splits a relationship attribute value into its individual values.
+
+    Merged DOT/CSV data stores list attributes as separator-joined strings while Neo4j
+    returns them as lists, so both representations are accepted.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value if v != '']
+    value = str(value)
+    if value == '':
+        return []
+    return value.split(separator)
+
+
+class FacetCatalogue:
+    """
+    Distinct values and edge counts per filterable relationship attribute.
+
+    The catalogue is filled once while the merged graph is exported or loaded and is then
+    kept up to date with add_edge/remove_edge/update_edge when a patch is applied (see
+    graph_diff.apply_patch and apply_patch_to_neo4j), so the query UI never has to scan all
+    relationships to populate its filters.
+    """
+
+    def __init__(self, attributes=None, separator='___'):
+        """
+        Args:
+            attributes (iterable of str): Attributes to track. None tracks every attribute seen.
+            separator (str): Separator used for list-valued attributes.
+        """
+        self.attributes = tuple(attributes) if attributes is not None else None
+        self.separator = separator
+        self.counts = {}
+        self.total_edges = 0
+        self.frozen = False
+
+    def freeze(self):
+        """
+        Makes the catalogue read-only, e.g. when it is shared between callers.
+
+        Returns:
+            FacetCatalogue: self.
+        """
+        self.counts = MappingProxyType({key: MappingProxyType(dict(counter)) for key, counter in self.counts.items()})
+        self.frozen = True
+        return self
+
+    def _check_writable(self):
+        if self.frozen:
+            raise TypeError("The facet catalogue is read-only.")
+
+    def _tracked(self, attrs):
+        if self.attributes is None:
+            return [key for key in attrs if key not in ('source', 'target')]
+        return self.attributes
+
+    def add_edge(self, attrs):
+        """
+        Counts one relationship. Each distinct value is counted once per edge.
+        """
+        self._check_writable()
+        self.total_edges += 1
+        for key in self._tracked(attrs):
+            counter = self.counts.setdefault(key, Counter())
+            for value in set(split_values(attrs.get(key), self.separator)):
+                counter[value] += 1
+
+    def remove_edge(self, attrs):
+        """
+        Reverts add_edge for a relationship that was deleted or is about to be replaced.
+        """
+        self._check_writable()
+        self.total_edges = max(0, self.total_edges - 1)
+        for key in self._tracked(attrs):
+            counter = self.counts.get(key)
+            if counter is None:
+                continue
+            for value in set(split_values(attrs.get(key), self.separator)):
+                counter[value] -= 1
+                if counter[value] <= 0:
+                    del counter[value]
+
+    def update_edge(self, old_attrs, new_attrs):
+        """
+        Applies an in-place change of a relationship, e.g. when merging appends a provider.
+        """
+        self.remove_edge(old_attrs)
+        self.add_edge(new_attrs)
+
+    @classmethod
+    def from_graph(cls, G, attributes=None, separator='___'):
+        """
+        Builds a catalogue from the edges of a (merged) networkx graph.
+        """
+        catalogue = cls(attributes=attributes, separator=separator)
+        for _, _, attrs in G.edges(data=True):
+            catalogue.add_edge(attrs)
+        return catalogue
+
+    def facets(self):
+        """
+        Returns the names of the attributes present in the catalogue.
+        """
+        return sorted(self.counts)
+
+    def values(self, attribute):
+        """
+        Returns the distinct values of an attribute, most frequent first.
+        """
+        counter = self.counts.get(attribute, Counter())
+        return [value for value, _ in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+
+    def count(self, attribute, value):
+        """
+        Returns the number of edges carrying the given attribute value.
+        """
+        return self.counts.get(attribute, Counter()).get(value, 0)
+
+    def estimate_count(self, user_criteria):
+        """
+        Returns an upper bound of the number of edges matched by user criteria.
+
+        Criteria use the same semantics as query_subgraph: ANY of the values within an
+        attribute, AND across attributes.
+        """
+        estimate = self.total_edges
+        for attribute, values in user_criteria.items():
+            matched = sum(self.count(attribute, value) for value in set(values))
+            estimate = min(estimate, matched)
+        return estimate
+
+    def to_dict(self):
+        return {
+            'separator': self.separator,
+            'attributes': list(self.attributes) if self.attributes is not None else None,
+            'total_edges': self.total_edges,
+            'facets': {key: dict(counter) for key, counter in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        catalogue = cls(attributes=data.get('attributes'), separator=data.get('separator', '___'))
+        catalogue.total_edges = data.get('total_edges', 0)
+        catalogue.counts = {key: Counter(values) for key, values in data.get('facets', {}).items()}
+        return catalogue
+
+    def save(self, path):
+        """
+        Writes the catalogue as JSON next to the exported snapshot. The file is replaced
+        atomically so readers never see a partial catalogue.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Facet catalogue with {len(self.counts)} attributes written to '{path}'.")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def store_in_neo4j(self, session):
+        """
+        Replaces the (:Facet {attribute, value, count}) nodes in Neo4j with this catalogue.
+        """
+        rows = [
+            {'attribute': key, 'value': value, 'count': count}
+            for key, counter in self.counts.items()
+            for value, count in counter.items()
+        ]
+        session.run("MATCH (f:Facet) DETACH DELETE f")
+        session.run(
+            """
+            UNWIND $rows AS row
+            CREATE (:Facet {attribute: row.attribute, value: row.value, count: row.count})
+            """,
+            rows=rows,
+        )
+        session.run(
+            "MERGE (m:FacetMeta {name: 'catalogue'}) SET m.total_edges = $total, m.separator = $separator",
+            total=self.total_edges,
+            separator=self.separator,
+        )
+
+    @classmethod
+    def from_neo4j(cls, session):
+        """
+        Reads a catalogue previously written with store_in_neo4j.
+        """
+        meta = session.run(
+            "MATCH (m:FacetMeta {name: 'catalogue'}) RETURN m.total_edges AS total, m.separator AS separator"
+        ).single()
+        catalogue = cls(separator=meta["separator"] if meta else '___')
+        catalogue.total_edges = meta["total"] if meta else 0
+        result = session.run("MATCH (f:Facet) RETURN f.attribute AS attribute, f.value AS value, f.count AS count")
+        for record in result:
+            catalogue.counts.setdefault(record["attribute"], Counter())[record["value"]] = record["count"]
+        return catalogue
+
+
+@lru_cache(maxsize=8)
+def _load_cached(path, mtime):
+    return FacetCatalogue.load(path).freeze()
+
+
+def get_facet_catalogue(path):
+    """
+    Returns the facet catalogue stored at path, or None if it does not exist.
+
+    The parsed catalogue is cached per file modification time, so repeated calls are free
+    and a rewritten catalogue is picked up on the next call. The cached catalogue is shared
+    and therefore frozen; load it with FacetCatalogue.load to update it.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_cached(os.path.abspath(path), mtime)
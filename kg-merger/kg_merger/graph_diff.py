@@ -0,0 +1,491 @@
+"""
+Structural diff between two versions of a merged graph.
+
+Every node and edge is reduced to a canonical signature (node ID, or source, target and label for
+edges) that is looked up in a hash table, so a diff is a linear pass over both versions instead of
+a line diff of the DOT files. Large files can be diffed in streaming mode: both files are read
+statement by statement and partitioned into bucket files on disk by a hash of the signature, and
+each bucket is diffed on its own, so memory is bounded by the largest bucket.
+
+The patch is a compact JSON document:
+
+    {
+      "format": "kg-merger-patch/1",
+      "nodes": {"added":   [[id, attrs], ...],
+                "removed": [id, ...],
+                "changed": [[id, set_attrs, unset_keys], ...]},
+      "edges": {"added":   [[source, target, attrs], ...],
+                "removed": [[source, target, label, n], ...],
+                "changed": [[source, target, label, n, set_attrs, unset_keys], ...]},
+      "stats": {...}
+    }
+
+where n is the occurrence of the (source, target, label) edge, 0 unless the same relation appears
+more than once. apply_patch applies a patch to a networkx graph and apply_patch_to_neo4j to the
+database loaded by data_loader.
+
+Usage:
+    python -m kg_merger.graph_diff old.dot new.dot [-o patch.json] [--buckets 64]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+PATCH_FORMAT = 'kg-merger-patch/1'
+
+# Attributes added by the console when it writes the published graph, and the edge key pydot's
+# write_dot puts on every MultiDiGraph edge, which are not data
+VIEW_ATTRIBUTES = frozenset(('id', 'from', 'to', 'x', 'y', 'fixed', 'key'))
+
+TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|(//.*|/\*.*?\*/)|(->|--)|([\[\]=,;{}])|([^\s\[\]=,;{}"]+)')
+DEFAULT_STATEMENTS = frozenset(('graph', 'node', 'edge'))
+
+# Fast path for the common one-statement-per-line layout; anything else goes through the tokenizer
+_ID = r'"(?:[^"\\]|\\.)*"|[\w.]+'
+_ATTRIBUTE = rf'({_ID})\s*=\s*({_ID})'
+NODE_STATEMENT = re.compile(rf'^\s*({_ID})\s*(?:\[(.*)\])?\s*;?\s*$')
+EDGE_STATEMENT = re.compile(rf'^\s*({_ID})\s*(?:->|--)\s*({_ID})\s*(?:\[(.*)\])?\s*;?\s*$')
+ATTRIBUTE = re.compile(_ATTRIBUTE)
+ATTRIBUTE_LIST = re.compile(rf'^\s*(?:{_ATTRIBUTE}\s*[,;]?\s*)*$')
+
+
+def record_key(record):
+    """
+    Returns the canonical signature of a node or edge record: ('n', id) or
+    ('e', source, target, label).
+    """
+    if record[0] == 'n':
+        return 'n', record[1]
+    return 'e', record[1], record[2], record[3].get('label')
+
+
+def bucket_of(key, buckets):
+    return zlib.crc32('\0'.join(str(part) for part in key).encode('utf-8')) % buckets
+
+
+def _clean_attrs(attrs, ignore):
+    return {str(key): str(value).strip('"') for key, value in attrs.items() if key not in ignore}
+
+
+def graph_records(G, ignore=VIEW_ATTRIBUTES):
+    """
+    Yields ('n', id, attrs) and ('e', source, target, attrs) records of a networkx graph.
+    """
+    for node_id, attrs in G.nodes(data=True):
+        yield ('n', str(node_id).strip('"'), _clean_attrs(attrs, ignore))
+    for source, target, attrs in G.edges(data=True):
+        yield ('e', str(source).strip('"'), str(target).strip('"'), _clean_attrs(attrs, ignore))
+
+
+def _unescape(value):
+    return re.sub(r'\\(["\\])', r'\1', value)
+
+
+def _id(token):
+    if token[0] == '"':
+        token = token[1:-1]
+        return _unescape(token) if '\\' in token else token
+    return token
+
+
+def _fast_statement(line, ignore):
+    """
+    Parses a line holding exactly one node or edge statement, or returns None.
+    """
+    match = EDGE_STATEMENT.match(line)
+    if match is not None:
+        ids, attributes = (match.group(1), match.group(2)), match.group(3)
+    else:
+        match = NODE_STATEMENT.match(line)
+        if match is None or match.group(1) in DEFAULT_STATEMENTS:
+            return None
+        ids, attributes = (match.group(1),), match.group(2)
+    attrs = {}
+    if attributes:
+        if not ATTRIBUTE_LIST.match(attributes):
+            return None
+        for key, value in ATTRIBUTE.findall(attributes):
+            key = _id(key)
+            if key not in ignore:
+                attrs[key] = _id(value)
+    if len(ids) == 2:
+        return ('e', _id(ids[0]), _id(ids[1]), attrs)
+    return ('n', _id(ids[0]), attrs)
+
+
+def _tokens(text):
+    for match in TOKEN.finditer(text):
+        quoted, comment, edge_op, punctuation, word = match.groups()
+        if quoted is not None:
+            yield 'id', _unescape(quoted)
+        elif comment is not None:
+            continue
+        elif edge_op is not None:
+            yield 'edgeop', edge_op
+        elif punctuation is not None:
+            yield punctuation, punctuation
+        else:
+            yield 'id', word
+
+
+def _parse_statement(tokens, ignore):
+    """
+    Parses one node or edge statement from its tokens into records.
+    """
+    ids = []
+    attrs = {}
+    i = 0
+    while i < len(tokens) and tokens[i][0] in ('id', 'edgeop'):
+        if tokens[i][0] == 'id':
+            ids.append(tokens[i][1])
+        i += 1
+    while i < len(tokens):
+        if tokens[i][0] == 'id' and i + 2 < len(tokens) and tokens[i + 1][0] == '=' and tokens[i + 2][0] == 'id':
+            if tokens[i][1] not in ignore:
+                attrs[tokens[i][1]] = tokens[i + 2][1]
+            i += 3
+        else:
+            i += 1
+    has_edge = any(kind == 'edgeop' for kind, _ in tokens)
+    if not ids or (not has_edge and ids[0] in DEFAULT_STATEMENTS):
+        return []
+    if len(tokens) > 1 and tokens[1][0] == '=':
+        return []  # Graph attribute such as rankdir=LR
+    if has_edge:
+        return [('e', source, target, dict(attrs)) for source, target in zip(ids, ids[1:])]
+    return [('n', ids[0], attrs)]
+
+
+def iter_dot_records(path, ignore=VIEW_ATTRIBUTES):
+    """
+    Streams the node and edge records of a DOT file without building a graph. Statements may
+    span lines; nodes only mentioned in edges are not reported as node records.
+    """
+    buffer = []
+    depth = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if not buffer and (not stripped or stripped.startswith(('//', '#'))):
+                continue
+            if not buffer and depth == 0:
+                record = _fast_statement(line, ignore)
+                if record is not None:
+                    yield record
+                    continue
+            for kind, value in _tokens(line):
+                if kind == '{' and depth == 0:
+                    buffer = []  # Graph or subgraph header
+                    continue
+                if kind == '}' and depth == 0:
+                    if buffer:
+                        yield from _parse_statement(buffer, ignore)
+                        buffer = []
+                    continue
+                if kind == '[':
+                    depth += 1
+                elif kind == ']':
+                    depth -= 1
+                if kind == ';' and depth == 0:
+                    yield from _parse_statement(buffer, ignore)
+                    buffer = []
+                    continue
+                buffer.append((kind, value))
+            # A statement without ';' ends at the end of its line unless an attribute list is open
+            if buffer and depth == 0:
+                yield from _parse_statement(buffer, ignore)
+                buffer = []
+    if buffer:
+        yield from _parse_statement(buffer, ignore)
+
+
+def _keyed(records):
+    """
+    Groups records by their hashed key, keeping repeated edges in order.
+    """
+    keyed = {}
+    for record in records:
+        key = record_key(record)
+        same_key = keyed.get(key)
+        if same_key is None:
+            keyed[key] = [record]
+        else:
+            same_key.append(record)
+    return keyed
+
+
+def new_patch():
+    return {
+        'format': PATCH_FORMAT,
+        'nodes': {'added': [], 'removed': [], 'changed': []},
+        'edges': {'added': [], 'removed': [], 'changed': []},
+        'stats': {'old_nodes': 0, 'old_edges': 0, 'new_nodes': 0, 'new_edges': 0},
+    }
+
+
+def _attribute_changes(old_attrs, new_attrs):
+    changed = {key: value for key, value in new_attrs.items() if old_attrs.get(key) != value}
+    removed = sorted(key for key in old_attrs if key not in new_attrs)
+    return changed, removed
+
+
+def _diff_keyed(old, new, patch):
+    stats = patch['stats']
+    for key, old_records in old.items():
+        new_records = new.get(key, [])
+        kind = old_records[0][0]
+        stats['old_nodes' if kind == 'n' else 'old_edges'] += len(old_records)
+        for n, record in enumerate(old_records):
+            if n < len(new_records):
+                if record[-1] == new_records[n][-1]:
+                    continue
+                changed, removed = _attribute_changes(record[-1], new_records[n][-1])
+                if kind == 'n':
+                    patch['nodes']['changed'].append([record[1], changed, removed])
+                else:
+                    patch['edges']['changed'].append([record[1], record[2], record[3].get('label'), n, changed, removed])
+            elif kind == 'n':
+                patch['nodes']['removed'].append(record[1])
+            else:
+                patch['edges']['removed'].append([record[1], record[2], record[3].get('label'), n])
+    for key, new_records in new.items():
+        kind = new_records[0][0]
+        stats['new_nodes' if kind == 'n' else 'new_edges'] += len(new_records)
+        for record in new_records[len(old.get(key, ())):]:
+            if kind == 'n':
+                patch['nodes']['added'].append([record[1], record[2]])
+            else:
+                patch['edges']['added'].append([record[1], record[2], record[3]])
+
+
+def _finish(patch, start):
+    stats = patch['stats']
+    for kind in ('nodes', 'edges'):
+        for change in ('added', 'removed', 'changed'):
+            stats[f'{kind}_{change}'] = len(patch[kind][change])
+    stats['seconds'] = round(time.perf_counter() - start, 6)
+    return patch
+
+
+def diff_records(old_records, new_records):
+    """
+    Diffs two iterables of records in memory.
+    """
+    start = time.perf_counter()
+    patch = new_patch()
+    _diff_keyed(_keyed(old_records), _keyed(new_records), patch)
+    return _finish(patch, start)
+
+
+def diff_graphs(old_graph, new_graph, ignore=VIEW_ATTRIBUTES):
+    """
+    Diffs two networkx graphs, e.g. two merge results.
+
+    Returns:
+        dict: The patch turning old_graph into new_graph.
+    """
+    return diff_records(graph_records(old_graph, ignore), graph_records(new_graph, ignore))
+
+
+def _partition(records, directory, prefix, buckets):
+    files = [open(os.path.join(directory, f'{prefix}-{i}.jsonl'), 'w', encoding='utf-8') for i in range(buckets)]
+    try:
+        for record in records:
+            files[bucket_of(record_key(record), buckets)].write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        for f in files:
+            f.close()
+
+
+def _read_bucket(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return _keyed(tuple(json.loads(line)) for line in f)
+
+
+def diff_dot_files(old_path, new_path, buckets=1, ignore=VIEW_ATTRIBUTES, tmp_dir=None):
+    """
+    Diffs two DOT files by streaming their statements.
+
+    Args:
+        buckets (int): With 1 both files are diffed in memory (only keys, signatures and records are
+            kept, not graphs). With more, the records are first partitioned into bucket files in a
+            temporary directory and diffed bucket by bucket, for files larger than memory.
+        tmp_dir (str): Where to create the temporary bucket directory.
+
+    Returns:
+        dict: The patch turning old_path into new_path.
+    """
+    if buckets <= 1:
+        return diff_records(iter_dot_records(old_path, ignore), iter_dot_records(new_path, ignore))
+
+    start = time.perf_counter()
+    patch = new_patch()
+    directory = tempfile.mkdtemp(prefix='kg-diff-', dir=tmp_dir)
+    try:
+        _partition(iter_dot_records(old_path, ignore), directory, 'old', buckets)
+        _partition(iter_dot_records(new_path, ignore), directory, 'new', buckets)
+        for i in range(buckets):
+            old = _read_bucket(os.path.join(directory, f'old-{i}.jsonl'))
+            new = _read_bucket(os.path.join(directory, f'new-{i}.jsonl'))
+            _diff_keyed(old, new, patch)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return _finish(patch, start)
+
+
+def _find_edge(G, source, target, label, n):
+    matches = [key for key, attrs in (G.get_edge_data(source, target) or {}).items() if attrs.get('label') == label]
+    if n >= len(matches):
+        raise KeyError(f"Edge {source} -> {target} [{label}] #{n} not found.")
+    return matches[n]
+
+
+def apply_patch(G, patch, facets=None):
+    """
+    Applies a patch to a networkx.MultiDiGraph in place.
+
+    Args:
+        facets (FacetCatalogue): Catalogue of G's edges, kept up to date with the patched edges.
+
+    Returns:
+        networkx.MultiDiGraph: G.
+    """
+    if patch.get('format') != PATCH_FORMAT:
+        raise ValueError(f"Unsupported patch format '{patch.get('format')}'.")
+    # Remove edges from the last occurrence down, so the occurrence numbers stay valid
+    for source, target, label, n in sorted(patch['edges']['removed'], key=lambda edge: -edge[3]):
+        key = _find_edge(G, source, target, label, n)
+        if facets is not None:
+            facets.remove_edge(G[source][target][key])
+        G.remove_edge(source, target, key)
+    for node_id in patch['nodes']['removed']:
+        G.remove_node(node_id)
+    for node_id, attrs in patch['nodes']['added']:
+        G.add_node(node_id, **attrs)
+    for node_id, changed, removed in patch['nodes']['changed']:
+        attrs = G.nodes[node_id]
+        attrs.update(changed)
+        for key in removed:
+            attrs.pop(key, None)
+    for source, target, label, n, changed, removed in patch['edges']['changed']:
+        attrs = G[source][target][_find_edge(G, source, target, label, n)]
+        old_attrs = dict(attrs)
+        attrs.update(changed)
+        for key in removed:
+            attrs.pop(key, None)
+        if facets is not None:
+            facets.update_edge(old_attrs, attrs)
+    for source, target, attrs in patch['edges']['added']:
+        # A 'key' attribute would be taken as the networkx edge key and overwrite a parallel edge
+        attrs = {key: value for key, value in attrs.items() if key != 'key'}
+        G.add_edge(source, target, **attrs)
+        if facets is not None:
+            facets.add_edge(attrs)
+    return G
+
+
+def _chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def apply_patch_to_neo4j(session, patch, separator='___', batch_size=5000, facets=None):
+    """
+    Applies a patch to the (:Node)-[:RELATED]->(:Node) graph loaded by data_loader, whose
+    relationship properties are lists split by separator. Repeated relations are matched in
+    database order. The DataVersion stamp is updated so query caches are invalidated.
+
+    If facets is given (e.g. FacetCatalogue.from_neo4j), it is updated with the properties the
+    removed and changed relationships had in the database and stored back as the (:Facet) nodes.
+    """
+    def properties(attrs, removed=()):
+        props = {key: value.split(separator) if value else [] for key, value in attrs.items()}
+        props.update({key: None for key in removed})
+        return props
+
+    def edge_row(source, target, label, n, **extra):
+        return {'source': source, 'target': target, 'label': label.split(separator) if label else [], 'n': n, **extra}
+
+    match_edge = """
+        UNWIND $rows AS row
+        MATCH (:Node {id: row.source})-[r:RELATED]->(:Node {id: row.target})
+        WHERE r.label = row.label
+        WITH row, collect(r) AS rs
+        WITH row, rs[row.n] AS r
+        WHERE r IS NOT NULL
+    """
+    # With a catalogue, removed and changed relationships return their properties to update it
+    if facets is None:
+        removed_query, changed_query, on_removed, on_changed = "DELETE r", "SET r += row.properties", None, None
+    else:
+        removed_query = "WITH r, properties(r) AS old DELETE r RETURN old"
+        changed_query = "WITH row, r, properties(r) AS old SET r += row.properties RETURN old, properties(r) AS new"
+        on_removed = lambda record: facets.remove_edge(record['old'])
+        on_changed = lambda record: facets.update_edge(record['old'], record['new'])
+    statements = [
+        (match_edge + removed_query, [edge_row(*edge) for edge in patch['edges']['removed']], on_removed),
+        ("UNWIND $rows AS row MATCH (n:Node {id: row.id}) DETACH DELETE n",
+         [{'id': node_id} for node_id in patch['nodes']['removed']], None),
+        ("UNWIND $rows AS row MERGE (n:Node {id: row.id}) SET n.label = row.label",
+         [{'id': node_id, 'label': attrs.get('label', node_id)} for node_id, attrs in patch['nodes']['added']], None),
+        ("UNWIND $rows AS row MATCH (n:Node {id: row.id}) SET n.label = row.label",
+         [{'id': node_id, 'label': changed['label']} for node_id, changed, _ in patch['nodes']['changed'] if 'label' in changed],
+         None),
+        (match_edge + changed_query,
+         [edge_row(source, target, label, n, properties=properties(changed, removed))
+          for source, target, label, n, changed, removed in patch['edges']['changed']], on_changed),
+        ("""
+            UNWIND $rows AS row
+            MATCH (a:Node {id: row.source}), (b:Node {id: row.target})
+            CREATE (a)-[r:RELATED]->(b)
+            SET r = row.properties
+         """,
+         [{'source': source, 'target': target, 'properties': properties(attrs)} for source, target, attrs in patch['edges']['added']],
+         None),
+    ]
+    for query, rows, on_record in statements:
+        for chunk in _chunks(rows, batch_size):
+            result = session.run(query, rows=chunk)
+            if on_record is None:
+                result.consume()
+            else:
+                for record in result:
+                    on_record(record)
+    if facets is not None:
+        for _, _, attrs in patch['edges']['added']:
+            facets.add_edge({key: value for key, value in attrs.items() if key != 'key'})
+        facets.store_in_neo4j(session)
+    session.run("MERGE (m:DataVersion {name: 'kg'}) SET m.version = $version", version=str(time.time_ns()))
+    logger.info(f"Patch applied to Neo4j: {json.dumps({k: v for k, v in patch['stats'].items() if k != 'seconds'})}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old', help="Previous version (DOT).")
+    parser.add_argument('new', help="New version (DOT).")
+    parser.add_argument('-o', '--output', help="Write the patch here instead of stdout.")
+    parser.add_argument('--buckets', type=int, default=1, help="Diff in streaming mode with this many bucket files.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    patch = diff_dot_files(args.old, args.new, buckets=args.buckets)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(patch, f, ensure_ascii=False)
+    else:
+        json.dump(patch, sys.stdout, ensure_ascii=False)
+        sys.stdout.write('\n')
+    logger.info(f"Diff stats: {patch['stats']}")
+
+
+if __name__ == "__main__":
+    main()
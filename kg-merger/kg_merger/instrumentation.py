@@ -0,0 +1,287 @@
+"""
+Lightweight per-stage instrumentation for the kg-merger pipeline.
+
+Stages (parsing, cleaning, merging, export, loading, querying) are wrapped in spans that record
+calls, wall time, rows and bytes processed and how much the stage raised the peak RSS of the
+process. Instrumentation is disabled by default and then costs a single flag check per call. Set KG_MERGER_METRICS to a
+directory to enable it and get a JSON report and a Prometheus text-format file per run, or call
+enable() and write the reports yourself.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from kg_merger import profiling
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENV_VAR = 'KG_MERGER_METRICS'
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of the process so far, or None if unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.peak_rss_growth = None
+        self.counters = {}
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'wall_time_seconds': round(self.wall_time, 6),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_second': round(self.rows / self.wall_time, 3) if self.wall_time else None,
+            'peak_rss_growth_bytes': self.peak_rss_growth,
+            'counters': dict(self.counters),
+        }
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, rows=0, bytes=0, **counters):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, instrumentation, stage):
+        self.instrumentation = instrumentation
+        self.stage = stage
+
+    def __enter__(self):
+        self.peak_rss = peak_rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        peak_rss = peak_rss_bytes()
+        with self.instrumentation._lock:
+            stats = self.instrumentation._stats(self.stage)
+            stats.calls += 1
+            stats.wall_time += elapsed
+            if peak_rss is not None:
+                # The process high-water mark only moves when the stage goes above every earlier
+                # peak, so this is the memory the stage added on top of it, not its own footprint
+                stats.peak_rss_growth = (stats.peak_rss_growth or 0) + peak_rss - self.peak_rss
+        return False
+
+    def count(self, rows=0, bytes=0, **counters):
+        self.instrumentation.count(self.stage, rows=rows, bytes=bytes, **counters)
+
+
+class Instrumentation:
+    """
+    Collects StageStats per stage name for one run.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, stage):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+            _register_exit_reports()
+        return stats
+
+    def span(self, stage):
+        """
+        Returns a context manager timing one execution of stage. The returned span has a
+        count() method to record rows, bytes and other counters.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage)
+
+    def count(self, stage, rows=0, bytes=0, **counters):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats(stage)
+            stats.rows += rows
+            stats.bytes += bytes
+            for name, value in counters.items():
+                stats.counters[name] = stats.counters.get(name, 0) + value
+
+    def record(self, stage, seconds, rows=0, bytes=0, **counters):
+        """
+        Records one execution of stage that was timed elsewhere, e.g. in a worker process.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats(stage)
+            stats.calls += 1
+            stats.wall_time += seconds
+        self.count(stage, rows=rows, bytes=bytes, **counters)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.run_id = uuid.uuid4().hex
+            self.started_at = time.time()
+
+    def report(self):
+        with self._lock:
+            return {
+                'run_id': self.run_id,
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 6),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'stages': {stage: stats.to_dict() for stage, stats in sorted(self.stages.items())},
+            }
+
+    def to_prometheus(self):
+        """
+        Renders the stage statistics in the Prometheus text exposition format.
+        """
+        report = self.report()
+        metrics = [
+            ('kg_merger_stage_calls_total', 'counter', 'Number of executions of a pipeline stage.', 'calls'),
+            ('kg_merger_stage_seconds_total', 'counter', 'Wall time spent in a pipeline stage.', 'wall_time_seconds'),
+            ('kg_merger_stage_rows_total', 'counter', 'Rows processed by a pipeline stage.', 'rows'),
+            ('kg_merger_stage_bytes_total', 'counter', 'Bytes processed by a pipeline stage.', 'bytes'),
+            ('kg_merger_stage_peak_rss_growth_bytes_total', 'counter',
+             'Growth of the process peak RSS during a pipeline stage.', 'peak_rss_growth_bytes'),
+        ]
+        lines = []
+        for name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, stats in report['stages'].items():
+                if stats[key] is not None:
+                    lines.append(f'{name}{{stage="{_escape_label(stage)}",run_id="{report["run_id"]}"}} {stats[key]}')
+        counters = [(stage, counter, value) for stage, stats in report['stages'].items() for counter, value in stats['counters'].items()]
+        if counters:
+            lines.append("# HELP kg_merger_stage_counter_total Custom counters recorded by a pipeline stage.")
+            lines.append("# TYPE kg_merger_stage_counter_total counter")
+            for stage, counter, value in counters:
+                lines.append(
+                    f'kg_merger_stage_counter_total{{stage="{_escape_label(stage)}",counter="{_escape_label(counter)}",'
+                    f'run_id="{report["run_id"]}"}} {value}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, directory):
+        """
+        Writes metrics-<run_id>.json and metrics-<run_id>.prom to directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"metrics-{self.run_id}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        prom_path = os.path.join(directory, f"metrics-{self.run_id}.prom")
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        logger.info(f"Metrics written to '{json_path}' and '{prom_path}'.")
+        return json_path, prom_path
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_instrumentation = Instrumentation(enabled=bool(os.getenv(METRICS_ENV_VAR)))
+
+
+def get_instrumentation():
+    return _instrumentation
+
+
+def enable():
+    _instrumentation.enabled = True
+
+
+def disable():
+    _instrumentation.enabled = False
+
+
+def span(stage):
+    return _instrumentation.span(stage)
+
+
+def count(stage, rows=0, bytes=0, **counters):
+    _instrumentation.count(stage, rows=rows, bytes=bytes, **counters)
+
+
+def record(stage, seconds, rows=0, bytes=0, **counters):
+    _instrumentation.record(stage, seconds, rows=rows, bytes=bytes, **counters)
+
+
+def stage(name, rows=None):
+    """
+    Decorator recording every call of the function as a span of stage `name`, profiled with
+    kg_merger.profiling when the stage is selected there.
+
+    Args:
+        name (str): Stage name.
+        rows (callable): Optional function of the return value giving the number of rows processed.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _instrumentation.enabled and not profiling.is_enabled():
+                return func(*args, **kwargs)
+            with _instrumentation.span(name) as current, profiling.profile(name):
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.count(rows=rows(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def _write_reports_at_exit():
+    directory = os.getenv(METRICS_ENV_VAR)
+    if directory and _instrumentation.stages:
+        _instrumentation.write_reports(directory)
+
+
+_exit_reports_registered = False
+
+
+def _register_exit_reports():
+    """
+    Registers the report writer on the first recorded stage rather than at import.
+    """
+    global _exit_reports_registered
+    if not _exit_reports_registered:
+        _exit_reports_registered = True
+        atexit.register(_write_reports_at_exit)
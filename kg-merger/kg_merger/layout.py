@@ -0,0 +1,211 @@
+import json
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _squared_distances(a, b):
+    """
+    Pairwise squared distances between the rows of a and b, floored to keep forces finite.
+    """
+    dx = a[:, 0, None] - b[None, :, 0]
+    dy = a[:, 1, None] - b[None, :, 1]
+    return np.maximum(dx * dx + dy * dy, 1e-4)
+
+
+def force_layout(pos, sources, targets, movable, iterations=50, seed=0, chunk_size=4096):
+    """
+    Force-directed (Fruchterman-Reingold) layout in NumPy with a grid approximation of the
+    repulsive forces.
+
+    Nodes are binned into roughly sqrt(n) cells of equal population. Repulsion between nodes of the same cell
+    is computed exactly, while every other cell acts as a single mass at its centroid, which
+    brings one iteration down from O(n^2) to about O(n^1.5). Attraction is computed from the
+    edge arrays only, so sparse graphs stay cheap.
+
+    Args:
+        pos (numpy.ndarray): Initial positions, shape (n, 2). Updated in place.
+        sources (numpy.ndarray): Edge source indices.
+        targets (numpy.ndarray): Edge target indices.
+        movable (numpy.ndarray): Boolean mask of nodes that may move. Others stay fixed.
+        iterations (int): Number of iterations.
+        seed (int): Seed for the jitter that separates coincident nodes.
+        chunk_size (int): Number of nodes processed at once for the far-field forces.
+
+    Returns:
+        numpy.ndarray: The positions.
+    """
+    n = len(pos)
+    moving = np.flatnonzero(movable)
+    if n < 2 or len(moving) == 0:
+        return pos
+
+    rng = np.random.default_rng(seed)
+    k = 1.0  # Ideal edge length; positions are scaled to about sqrt(n) across
+    grid = max(1, int(math.sqrt(math.sqrt(n))))
+    temperature = 0.1 * math.sqrt(n) + 1.0
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        displacement = np.zeros_like(pos)
+
+        # Bin nodes into balanced cells: strips of equal size along x, split along y
+        by_x = np.argsort(pos[:, 0], kind='stable')
+        strip = np.empty(n, dtype=np.int64)
+        strip[by_x] = np.arange(n) * grid // n
+        by_strip = np.lexsort((pos[:, 1], strip))
+        strip_start = np.searchsorted(strip[by_strip], strip[by_strip])
+        strip_size = np.bincount(strip, minlength=grid)[strip[by_strip]]
+        cell = np.empty(n, dtype=np.int64)
+        cell[by_strip] = strip[by_strip] * grid + (np.arange(n) - strip_start) * grid // strip_size
+        mass = np.bincount(cell, minlength=grid * grid).astype(float)
+        centroid = np.zeros((grid * grid, 2))
+        np.add.at(centroid, cell, pos)
+        occupied = mass > 0
+        centroid[occupied] /= mass[occupied, None]
+        occupied_cells = np.flatnonzero(occupied)
+
+        # Far field: every other cell acts as one mass at its centroid
+        # sum_j w_ij (p_i - c_j) is computed as p_i * sum_j w_ij - W @ c, a matrix product
+        centroids = centroid[occupied_cells]
+        for start in range(0, len(moving), chunk_size):
+            idx = moving[start:start + chunk_size]
+            weight = mass[occupied_cells][None, :] * k * k / _squared_distances(pos[idx], centroids)
+            weight[cell[idx, None] == occupied_cells[None, :]] = 0.0
+            displacement[idx] += pos[idx] * weight.sum(axis=1)[:, None] - weight @ centroids
+
+        # Near field: exact repulsion within each cell
+        order = np.argsort(cell, kind='stable')
+        boundaries = np.flatnonzero(np.diff(cell[order])) + 1
+        for members in np.split(order, boundaries):
+            rows = members[movable[members]]
+            if len(members) < 2 or len(rows) == 0:
+                continue
+            weight = k * k / _squared_distances(pos[rows], pos[members])
+            displacement[rows] += pos[rows] * weight.sum(axis=1)[:, None] - weight @ pos[members]
+
+        # Attraction along edges
+        if len(sources):
+            delta = pos[sources] - pos[targets]
+            dist = np.sqrt(np.maximum((delta ** 2).sum(axis=1), 1e-8))
+            force = delta * (dist / k)[:, None]
+            np.add.at(displacement, sources, -force)
+            np.add.at(displacement, targets, force)
+
+        # Limit the step by the temperature and move only the movable nodes
+        length = np.sqrt(np.maximum((displacement ** 2).sum(axis=1), 1e-12))
+        step = displacement * (np.minimum(length, temperature) / length)[:, None]
+        step += rng.normal(scale=1e-3, size=step.shape)
+        pos[moving] += step[moving]
+        temperature = max(temperature - cooling, 1e-3)
+
+    return pos
+
+
+class LayoutCache:
+    """
+    Node position cache shared across subgraph layouts.
+
+    Positions are remembered per node ID, so overlapping subgraphs reuse earlier positions
+    and only newly appearing nodes are laid out, with the known nodes held fixed. Saved
+    positions are keyed by str(node) and are matched back to the graph's node IDs when a
+    graph containing them is laid out, so non-string IDs such as integers survive a reload.
+    """
+
+    def __init__(self, iterations=50, incremental_iterations=20, seed=0):
+        self.iterations = iterations
+        self.incremental_iterations = incremental_iterations
+        self.seed = seed
+        self.positions = {}
+        self._saved = {}  # Loaded positions not matched to a node ID yet, by str(node)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.positions) + len(self._saved)
+
+    def _restore(self, node):
+        xy = self._saved.pop(str(node), None)
+        if xy is None:
+            return False
+        self.positions[node] = xy
+        return True
+
+    def layout(self, G):
+        """
+        Returns positions for every node of G, computing only the ones not cached yet.
+
+        Args:
+            G (networkx.Graph): The (sub)graph to lay out.
+
+        Returns:
+            dict: Mapping from node ID to an (x, y) tuple.
+        """
+        with self._lock:
+            nodes = list(G.nodes())
+            new_nodes = [node for node in nodes if node not in self.positions and not self._restore(node)]
+            if new_nodes:
+                self._layout_new_nodes(G, nodes, new_nodes)
+            return {node: self.positions[node] for node in nodes}
+
+    def _layout_new_nodes(self, G, nodes, new_nodes):
+        index = {node: i for i, node in enumerate(nodes)}
+        rng = np.random.default_rng(self.seed + len(self.positions))
+        n = len(nodes)
+        pos = np.zeros((n, 2))
+        movable = np.zeros(n, dtype=bool)
+        scale = math.sqrt(n)
+
+        for node in nodes:
+            if node in self.positions:
+                pos[index[node]] = self.positions[node]
+
+        # Start new nodes next to their already placed neighbours when there are any
+        incremental = len(new_nodes) < n
+        for node in new_nodes:
+            i = index[node]
+            movable[i] = True
+            placed = [index[m] for m in _neighbours(G, node) if m in self.positions]
+            if placed:
+                pos[i] = pos[placed].mean(axis=0) + rng.normal(scale=0.5, size=2)
+            else:
+                pos[i] = rng.uniform(-scale / 2, scale / 2, size=2)
+
+        edges = [(index[u], index[v]) for u, v in G.edges() if u != v]
+        sources = np.array([u for u, _ in edges], dtype=np.int64)
+        targets = np.array([v for _, v in edges], dtype=np.int64)
+        iterations = self.incremental_iterations if incremental else self.iterations
+        force_layout(pos, sources, targets, movable, iterations=iterations, seed=self.seed)
+
+        for node in new_nodes:
+            x, y = pos[index[node]]
+            self.positions[node] = (float(x), float(y))
+        logger.info(f"Laid out {len(new_nodes)} new nodes ({n - len(new_nodes)} reused from cache).")
+
+    def save(self, path):
+        with self._lock:
+            data = {**self._saved, **{str(node): xy for node, xy in self.positions.items()}}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self._lock:
+            for name, xy in data.items():
+                self._saved[name] = tuple(xy)
+                # Forget a stale position of the same node so the loaded one is used
+                self.positions.pop(name, None)
+        return self
+
+
+def _neighbours(G, node):
+    if G.is_directed():
+        return list(G.predecessors(node)) + list(G.successors(node))
+    return list(G.neighbors(node))
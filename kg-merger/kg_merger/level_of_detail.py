@@ -0,0 +1,154 @@
+import logging
+from collections import defaultdict
+
+import networkx as nx
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_PREFIX = 'cluster:'
+OTHER_CLUSTER = CLUSTER_PREFIX + '*'
+
+
+def is_cluster(node_id):
+    return str(node_id).startswith(CLUSTER_PREFIX)
+
+
+def _as_values(value):
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def assign_clusters(G, method='degree'):
+    """
+    Assigns every node of G to a cluster with a stable cluster ID.
+
+    Args:
+        G (networkx.Graph): The graph to partition.
+        method (str): 'degree' attaches each node to its highest-degree neighbour (its hub),
+                      'community' uses label propagation communities.
+
+    Returns:
+        dict: Mapping from node ID to cluster ID.
+    """
+    degree = dict(G.degree())
+    if method == 'community':
+        undirected = G.to_undirected(as_view=True)
+        assignment = {}
+        for community in nx.community.label_propagation_communities(undirected):
+            cluster_id = CLUSTER_PREFIX + str(min(map(str, community)))
+            for node in community:
+                assignment[node] = cluster_id
+        return assignment
+    if method != 'degree':
+        raise ValueError(f"Unknown clustering method '{method}'.")
+
+    assignment = {}
+    for node in G.nodes():
+        neighbours = set(G.predecessors(node)) | set(G.successors(node)) if G.is_directed() else set(G.neighbors(node))
+        candidates = [node] + list(neighbours)
+        hub = max(candidates, key=lambda n: (degree[n], str(n)))
+        assignment[node] = CLUSTER_PREFIX + str(hub)
+    return assignment
+
+
+def summarize_graph(G, budget=500, method='degree', expanded=(), edge_budget=None):
+    """
+    Reduces a subgraph to at most `budget` rendered nodes.
+
+    The highest-degree nodes are kept as they are and the remaining nodes are collapsed into
+    at most budget // 4 cluster super-nodes, the smallest clusters sharing a catch-all
+    cluster. Clusters listed in `expanded` are never collapsed. Parallel edges
+    (including the ones created by collapsing) are aggregated into a single edge with a
+    'weight' count and the union of their attribute values.
+
+    Args:
+        G (networkx.Graph): The subgraph to summarize.
+        budget (int): Maximum number of nodes to render.
+        method (str): Clustering method passed to assign_clusters.
+        expanded (iterable of str): Cluster IDs whose members should be rendered individually.
+        edge_budget (int): Maximum number of edges to render. Defaults to 4 * budget.
+
+    Returns:
+        networkx.DiGraph: The summarized graph. Nodes carry 'label', 'kind' ('node' or
+        'cluster') and 'size'; cluster nodes also carry 'members'. Edge attributes are lists.
+    """
+    if edge_budget is None:
+        edge_budget = 4 * budget
+    expanded = set(expanded)
+
+    if G.number_of_nodes() <= budget:
+        keep = set(G.nodes())
+        assignment = {}
+    else:
+        assignment = assign_clusters(G, method)
+        keep = {node for node, cluster_id in assignment.items() if cluster_id in expanded}
+
+        # Bound the number of super-nodes; the smallest clusters share one catch-all cluster
+        max_clusters = max(1, budget // 4)
+        sizes = defaultdict(int)
+        for node, cluster_id in assignment.items():
+            if node not in keep:
+                sizes[cluster_id] += 1
+        if len(sizes) > max_clusters:
+            largest = set(sorted(sizes, key=lambda c: (-sizes[c], c))[:max_clusters - 1])
+            assignment = {
+                node: cluster_id if cluster_id in largest or node in keep else OTHER_CLUSTER
+                for node, cluster_id in assignment.items()
+            }
+            keep.update(node for node, cluster_id in assignment.items() if cluster_id in expanded)
+        cluster_count = len({cluster_id for node, cluster_id in assignment.items() if node not in keep})
+
+        # Leave room for the cluster super-nodes themselves
+        remaining = max(0, budget - len(keep) - cluster_count)
+        by_degree = sorted(
+            (node for node in G.nodes() if node not in keep),
+            key=lambda n: (-G.degree(n), str(n)),
+        )
+        keep.update(by_degree[:remaining])
+
+    def render_id(node):
+        return node if node in keep else assignment[node]
+
+    summary = nx.DiGraph()
+    members = defaultdict(list)
+    for node, data in G.nodes(data=True):
+        if node in keep:
+            summary.add_node(node, label=data.get('label', str(node)), kind='node', size=1)
+        else:
+            members[assignment[node]].append(node)
+    for cluster_id, cluster_members in members.items():
+        summary.add_node(
+            cluster_id,
+            label=f"{len(cluster_members)} nodes",
+            kind='cluster',
+            size=len(cluster_members),
+            members=sorted(cluster_members, key=str),
+        )
+
+    # Aggregate parallel edges between rendered endpoints
+    edge_values = {}
+    edge_weights = defaultdict(int)
+    for u, v, data in G.edges(data=True):
+        ru, rv = render_id(u), render_id(v)
+        if ru == rv and is_cluster(ru):
+            continue  # Edge internal to a collapsed cluster
+        key = (ru, rv)
+        edge_weights[key] += 1
+        values = edge_values.setdefault(key, {})
+        for attr, value in data.items():
+            bucket = values.setdefault(attr, {})
+            for item in _as_values(value):
+                bucket[item] = None  # Ordered set
+
+    heaviest = sorted(edge_weights, key=lambda key: -edge_weights[key])[:edge_budget]
+    for key in heaviest:
+        attrs = {attr: list(bucket) for attr, bucket in edge_values[key].items()}
+        summary.add_edge(*key, weight=edge_weights[key], **attrs)
+
+    if len(heaviest) < len(edge_weights) or members:
+        logger.info(
+            f"Summarized {G.number_of_nodes()} nodes / {G.number_of_edges()} edges into "
+            f"{summary.number_of_nodes()} nodes / {summary.number_of_edges()} edges."
+        )
+    return summary
@@ -1,7 +1,9 @@
+import hashlib
 import networkx as nx
-import pytest
 from networkx.drawing.nx_pydot import read_dot
 
+from kg_merger.instrumentation import stage
+
 def merge_graphs_old(graphs, attribute_separator='&&', graph_type=nx.MultiDiGraph):
     """
     Merges multiple graphs into a single graph by merging nodes with the same labels and concatenating
@@ -85,46 +87,85 @@ def merge_graphs_old(graphs, attribute_separator='&&', graph_type=nx.MultiDiGrap
     return merged_graph
 
 
-def merge_graphs(graphs, attribute_separator='&&', graph_type=nx.MultiDiGraph):
+def merged_node_id(label):
     """
-    Merges multiple graphs into a single graph by merging nodes with the same labels and concatenating
-    edge attributes when edges are merged.
+    Returns the fixed-width merged node ID of a (normalized) label.
+
+    The ID only depends on the label, so it stays the same when later batches mention the label again.
+    """
+    return hashlib.blake2b(label.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def provenance_table(merged_graph, attribute_separator='&&'):
+    """
+    Yields (merged_id, source_id) rows for a graph merged with id_scheme='hash'.
+    """
+    for merged_id, attrs in merged_graph.nodes(data=True):
+        source_ids = attrs.get('source_ids')
+        if source_ids:
+            for source_id in source_ids.split(attribute_separator):
+                yield merged_id, source_id
+
+
+def merge_edge_attributes(existing_attrs, attrs, attribute_separator='&&', skip=()):
+    """
+    Concatenates the attribute values of an edge onto those of the edge it is merged into, in place.
 
     Args:
-        graphs (list of networkx.Graph): List of graphs to merge.
-        attribute_separator (str): Separator to use when concatenating attributes.
-        graph_type (type): The NetworkX graph type to use for the merged graph (e.g., nx.Graph, nx.DiGraph).
+        skip (iterable of str): Attributes that are not concatenated, e.g. the label when merging by label.
 
     Returns:
-        networkx.Graph: The merged graph.
+        dict: The merged attributes, mapping each to the value it contributed.
     """
-    # Initialize the merged graph
-    merged_graph = graph_type()
+    merged = {}
+    for key, value in attrs.items():
+        if key in skip:
+            continue
+        if key in existing_attrs:
+            existing_attrs[key] += attribute_separator + value
+        else:
+            existing_attrs[key] = value
+        merged[key] = value
+    return merged
+
+
+def merge_edges_by_label(merged_graph, graphs, node_id_mapping, attribute_separator='&&', edge_index=None):
+    """
+    Merges the edges of graphs into merged_graph, merging only edges with the same relation.
 
-    # Step 1: Group node IDs by label
-    label_to_node_ids = {}
+    A dict keyed by (merged_u, merged_v, label) points at the merged edge of each relation, so
+    duplicates are found in O(1) without scanning the edges between a node pair. Edges with
+    different labels stay separate edges of the MultiDiGraph. The label of a merged edge is kept
+    as is, while its other attributes are concatenated.
+
+    Args:
+        edge_index (dict): Index returned by a previous call, to keep merging into the same graph.
+
+    Returns:
+        dict: The edge index, mapping (merged_u, merged_v, label) to the edge key.
+    """
+    if not merged_graph.is_multigraph():
+        raise ValueError("Merging edges by label requires a multigraph graph_type.")
+    if edge_index is None:
+        edge_index = {}
     for G in graphs:
-        for node_id, attrs in G.nodes(data=True):
-            label = attrs.get('label')
-            if label is None:
-                raise ValueError(f"Node {node_id} does not have a 'label' attribute.")
-            label_to_node_ids.setdefault(label, []).append(node_id)
-
-    # Step 2: Create merged nodes with concatenated IDs
-    label_to_merged_id = {}
-    for label, node_ids in label_to_node_ids.items():
-        merged_id = attribute_separator.join(sorted(node_ids))  # Sort for consistency
-        label_to_merged_id[label] = merged_id
-        merged_graph.add_node(merged_id, label=label)
-
-    # Step 3: Create a mapping from original node IDs to merged node IDs
-    node_id_mapping = {}
-    for label, node_ids in label_to_node_ids.items():
-        merged_id = label_to_merged_id[label]
-        for node_id in node_ids:
-            node_id_mapping[node_id] = merged_id
-
-    # Step 4: Merge edges
+        for u, v, attrs in G.edges(data=True):
+            merged_u = node_id_mapping[u]
+            merged_v = node_id_mapping[v]
+            index_key = (merged_u, merged_v, attrs.get('label'))
+            edge_key = edge_index.get(index_key)
+            if edge_key is None:
+                edge_index[index_key] = merged_graph.add_edge(merged_u, merged_v, **attrs)
+                continue
+            merge_edge_attributes(merged_graph[merged_u][merged_v][edge_key], attrs, attribute_separator, skip=('label',))
+    return edge_index
+
+
+def merge_edges_into_first(merged_graph, graphs, node_id_mapping, attribute_separator='&&'):
+    """
+    Merges the edges of graphs into merged_graph, merging every edge into the first existing edge
+    between the same nodes.
+    """
     for G in graphs:
         for u, v, attrs in G.edges(data=True):
             merged_u = node_id_mapping[u]
@@ -135,20 +176,142 @@ def merge_graphs(graphs, attribute_separator='&&', graph_type=nx.MultiDiGraph):
                 # Merge attributes with the first existing edge found
                 # Alternatively, you could decide to add a new edge or handle differently
                 for existing_key in existing_edges:
-                    # Merge attributes
-                    for key, value in attrs.items():
-                        if key in existing_edges[existing_key]:
-                            existing_edges[existing_key][key] += attribute_separator + value
-                        else:
-                            existing_edges[existing_key][key] = value
+                    merge_edge_attributes(existing_edges[existing_key], attrs, attribute_separator)
                     break  # Merge with the first edge found
             else:
                 # Add a new edge
                 merged_graph.add_edge(merged_u, merged_v, **attrs)
 
-    return merged_graph
+
+class GraphMerger:
+    """
+    Incremental counterpart of merge_graphs: graphs are added one at a time, e.g. while later
+    batches are still being parsed, and result() returns the same graph merge_graphs would.
+
+    Nodes and edges are merged on arrival into a working graph keyed by the (canonical) label,
+    which is the only stable key before all batches are seen; result() then assigns the
+    concatenated or hashed merged node IDs. A merger can be pickled to checkpoint a long merge;
+    the label_normalizer is not pickled and has to be set again after unpickling.
+    """
+
+    def __init__(self, attribute_separator='&&', graph_type=nx.MultiDiGraph, label_normalizer=None, id_scheme='concat', edge_merge='first'):
+        if id_scheme not in ('concat', 'hash'):
+            raise ValueError(f"Unknown id_scheme '{id_scheme}'.")
+        if edge_merge not in ('first', 'label'):
+            raise ValueError(f"Unknown edge_merge '{edge_merge}'.")
+        self.attribute_separator = attribute_separator
+        self.graph_type = graph_type
+        self.label_normalizer = label_normalizer
+        self.id_scheme = id_scheme
+        self.edge_merge = edge_merge
+        self.graph = graph_type()
+        if edge_merge == 'label' and not self.graph.is_multigraph():
+            raise ValueError("Merging edges by label requires a multigraph graph_type.")
+        self.graph_count = 0
+        self._label_to_node_ids = {}
+        self._label_to_originals = {}
+        self._canonical_labels = {}  # Normalize each distinct label only once
+        self._edge_index = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['label_normalizer'] = None
+        return state
+
+    def _canonical(self, label):
+        if self.label_normalizer is None:
+            return label
+        canonical = self._canonical_labels.get(label)
+        if canonical is None:
+            canonical = self._canonical_labels[label] = self.label_normalizer(label)
+        self._label_to_originals.setdefault(canonical, {})[label] = None
+        return canonical
+
+    def add_graph(self, G):
+        """
+        Merges the nodes and edges of one graph.
+        """
+        node_id_mapping = {}
+        for node_id, attrs in G.nodes(data=True):
+            label = attrs.get('label')
+            if label is None:
+                raise ValueError(f"Node {node_id} does not have a 'label' attribute.")
+            label = self._canonical(label)
+            node_ids = self._label_to_node_ids.get(label)
+            if node_ids is None:
+                node_ids = self._label_to_node_ids[label] = []
+                self.graph.add_node(label)
+            node_ids.append(node_id)
+            node_id_mapping[node_id] = label
+
+        if self.edge_merge == 'label':
+            merge_edges_by_label(self.graph, [G], node_id_mapping, self.attribute_separator, self._edge_index)
+        else:
+            merge_edges_into_first(self.graph, [G], node_id_mapping, self.attribute_separator)
+        self.graph_count += 1
+
+    def result(self):
+        """
+        Returns the merged graph with merged node IDs and attributes.
+
+        Raises:
+            ValueError: If two labels get the same merged node ID, e.g. a merged_node_id hash
+                collision, or source graphs reusing a node ID for different labels.
+        """
+        sep = self.attribute_separator
+        mapping = {}
+        labels_by_id = {}
+        for label, node_ids in self._label_to_node_ids.items():
+            joined_ids = sep.join(sorted(node_ids))  # Sort for consistency
+            merged_id = merged_node_id(label) if self.id_scheme == 'hash' else joined_ids
+            other = labels_by_id.setdefault(merged_id, label)
+            if other != label:
+                # relabel_nodes would silently merge the two nodes
+                raise ValueError(f"Labels '{other}' and '{label}' have the same merged node ID '{merged_id}'.")
+            mapping[label] = merged_id
+
+        merged_graph = nx.relabel_nodes(self.graph, mapping, copy=True)
+        for label, merged_id in mapping.items():
+            attrs = merged_graph.nodes[merged_id]
+            attrs['label'] = label
+            if self.id_scheme == 'hash':
+                attrs['source_ids'] = sep.join(sorted(self._label_to_node_ids[label]))
+            if self._label_to_originals:
+                # Keep the labels as they appeared in the batches as provenance
+                attrs['original_labels'] = sep.join(sorted(self._label_to_originals[label]))
+        return merged_graph
+
+
+@stage('merge', rows=lambda G: G.number_of_edges())
+def merge_graphs(graphs, attribute_separator='&&', graph_type=nx.MultiDiGraph, label_normalizer=None, id_scheme='concat', edge_merge='first'):
+    """
+    Merges multiple graphs into a single graph by merging nodes with the same labels and concatenating
+    edge attributes when edges are merged.
+
+    Args:
+        graphs (list of networkx.Graph): List of graphs to merge.
+        attribute_separator (str): Separator to use when concatenating attributes.
+        graph_type (type): The NetworkX graph type to use for the merged graph (e.g., nx.Graph, nx.DiGraph).
+        label_normalizer (callable): Optional canonicalization applied to each label before grouping,
+            e.g. synonym_transformer.LabelCanonicalizer. Nodes whose labels normalize to the same string
+            are merged, and the distinct original labels are kept in the 'original_labels' attribute.
+        id_scheme (str): 'concat' uses the joined source node IDs as merged node ID. 'hash' uses the
+            fixed-width merged_node_id of the label and keeps the joined source IDs in the 'source_ids'
+            attribute instead (see provenance_table).
+        edge_merge (str): 'first' merges every edge into the first existing edge between the same nodes.
+            'label' merges only edges with the same 'label' and keeps distinct relations as separate
+            edges (see merge_edges_by_label).
+
+    Returns:
+        networkx.Graph: The merged graph.
+    """
+    merger = GraphMerger(attribute_separator, graph_type, label_normalizer, id_scheme, edge_merge)
+    for G in graphs:
+        merger.add_graph(G)
+    return merger.result()
 
 
+@stage('clean', rows=lambda G: G.number_of_nodes() + G.number_of_edges())
 def clean_graph(G):
     """
     Cleans node names, all node attributes, and all edge attributes by removing surrounding quotes if present.
@@ -181,6 +344,7 @@ def clean_graph(G):
     
     return G
 
+@stage('parse', rows=lambda graphs: sum(G.number_of_nodes() + G.number_of_edges() for G in graphs))
 def load_dot_files(filenames):
     """
     Loads DOT files and cleans node names and labels.
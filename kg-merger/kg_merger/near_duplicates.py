@@ -0,0 +1,228 @@
+import json
+import logging
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used by the MinHash permutations; a * h + b stays below 2**64
+_PRIME = (1 << 31) - 1
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_label(label):
+    """
+    Normalizes a label for near-duplicate detection: NFKC (full/half width), case folding,
+    hiragana to katakana, and removal of punctuation and whitespace.
+    """
+    text = unicodedata.normalize('NFKC', label).casefold()
+    text = ''.join(chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c for c in text)
+    return _NON_WORD.sub('', text)
+
+
+def shingles(text, n=2):
+    """
+    Returns the set of character n-grams of text, padded so that short strings still
+    produce at least one shingle.
+    """
+    padded = f"^{text}$"
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = x
+        while self.parent.setdefault(root, root) != root:
+            root = self.parent[root]
+        while x != root:  # Path compression
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def minhash_signatures(shingle_sets, num_perm=64, seed=0, chunk_size=10000):
+    """
+    Computes MinHash signatures for a list of shingle sets.
+
+    Returns:
+        numpy.ndarray: Array of shape (len(shingle_sets), num_perm).
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+
+    for start in range(0, len(shingle_sets), chunk_size):
+        chunk = shingle_sets[start:start + chunk_size]
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) for shingle_set in chunk for s in shingle_set),
+            dtype=np.uint64,
+        )
+        offsets = np.cumsum([0] + [len(shingle_set) for shingle_set in chunk[:-1]])
+        permuted = (hashes[:, None] * a[None, :] + b[None, :]) % _PRIME
+        signatures[start:start + len(chunk)] = np.minimum.reduceat(permuted, offsets, axis=0)
+    return signatures
+
+
+def find_near_duplicates(labels, threshold=0.7, ngram=2, num_perm=64, bands=16, max_bucket_size=200, seed=0):
+    """
+    Groups labels that are likely variants of each other ("Cap." / "Cap" / "CAP", width or kana variants).
+
+    Labels are first normalized with normalize_label; labels with the same normalized form are
+    grouped directly. Labels that normalize to an empty string (only punctuation or whitespace)
+    carry nothing to compare and are never grouped. The distinct normalized forms are then blocked with MinHash LSH on their
+    character n-grams, and only pairs sharing an LSH bucket are scored by exact Jaccard similarity.
+    The run time is roughly linear in the number of labels.
+
+    Args:
+        labels (iterable of str or collections.Counter): Labels, optionally with occurrence counts.
+        threshold (float): Minimum n-gram Jaccard similarity of two normalized labels to group them.
+        ngram (int): Character n-gram size.
+        num_perm (int): Number of MinHash permutations. Must be divisible by bands.
+        bands (int): Number of LSH bands.
+        max_bucket_size (int): LSH buckets larger than this are skipped, as they carry no signal.
+        seed (int): Seed of the MinHash permutations.
+
+    Returns:
+        list of dict: Proposed merge groups, each with a 'representative' (most frequent label),
+        the 'labels' in the group and the lowest pairwise 'score' that joined it.
+    """
+    counts = labels if isinstance(labels, Counter) else Counter(labels)
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands.")
+
+    by_key = defaultdict(list)
+    skipped = 0
+    for label in counts:
+        key = normalize_label(label)
+        if not key:
+            skipped += 1
+            continue
+        by_key[key].append(label)
+    if skipped:
+        logger.info(f"Skipping {skipped} labels without letters or digits.")
+    keys = sorted(by_key)
+    key_shingles = [shingles(key, ngram) for key in keys]
+    logger.info(f"Blocking {len(counts)} labels ({len(keys)} normalized forms).")
+
+    union_find = _UnionFind()
+    accepted = []
+    if len(keys) > 1:
+        signatures = minhash_signatures(key_shingles, num_perm=num_perm, seed=seed)
+        rows = num_perm // bands
+        candidates = set()
+        for band in range(bands):
+            buckets = defaultdict(list)
+            band_bytes = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+            for index in range(len(keys)):
+                buckets[band_bytes[index].tobytes()].append(index)
+            for members in buckets.values():
+                if 1 < len(members) <= max_bucket_size:
+                    candidates.update(combinations(members, 2))
+        logger.info(f"Scoring {len(candidates)} candidate pairs.")
+
+        for i, j in candidates:
+            score = jaccard(key_shingles[i], key_shingles[j])
+            if score >= threshold:
+                union_find.union(i, j)
+                accepted.append((i, score))
+
+    # Lowest pairwise score that joined each group
+    group_scores = {}
+    for i, score in accepted:
+        root = union_find.find(i)
+        group_scores[root] = min(group_scores.get(root, 1.0), score)
+
+    grouped = defaultdict(list)
+    for index, key in enumerate(keys):
+        grouped[union_find.find(index)].append(key)
+
+    groups = []
+    for root, members in grouped.items():
+        group_labels = [label for key in members for label in by_key[key]]
+        if len(group_labels) < 2:
+            continue
+        group_labels.sort(key=lambda label: (-counts[label], label))
+        groups.append({
+            'representative': group_labels[0],
+            'labels': group_labels,
+            'score': round(group_scores.get(root, 1.0), 4),
+        })
+    groups.sort(key=lambda group: group['representative'])
+    return groups
+
+
+def collect_labels(graphs):
+    """
+    Counts node labels over a list of graphs.
+    """
+    counts = Counter()
+    for G in graphs:
+        for _, attrs in G.nodes(data=True):
+            label = attrs.get('label')
+            if label is not None:
+                counts[label] += 1
+    return counts
+
+
+def groups_to_normalizer(groups):
+    """
+    Turns (approved) merge groups into a label_normalizer for merge.merge_graphs, mapping
+    every label of a group to its representative.
+    """
+    mapping = {label: group['representative'] for group in groups for label in group['labels']}
+    return lambda label: mapping.get(label, label)
+
+
+def save_groups(groups, path):
+    """
+    Writes proposed merge groups as JSON for review in the console.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'groups': groups}, f, ensure_ascii=False, indent=2)
+
+
+def load_groups(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['groups']
+
+
+def main():
+    import argparse
+
+    from kg_merger.merge import load_dot_files
+
+    parser = argparse.ArgumentParser(description="Propose near-duplicate label merge groups for review.")
+    parser.add_argument('output', help="JSON file to write the proposed groups to.")
+    parser.add_argument('dot_files', nargs='+', help="Extracted graphs (DOT).")
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    groups = find_near_duplicates(collect_labels(load_dot_files(args.dot_files)), threshold=args.threshold)
+    save_groups(groups, args.output)
+    logger.info(f"Wrote {len(groups)} proposed merge groups to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Opt-in profiling of the kg-merger pipeline stages.
+
+The stages instrumented with kg_merger.instrumentation.stage (parse, clean, merge, export, load,
+query) can be profiled in place without changing code:
+
+    KG_MERGER_PROFILE=merge,load       Stages to profile, or 'all'.
+    KG_MERGER_PROFILE_DIR=profiles     Output directory (default 'profiles').
+    KG_MERGER_PROFILE_MODE=cprofile    'cprofile' (deterministic, default) or 'sample' (low overhead).
+    KG_MERGER_PROFILE_INTERVAL=0.005   Stack sampling interval in seconds.
+    KG_MERGER_PROFILE_MEMORY=1         Trace allocations with tracemalloc. On by default in cprofile
+                                       mode and off in sample mode, since tracing slows every
+                                       allocation down.
+
+Every profiled call writes to the output directory, named <stage>-<pid>-<n>.*:
+
+    .collapsed   Sampled stacks in collapsed format (flamegraph.pl, speedscope).
+    .alloc.txt   Top allocations by line from tracemalloc, with current and peak traced memory
+                 (when memory tracing is on).
+    .prof        cProfile statistics for pstats/snakeviz (cprofile mode only).
+    .txt         Top functions by cumulative time (cprofile mode only).
+
+Nested stages (clean inside parse) are covered by the outermost profiled stage.
+"""
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV_VAR = 'KG_MERGER_PROFILE'
+PROFILE_DIR_ENV_VAR = 'KG_MERGER_PROFILE_DIR'
+PROFILE_MODE_ENV_VAR = 'KG_MERGER_PROFILE_MODE'
+PROFILE_INTERVAL_ENV_VAR = 'KG_MERGER_PROFILE_INTERVAL'
+PROFILE_MEMORY_ENV_VAR = 'KG_MERGER_PROFILE_MEMORY'
+
+MODES = ('cprofile', 'sample')
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilingConfig:
+    def __init__(self, stages=(), directory='profiles', mode='cprofile', interval=0.005, memory=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}'. Expected one of {MODES}.")
+        self.stages = frozenset(stages)
+        self.directory = directory
+        self.mode = mode
+        self.interval = interval
+        self.memory = mode == 'cprofile' if memory is None else memory
+
+    def selects(self, stage):
+        return 'all' in self.stages or stage in self.stages
+
+    @classmethod
+    def from_env(cls):
+        stages = [s.strip() for s in os.getenv(PROFILE_ENV_VAR, '').split(',') if s.strip()]
+        memory = os.getenv(PROFILE_MEMORY_ENV_VAR)
+        return cls(
+            stages=stages,
+            directory=os.getenv(PROFILE_DIR_ENV_VAR, 'profiles'),
+            mode=os.getenv(PROFILE_MODE_ENV_VAR, 'cprofile'),
+            interval=float(os.getenv(PROFILE_INTERVAL_ENV_VAR, '0.005')),
+            memory=None if memory is None else memory.strip().lower() not in ('', '0', 'false', 'no'),
+        )
+
+
+_config = ProfilingConfig.from_env()
+_active = threading.local()
+_counter = itertools.count(1)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_owns_tracemalloc = False
+
+
+def configure(stages='all', directory='profiles', mode='cprofile', interval=0.005, memory=None):
+    """
+    Enables profiling of the given stages from code, e.g. behind a --profile flag.
+
+    Args:
+        stages (str or iterable of str): Stage names or 'all'.
+        directory (str): Output directory.
+        mode (str): 'cprofile' or 'sample'.
+        interval (float): Stack sampling interval in seconds.
+        memory (bool): Whether to trace allocations. Defaults to True in cprofile mode only.
+    """
+    global _config
+    if isinstance(stages, str):
+        stages = [s.strip() for s in stages.split(',') if s.strip()]
+    _config = ProfilingConfig(stages, directory, mode, interval, memory)
+
+
+def disable():
+    global _config
+    _config = ProfilingConfig()
+
+
+def is_enabled(stage=None):
+    """
+    Returns whether any stage, or the given stage, is selected for profiling.
+    """
+    if stage is None:
+        return bool(_config.stages)
+    return _config.selects(stage)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread at a fixed interval using sys._current_frames and counts
+    the collapsed stacks.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name='kg-merger-stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def format_allocations(snapshot, limit=TOP_ALLOCATIONS):
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"current traced memory: {current} bytes", f"peak traced memory: {peak} bytes", ""]
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    for index, stat in enumerate(snapshot.statistics('lineno')[:limit], 1):
+        frame = stat.traceback[0]
+        lines.append(f"#{index} {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+    return "\n".join(lines) + "\n"
+
+
+def format_functions(profiler, limit=TOP_FUNCTIONS):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _owns_tracemalloc
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            _owns_tracemalloc = not tracemalloc.is_tracing()
+            if _owns_tracemalloc:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _owns_tracemalloc:
+            tracemalloc.stop()
+
+
+@contextmanager
+def profile(stage):
+    """
+    Profiles the enclosed block as one call of stage if the stage is selected and no other
+    stage is being profiled in this thread; otherwise does nothing.
+    """
+    config = _config
+    if not config.selects(stage) or getattr(_active, 'stage', None) is not None:
+        yield
+        return
+
+    _active.stage = stage
+    os.makedirs(config.directory, exist_ok=True)
+    prefix = os.path.join(config.directory, f"{stage}-{os.getpid()}-{next(_counter)}")
+
+    if config.memory:
+        _start_tracemalloc()
+    sampler = StackSampler(threading.get_ident(), config.interval)
+    sampler.start()
+    profiler = cProfile.Profile() if config.mode == 'cprofile' else None
+    start = time.perf_counter()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Only one deterministic profiler can be active per process (e.g. another thread)
+            logger.warning(f"cProfile unavailable for stage '{stage}', only sampling: {e}")
+            profiler = None
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        allocations = None
+        if config.memory:
+            allocations = format_allocations(tracemalloc.take_snapshot())
+            _stop_tracemalloc()
+        _active.stage = None
+
+        with open(f"{prefix}.collapsed", 'w', encoding='utf-8') as f:
+            f.write(sampler.collapsed())
+        if allocations is not None:
+            with open(f"{prefix}.alloc.txt", 'w', encoding='utf-8') as f:
+                f.write(allocations)
+        if profiler is not None:
+            profiler.dump_stats(f"{prefix}.prof")
+            with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+                f.write(format_functions(profiler))
+        logger.info(f"Profiled stage '{stage}' ({elapsed:.3f}s); reports written to '{prefix}.*'.")
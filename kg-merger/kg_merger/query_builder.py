@@ -1,5 +1,3 @@
-from neo4j import GraphDatabase
-
 # Sample user input
 user_input = {
     'provider': ["A", "B"],
@@ -32,19 +30,26 @@ def build_dynamic_query(user_input):
     """
     return query, params
 
-# Build the query and parameters
-query, params = build_dynamic_query(user_input)
+def main():
+    from neo4j import GraphDatabase
+
+    # Build the query and parameters
+    query, params = build_dynamic_query(user_input)
+
+    # Connect to Neo4j and execute the query
+    driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "password"))
+
+    with driver.session() as session:
+        result = session.run(query, **params)
+        for record in result:
+            n = record["n"]
+            r = record["r"]
+            m = record["m"]
+            # Process or print the nodes and relationships
+            print(f"{n['Id']} -[{r.type()}]-> {m['Id']}")
 
-# Connect to Neo4j and execute the query
-driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "password"))
+    driver.close()
 
-with driver.session() as session:
-    result = session.run(query, **params)
-    for record in result:
-        n = record["n"]
-        r = record["r"]
-        m = record["m"]
-        # Process or print the nodes and relationships
-        print(f"{n['Id']} -[{r.type()}]-> {m['Id']}")
 
-driver.close()
+if __name__ == "__main__":
+    main()
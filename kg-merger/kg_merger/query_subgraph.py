@@ -1,24 +1,34 @@
 import os
-from neo4j import GraphDatabase, basic_auth
-from dotenv import load_dotenv
 import logging
 
-# Configure logging
-import logging
 import networkx as nx
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from kg_merger.backends import Neo4jBackend
+from kg_merger.instrumentation import stage
+
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
 
-# Retrieve configurations from environment variables
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+def neo4j_settings():
+    """
+    Configures logging, loads the .env file and returns (NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD).
+    Called by the command line entry points rather than at import time.
+    """
+    from dotenv import load_dotenv
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    return os.getenv("NEO4J_URI"), os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")
 
-def query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
+def _backend(neo4j_uri, neo4j_user, neo4j_password, driver=None, backend=None):
+    """
+    Returns the backend to query and whether the caller owns it and must close it.
+    """
+    if backend is not None:
+        return backend, False
+    return Neo4jBackend(neo4j_uri, neo4j_user, neo4j_password, driver=driver), True
+
+def query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password, backend=None):
     """
     Queries Neo4j to retrieve a subgraph based on user criteria.
     user_criteria: dict where keys are attribute names and values are lists of acceptable values.
@@ -28,60 +38,32 @@ def query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
             'provider': ['provider2'],
             'label': ['label1']
         }
+    backend: optional backends.GraphBackend to query instead of connecting to neo4j_uri.
     """
+    backend, owns_backend = _backend(neo4j_uri, neo4j_user, neo4j_password, backend=backend)
     try:
-        driver = GraphDatabase.driver(neo4j_uri, auth=basic_auth(neo4j_user, neo4j_password))
-        with driver.session() as session:
-            # Dynamically build the WHERE clause based on user criteria
-            where_clauses = []
-            for attr in user_criteria.keys():
-                where_clauses.append(f"ANY(val IN $criteria.{attr} WHERE val IN r.{attr})")
-
-            # Combine all conditions with OR
-            where_statement = " AND ".join(where_clauses)
-
-            # Final Cypher query
-            query = f"""
-                MATCH (a:Node)-[r:RELATED]->(b:Node)
-                WHERE {where_statement}
-                RETURN DISTINCT a.id AS from_id, a.label AS from_label,
-                                b.id AS to_id, b.label AS to_label,
-                                r.product AS products,
-                                r.provider AS providers,
-                                r.label AS labels
-            """
-
-            # Execute the query with parameters
-            logger.info(f"Executing subgraph query with criteria: {user_criteria}")
-            result = session.run(query, criteria=user_criteria)
-            
-            subgraph = {
-                "nodes": set(),
-                "relationships": []
+        # Execute the query with parameters
+        logger.info(f"Executing subgraph query with criteria: {user_criteria}")
+        records = backend.query_edges(user_criteria)
+
+        subgraph = {
+            "nodes": set(),
+            "relationships": []
+        }
+        for record in records:
+            from_node = {"id": record["from_id"], "label": record["from_label"]}
+            to_node = {"id": record["to_id"], "label": record["to_label"]}
+            relationship = {
+                "from": from_node,
+                "to": to_node,
+                "attributes": {attr: record.get(attr) for attr in user_criteria.keys()}
             }
-            record_count = 0
-            for record in result:
-                record_count += 1
-                from_node = {"id": record["from_id"], "label": record["from_label"]}
-                to_node = {"id": record["to_id"], "label": record["to_label"]}
-                relationship = {
-                    "from": from_node,
-                    "to": to_node,
-                    "attributes": {}
-                }
-
-                # Add dynamic attributes
-                for attr in user_criteria.keys():
-                    plural_attr = attr + "s" if not attr.endswith('s') else attr + "es"
-                    relationship["attributes"][attr] = record.get(plural_attr)
-
-                subgraph["nodes"].add((from_node["id"], from_node["label"]))
-                subgraph["nodes"].add((to_node["id"], to_node["label"]))
-                subgraph["relationships"].append(relationship)
-            
-            logger.info(f"Subgraph query returned {record_count} records.")
-
-        driver.close()
+
+            subgraph["nodes"].add((from_node["id"], from_node["label"]))
+            subgraph["nodes"].add((to_node["id"], to_node["label"]))
+            subgraph["relationships"].append(relationship)
+
+        logger.info(f"Subgraph query returned {len(records)} records.")
 
         # Convert nodes set to list of dicts
         subgraph["nodes"] = [{"id": nid, "label": nlabel} for nid, nlabel in sorted(subgraph["nodes"])]
@@ -91,10 +73,13 @@ def query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
     except Exception as e:
         logger.error(f"Error during subgraph querying: {e}")
         return None
-    
+    finally:
+        if owns_backend:
+            backend.close()
 
 
-def query_subgraph_nx(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
+@stage('query', rows=lambda G: G.number_of_edges())
+def query_subgraph_nx(user_criteria, neo4j_uri, neo4j_user, neo4j_password, driver=None, backend=None):
     """
     Queries Neo4j to retrieve a subgraph based on user criteria and returns it as a networkx.DiGraph.
     
@@ -109,72 +94,50 @@ def query_subgraph_nx(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
         neo4j_uri (str): URI for the Neo4j database.
         neo4j_user (str): Username for Neo4j authentication.
         neo4j_password (str): Password for Neo4j authentication.
+        driver (neo4j.Driver): Optional shared driver. It is left open for the caller to reuse.
+        backend (backends.GraphBackend): Optional backend to query instead of Neo4j, e.g. a
+                                         backends.InMemoryBackend.
     
     Returns:
         networkx.DiGraph: A directed graph representing the subgraph from Neo4j.
     """
+    backend, owns_backend = _backend(neo4j_uri, neo4j_user, neo4j_password, driver, backend)
     try:
         # Initialize the directed graph
         G = nx.DiGraph()
-        
-        # Connect to Neo4j
-        driver = GraphDatabase.driver(neo4j_uri, auth=basic_auth(neo4j_user, neo4j_password))
-        with driver.session() as session:
-            # Dynamically build the WHERE clause based on user criteria
-            where_clauses = []
+
+        # Execute the query with parameters
+        logger.info(f"Executing subgraph query with criteria: {user_criteria}")
+        records = backend.query_edges(user_criteria)
+
+        for record in records:
+            from_id = record["from_id"]
+            to_id = record["to_id"]
+
+            # Add nodes with attributes if they don't exist
+            if not G.has_node(from_id):
+                G.add_node(from_id, label=record["from_label"])
+            if not G.has_node(to_id):
+                G.add_node(to_id, label=record["to_label"])
+
+            # Prepare edge attributes based on user_criteria
+            edge_attributes = {}
             for attr in user_criteria.keys():
-                where_clauses.append(f"ANY(val IN $criteria.{attr} WHERE val IN r.{attr})")
-
-            # Combine all conditions with AND
-            where_statement = " AND ".join(where_clauses)
-
-            # Prepare the list of attributes to return directly (no pluralization)
-            return_attributes = ", ".join([f"r.{attr} AS {attr}" for attr in user_criteria.keys()])
-
-            # Final Cypher query
-            query = f"""
-                MATCH (a:Node)-[r:RELATED]->(b:Node)
-                WHERE {where_statement}
-                RETURN DISTINCT a.id AS from_id, a.label AS from_label,
-                                b.id AS to_id, b.label AS to_label,
-                                {return_attributes}
-            """
-
-            # Execute the query with parameters
-            logger.info(f"Executing subgraph query with criteria: {user_criteria}")
-            result = session.run(query, criteria=user_criteria)
-            
-            record_count = 0
-            for record in result:
-                record_count += 1
-                from_id = record["from_id"]
-                from_label = record["from_label"]
-                to_id = record["to_id"]
-                to_label = record["to_label"]
-                
-                # Add nodes with attributes if they don't exist
-                if not G.has_node(from_id):
-                    G.add_node(from_id, label=from_label)
-                if not G.has_node(to_id):
-                    G.add_node(to_id, label=to_label)
-                
-                # Prepare edge attributes based on user_criteria
-                edge_attributes = {}
-                for attr in user_criteria.keys():
-                    value = record.get(attr)
-                    if value is not None:
-                        edge_attributes[attr] = value
-
-                # Add edge with attributes
-                G.add_edge(from_id, to_id, **edge_attributes)
-            
-            logger.info(f"Subgraph query returned {record_count} records.")
+                value = record.get(attr)
+                if value is not None:
+                    edge_attributes[attr] = value
+
+            # Add edge with attributes
+            G.add_edge(from_id, to_id, **edge_attributes)
+
+        logger.info(f"Subgraph query returned {len(records)} records.")
     
     except Exception as e:
         logger.error(f"An error occurred while querying the subgraph: {e}")
         raise
     finally:
-        driver.close()
+        if owns_backend:
+            backend.close()
 
     return G
 
@@ -188,7 +151,7 @@ def main():
     }
 
     # Query the subgraph
-    subgraph = query_subgraph_nx(user_criteria, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    subgraph = query_subgraph(user_criteria, *neo4j_settings())
     if subgraph is None:
         logger.error("Subgraph querying failed. Exiting.")
         return
@@ -212,16 +175,15 @@ def main_nx():
         'label': ['label1','label3']
     }
     
-    neo4j_uri = NEO4J_URI
-    neo4j_user = NEO4J_USER
-    neo4j_password = NEO4J_PASSWORD
+    neo4j_uri, neo4j_user, neo4j_password = neo4j_settings()
     
     graph = query_subgraph_nx(user_criteria, neo4j_uri, neo4j_user, neo4j_password)
     
     # Visualize the graph using networkx (optional)
     import matplotlib.pyplot as plt
     
-    pos = nx.spring_layout(graph)
+    from kg_merger.layout import LayoutCache
+    pos = LayoutCache().layout(graph)
     labels = nx.get_node_attributes(graph, 'label')
     edge_labels = {(u, v): d for u, v, d in graph.edges(data=True)}
     
@@ -0,0 +1,247 @@
+"""
+Render-ready JSON snapshots of a graph for kg-console.
+
+A snapshot directory holds:
+
+- manifest.json: node and edge counts, the snapshot ETag, the source file it was built from,
+  and one entry per chunk, most important first. previous_chunks lists the chunks of the
+  previous snapshot that are kept, so clients still holding its manifest can finish loading.
+- chunks/<etag>.json: vis-network nodes and edges of one or more clusters. Chunks are named
+  by their content hash, so they never change and can be cached forever; only the manifest
+  has to be revalidated.
+- layout.json: node positions. The next snapshot reuses them, so the layout stays stable
+  across versions and only new nodes are laid out.
+
+Nodes and edges have the shape produced by kg-console's utils/graphlibToVis.js. Nodes also
+carry precomputed x/y positions, a rank (0 is the highest degree) and their cluster
+(level_of_detail.assign_clusters). Each edge is stored in the chunk of its source node.
+
+    python -m kg_merger.render_snapshot merged_graph.dot snapshot/
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+from kg_merger.layout import LayoutCache
+from kg_merger.level_of_detail import assign_clusters
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 'kg-render-snapshot/1'
+# Attributes added for rendering, which are not part of the graph
+RENDER_ATTRIBUTES = ('x', 'y', 'rank', 'cluster')
+LAYOUT_SCALE = 60
+DEFAULT_CHUNK_NODES = 2000
+MANIFEST_FILE = 'manifest.json'
+LAYOUT_FILE = 'layout.json'
+CHUNK_DIRECTORY = 'chunks'
+
+
+def encode(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def content_etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def node_ranks(G):
+    """
+    Ranks the nodes by descending degree, ties broken by ID.
+    """
+    degree = dict(G.degree())
+    ordered = sorted(G.nodes(), key=lambda node: (-degree[node], str(node)))
+    return {node: rank for rank, node in enumerate(ordered)}
+
+
+def vis_nodes(G, positions, ranks, clusters):
+    nodes = {}
+    for node_id, attrs in G.nodes(data=True):
+        x, y = positions[node_id]
+        nodes[node_id] = {
+            'id': str(node_id),
+            'label': attrs.get('label') or str(node_id),
+            **attrs,
+            'x': round(LAYOUT_SCALE * x, 2),
+            'y': round(LAYOUT_SCALE * y, 2),
+            'rank': ranks[node_id],
+            'cluster': clusters[node_id],
+        }
+    return nodes
+
+
+def vis_edges(G):
+    """
+    Yields (source, vis edge) pairs. Edges without an 'id' get edge0, edge1, ... in order.
+    """
+    counter = 0
+    for source, target, attrs in G.edges(data=True):
+        edge_id = attrs.get('id')
+        if not edge_id:
+            edge_id = f'edge{counter}'
+            counter += 1
+        yield source, {'id': edge_id, 'from': str(source), 'to': str(target), 'label': attrs.get('label') or '', **attrs}
+
+
+def pack_clusters(clusters, ranks, chunk_nodes=DEFAULT_CHUNK_NODES):
+    """
+    Groups the clusters into chunks of about chunk_nodes nodes, the most important clusters
+    (by their best-ranked member) first. A cluster is never split.
+
+    Returns:
+        list of list of str: The cluster IDs of each chunk.
+    """
+    members = {}
+    for node, cluster in clusters.items():
+        members.setdefault(cluster, []).append(node)
+    ordered = sorted(members, key=lambda cluster: min(ranks[node] for node in members[cluster]))
+
+    chunks, current, size = [], [], 0
+    for cluster in ordered:
+        current.append(cluster)
+        size += len(members[cluster])
+        if size >= chunk_nodes:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def source_signature(path):
+    """
+    Identifies the file a snapshot was built from. mtime_ns is a string because it does not
+    fit in a JavaScript number.
+    """
+    stat = os.stat(path)
+    return {'file': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': str(stat.st_mtime_ns)}
+
+
+def build_snapshot(G, directory, source=None, method='degree', chunk_nodes=DEFAULT_CHUNK_NODES):
+    """
+    Writes the render snapshot of G to directory and returns its manifest.
+
+    Args:
+        G (networkx.Graph): The graph to render.
+        directory (str): Snapshot directory. Chunks already present are reused as they are.
+        source (str): Path of the DOT file G was read from, recorded so readers can tell
+            whether the snapshot is up to date.
+        method (str): Clustering method passed to level_of_detail.assign_clusters.
+        chunk_nodes (int): Approximate number of nodes per chunk.
+
+    Returns:
+        dict: The manifest.
+    """
+    start = time.perf_counter()
+    chunk_directory = os.path.join(directory, CHUNK_DIRECTORY)
+    os.makedirs(chunk_directory, exist_ok=True)
+
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    previous = []
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)['chunks']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring the unreadable previous manifest '{manifest_path}': {e}")
+
+    layout_path = os.path.join(directory, LAYOUT_FILE)
+    layout = LayoutCache()
+    if os.path.exists(layout_path):
+        layout.load(layout_path)
+    positions = layout.layout(G)
+    ranks = node_ranks(G)
+    clusters = assign_clusters(G, method=method)
+    nodes = vis_nodes(G, positions, ranks, clusters)
+
+    edges_by_cluster = {}
+    for source_node, edge in vis_edges(G):
+        edges_by_cluster.setdefault(clusters[source_node], []).append(edge)
+    nodes_by_cluster = {}
+    for node_id in sorted(nodes, key=ranks.__getitem__):
+        nodes_by_cluster.setdefault(clusters[node_id], []).append(nodes[node_id])
+
+    entries = []
+    for chunk_clusters in pack_clusters(clusters, ranks, chunk_nodes):
+        chunk = {
+            'nodes': [node for cluster in chunk_clusters for node in nodes_by_cluster[cluster]],
+            'edges': [edge for cluster in chunk_clusters for edge in edges_by_cluster.get(cluster, [])],
+        }
+        data = encode(chunk)
+        etag = content_etag(data)
+        path = os.path.join(chunk_directory, f'{etag}.json')
+        if not os.path.exists(path):
+            write_atomic(path, data)
+        entries.append({
+            'etag': etag,
+            'file': f'{CHUNK_DIRECTORY}/{etag}.json',
+            'clusters': chunk_clusters,
+            'nodes': len(chunk['nodes']),
+            'edges': len(chunk['edges']),
+            'bytes': len(data),
+            'min_rank': chunk['nodes'][0]['rank'],
+        })
+
+    current = {entry['etag'] for entry in entries}
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'etag': content_etag(encode([entry['etag'] for entry in entries])),
+        'source': source_signature(source) if source else None,
+        'nodes': G.number_of_nodes(),
+        'edges': G.number_of_edges(),
+        'chunks': entries,
+        'previous_chunks': [{'etag': entry['etag'], 'file': entry['file']}
+                            for entry in previous if entry['etag'] not in current],
+    }
+    # The manifest is written last, so readers never see it refer to a missing chunk
+    write_atomic(manifest_path, encode(manifest))
+    layout.save(layout_path)
+
+    # Only chunks referenced by neither this nor the previous manifest are deleted
+    referenced = {f'{etag}.json' for etag in current} | {f'{entry["etag"]}.json' for entry in previous}
+    for name in os.listdir(chunk_directory):
+        if name.endswith('.json') and name not in referenced:
+            os.remove(os.path.join(chunk_directory, name))
+
+    logger.info(f"Snapshot of {manifest['nodes']} nodes and {manifest['edges']} edges written to '{directory}' "
+                f"in {len(entries)} chunks ({time.perf_counter() - start:.2f}s).")
+    return manifest
+
+
+def snapshot_dot_file(dot_file_path, directory, method='degree', chunk_nodes=DEFAULT_CHUNK_NODES):
+    """
+    Reads a DOT file and writes its render snapshot to directory.
+    """
+    import networkx as nx
+
+    from kg_merger.merge import clean_graph
+
+    G = clean_graph(nx.drawing.nx_pydot.read_dot(dot_file_path))
+    return build_snapshot(G, directory, source=dot_file_path, method=method, chunk_nodes=chunk_nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a render snapshot of a DOT file for kg-console.")
+    parser.add_argument('dot_file')
+    parser.add_argument('directory')
+    parser.add_argument('--method', choices=['degree', 'community'], default='degree', help="Clustering method.")
+    parser.add_argument('--chunk-nodes', type=int, default=DEFAULT_CHUNK_NODES, help="Approximate nodes per chunk.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    manifest = snapshot_dot_file(args.dot_file, args.directory, args.method, args.chunk_nodes)
+    print(json.dumps({key: manifest[key] for key in ('etag', 'nodes', 'edges')}))
+
+
+if __name__ == "__main__":
+    main()
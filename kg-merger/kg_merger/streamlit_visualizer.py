@@ -1,114 +1,88 @@
 import streamlit as st
-from streamlit_agraph import agraph, Node, Edge, Config
 import networkx as nx
-from neo4j import GraphDatabase, basic_auth
 import logging
+import os
+
+from kg_merger.facets import get_facet_catalogue
+from kg_merger.layout import LayoutCache
+from kg_merger.level_of_detail import is_cluster, summarize_graph
+from kg_merger.query_subgraph import query_subgraph_nx
 
 # Configure logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-
-def query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password):
-    """
-    Queries Neo4j to retrieve a subgraph based on user criteria and returns it as a networkx.DiGraph.
 
-    Parameters:
-        user_criteria (dict): Dictionary where keys are attribute names and values are lists of acceptable values.
-        neo4j_uri (str): URI for the Neo4j database.
-        neo4j_user (str): Username for Neo4j authentication.
-        neo4j_password (str): Password for Neo4j authentication.
-
-    Returns:
-        networkx.DiGraph: A directed graph representing the subgraph from Neo4j.
-    """
-    try:
-        # Initialize the directed graph
-        G = nx.DiGraph()
-        
-        # Connect to Neo4j
-        driver = GraphDatabase.driver(neo4j_uri, auth=basic_auth(neo4j_user, neo4j_password))
-        with driver.session() as session:
-            # Dynamically build the WHERE clause based on user criteria
-            where_clauses = []
-            for attr in user_criteria.keys():
-                where_clauses.append(f"ANY(val IN $criteria.{attr} WHERE val IN r.{attr})")
-
-            # Combine all conditions with AND
-            where_statement = " AND ".join(where_clauses)
-
-            # Prepare the list of attributes to return directly (no pluralization)
-            return_attributes = ", ".join([f"r.{attr} AS {attr}" for attr in user_criteria.keys()])
-
-            # Final Cypher query
-            query = f"""
-                MATCH (a:Node)-[r:RELATED]->(b:Node)
-                WHERE {where_statement}
-                RETURN DISTINCT 
-                    a.id AS from_id, 
-                    a.label AS from_label,
-                    b.id AS to_id, 
-                    b.label AS to_label,
-                    {return_attributes}
-            """
-
-            # Execute the query with parameters
-            logger.info(f"Executing subgraph query with criteria: {user_criteria}")
-            result = session.run(query, criteria=user_criteria)
-            
-            record_count = 0
-            for record in result:
-                record_count += 1
-                from_id = record["from_id"]
-                from_label = record["from_label"]
-                to_id = record["to_id"]
-                to_label = record["to_label"]
-                
-                # Add nodes with attributes if they don't exist
-                if not G.has_node(from_id):
-                    G.add_node(from_id, label=from_label)
-                if not G.has_node(to_id):
-                    G.add_node(to_id, label=to_label)
-                
-                # Prepare edge attributes based on user_criteria
-                edge_attributes = {}
-                for attr in user_criteria.keys():
-                    value = record.get(attr)
-                    if value is not None:
-                        edge_attributes[attr] = value
-
-                # Add edge with attributes
-                G.add_edge(from_id, to_id, **edge_attributes)
-            
-            logger.info(f"Subgraph query returned {record_count} records.")
-    
-    except Exception as e:
-        logger.error(f"An error occurred while querying the subgraph: {e}")
-        raise
-    finally:
-        driver.close()
+# Pixels per layout unit when precomputed positions are rendered
+LAYOUT_SCALE = 60
 
-    return G
+def edge_tooltip(data, max_values=10):
+    """
+    Builds the hover text of an edge from its attributes other than 'label'.
+    Long value lists are truncated to max_values entries.
+    """
+    # Extract other attributes to display on hover
+    tooltip_parts = []
+    for k, v in data.items():
+        if k == 'label':
+            continue
+        # Convert all other attribute values to strings, joining lists if necessary
+        if isinstance(v, list):
+            v_str = ', '.join(map(str, v[:max_values]))
+            if len(v) > max_values:
+                v_str += f", ... (+{len(v) - max_values})"
+        else:
+            v_str = str(v)
+        tooltip_parts.append(f"{k}: {v_str}")
+    return "; \n".join(tooltip_parts)
 
-def networkx_to_streamlit_agraph(G: nx.DiGraph):
+def networkx_to_streamlit_agraph(G: nx.DiGraph, budget=None, method='degree', expanded=(), tooltips=True, positions=None):
     """
     Transforms a networkx graph into nodes and edges compatible with streamlit_agraph.
 
     Parameters:
         G (networkx.DiGraph): The directed graph to transform.
+        budget (int): Optional render budget. Larger graphs are summarized with
+                      level_of_detail.summarize_graph into at most `budget` nodes.
+        method (str): Clustering method used when summarizing ('degree' or 'community').
+        expanded (iterable of str): Cluster IDs to render as individual nodes.
+        tooltips (bool): Whether to build edge tooltips. When False they can be built on
+                         demand with edge_tooltip for the element the user selects.
+        positions (dict): Optional precomputed node positions, e.g. from layout.LayoutCache.
+                          Cluster nodes are placed at the centroid of their members.
 
     Returns:
         tuple: A tuple containing two lists - nodes and edges.
     """
+    from streamlit_agraph import Edge, Node
+
+    if budget is not None:
+        G = summarize_graph(G, budget=budget, method=method, expanded=expanded)
+
     # Transform nodes
     nodes = []
     for node_id, data in G.nodes(data=True):
-        node = Node(
-            id=str(node_id),
-            label=data.get('label', str(node_id)),
-            size=20,  # Customize node size as needed
-            color='lightblue',  # Customize node color as needed
-            # Additional attributes can be added here
-        )
+        coordinates = {}
+        if positions is not None:
+            members = data.get('members', [node_id])
+            xs, ys = zip(*(positions[member] for member in members))
+            coordinates = {'x': LAYOUT_SCALE * sum(xs) / len(xs), 'y': LAYOUT_SCALE * sum(ys) / len(ys)}
+        if data.get('kind') == 'cluster':
+            node = Node(
+                id=str(node_id),
+                label=data.get('label', str(node_id)),
+                size=20 + min(data['size'], 100) // 5,  # Grow with the number of members
+                color='orange',
+                title="Cluster - click to expand",
+                **coordinates,
+            )
+        else:
+            node = Node(
+                id=str(node_id),
+                label=data.get('label', str(node_id)),
+                size=20,  # Customize node size as needed
+                color='lightblue',  # Customize node color as needed
+                # Additional attributes can be added here
+                **coordinates,
+            )
         nodes.append(node)
 
     # Transform edges
@@ -119,83 +93,185 @@ def networkx_to_streamlit_agraph(G: nx.DiGraph):
         if isinstance(edge_label, list):
             edge_label = ', '.join(edge_label)  # Convert list to string
 
-        # Extract other attributes to display on hover
-        other_attrs = {k: v for k, v in data.items() if k != 'label'}
-        if other_attrs:
-            # Convert all other attribute values to strings, joining lists if necessary
-            tooltip_parts = []
-            for k, v in other_attrs.items():
-                if isinstance(v, list):
-                    v_str = ', '.join(map(str, v))
-                else:
-                    v_str = str(v)
-                tooltip_parts.append(f"{k}: {v_str}")
-            tooltip = "; \n".join(tooltip_parts)
-        else:
-            tooltip = ""
-
         edge = Edge(
             source=str(source),
             target=str(target),
             label=edge_label,
-            title=tooltip,  # This attribute is used for tooltips
+            title=edge_tooltip(data) if tooltips else "",  # This attribute is used for tooltips
             color='gray',  # Customize edge color as needed
+            width=1 + min(data.get('weight', 1), 10) // 2,  # Aggregated edges are drawn thicker
             # Additional attributes like arrows, dashes, etc., can be added here
         )
         edges.append(edge)
 
     return nodes, edges
 
+@st.cache_resource
+def get_driver(neo4j_uri, neo4j_user, neo4j_password):
+    """
+    Returns a Neo4j driver shared by all reruns and sessions for the given credentials.
+    """
+    from neo4j import GraphDatabase, basic_auth
+
+    driver = GraphDatabase.driver(neo4j_uri, auth=basic_auth(neo4j_user, neo4j_password))
+    driver.verify_connectivity()
+    return driver
+
+@st.cache_resource
+def get_layout_cache():
+    """
+    Returns the node position cache shared by all sessions, so overlapping subgraphs keep
+    their layout and only new nodes are positioned.
+    """
+    return LayoutCache()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_data_version(neo4j_uri, neo4j_user, _driver):
+    """
+    Returns the version stamp written by load_csvs_into_neo4j, checked at most every 30 seconds.
+    """
+    with _driver.session() as session:
+        record = session.run("MATCH (m:DataVersion {name: 'kg'}) RETURN m.version AS version").single()
+    return record["version"] if record else None
+
+def canonical_criteria(user_criteria):
+    """
+    Returns a hashable form of user criteria that ignores key and value order and duplicates.
+    """
+    return tuple(sorted((attr, tuple(sorted(set(values)))) for attr, values in user_criteria.items()))
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_subgraph(criteria_key, data_version, neo4j_uri, neo4j_user, _driver):
+    """
+    Queries the subgraph for canonical criteria.
+    Results are cached per criteria and data version, so repeat views skip Neo4j entirely.
+    """
+    user_criteria = {attr: list(values) for attr, values in criteria_key}
+    return query_subgraph_nx(user_criteria, neo4j_uri, neo4j_user, None, driver=_driver)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_subgraph_elements(criteria_key, data_version, neo4j_uri, neo4j_user, _driver, budget, method, expanded):
+    """
+    Converts the cached subgraph to agraph nodes and edges for a render budget and set of
+    expanded clusters. Positions are precomputed server side so the client renders without
+    physics. Edge tooltips are left out and built on demand for the selection.
+    """
+    G = load_subgraph(criteria_key, data_version, neo4j_uri, neo4j_user, _driver)
+    positions = get_layout_cache().layout(G)
+    return networkx_to_streamlit_agraph(
+        G, budget=budget, method=method, expanded=expanded, tooltips=False, positions=positions,
+    )
+
+def facet_multiselect(catalogue, title, attribute, fallback_options, fallback_default):
+    """
+    Renders a sidebar multiselect whose options are the catalogued values of an attribute,
+    falling back to fixed options when no facet catalogue is available.
+    """
+    if catalogue is None or attribute not in catalogue.counts:
+        return st.sidebar.multiselect(title, options=fallback_options, default=fallback_default)
+    options = catalogue.values(attribute)
+    default = [value for value in fallback_default if value in options] or options[:1]
+    return st.sidebar.multiselect(
+        title,
+        options=options,
+        default=default,
+        format_func=lambda value: f"{value} ({catalogue.count(attribute, value)})",
+    )
+
 def visualize_subgraph():
+    from streamlit_agraph import Config, agraph
+
     st.header("Neo4j Subgraph Visualization with Streamlit AGraph")
     
     # Sidebar for user input
     st.sidebar.header("User Criteria")
-    product = st.sidebar.multiselect("Product", options=["a", "b", "c"], default=["a", "b"])
-    provider = st.sidebar.multiselect("Provider", options=["provider1", "provider2"], default=["provider2"])
-    label = st.sidebar.multiselect("Label", options=["label1", "label2"], default=["label1"])
+    # Filter options come from the precomputed facet catalogue when available
+    catalogue = get_facet_catalogue(os.getenv("FACETS_PATH", "facets.json"))
+    product = facet_multiselect(catalogue, "Product", "product", ["a", "b", "c"], ["a", "b"])
+    provider = facet_multiselect(catalogue, "Provider", "provider", ["provider1", "provider2"], ["provider2"])
+    label = facet_multiselect(catalogue, "Label", "label", ["label1", "label2"], ["label1"])
 
     user_criteria = {
         'product': product,
         'provider': provider,
         'label': label
     }
+    if catalogue is not None:
+        st.sidebar.caption(f"Estimated relationships: at most {catalogue.estimate_count(user_criteria)}")
 
     # Neo4j connection details (you might want to load these from environment variables or config)
     neo4j_uri = st.sidebar.text_input("Neo4j URI", "bolt://localhost:7687")
     neo4j_user = st.sidebar.text_input("Neo4j User", "neo4j")
     neo4j_password = st.sidebar.text_input("Neo4j Password", type="password")
 
+    # Level of detail for large subgraphs
+    budget = st.sidebar.slider("Render budget (nodes)", min_value=50, max_value=2000, value=300, step=50)
+    method = st.sidebar.selectbox("Cluster by", options=["degree", "community"])
+
+    criteria_key = canonical_criteria(user_criteria)
+
+    # Only query when the button is pressed. Other reruns re-render the last result
+    # as long as the criteria are unchanged.
     if st.sidebar.button("Query Subgraph"):
         with st.spinner("Querying Neo4j and generating graph..."):
             try:
-                # Query the subgraph
-                G = query_subgraph(user_criteria, neo4j_uri, neo4j_user, neo4j_password)
-
-                # Transform to streamlit_agraph format
-                nodes, edges = networkx_to_streamlit_agraph(G)
-
-                # Define the configuration for the graph visualization
-                config = Config(
-                    width=800,
-                    height=600,
-                    directed=True,
-                    nodeHighlightBehavior=True,
-                    node={"color": "lightblue", "size": 20},
-                    link={"color": "gray"},
-                    physics=True  # Enable physics for interactive layout
-                )
-
-                # Render the graph
-                agraph(
-                    nodes=nodes,
-                    edges=edges,
-                    config=config
-                )
+                driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
+                data_version = get_data_version(neo4j_uri, neo4j_user, driver)
+                load_subgraph(criteria_key, data_version, neo4j_uri, neo4j_user, driver)
+                st.session_state["subgraph"] = (criteria_key, data_version)
+                st.session_state["expanded_clusters"] = set()
                 st.success("Subgraph visualization complete!")
             except Exception as e:
                 st.error(f"An error occurred: {e}")
 
+    last_result = st.session_state.get("subgraph")
+    if last_result is not None and last_result[0] == criteria_key:
+        _, data_version = last_result
+        driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
+        expanded = st.session_state.setdefault("expanded_clusters", set())
+
+        # Transform to streamlit_agraph format within the render budget
+        nodes, edges = load_subgraph_elements(
+            criteria_key, data_version, neo4j_uri, neo4j_user, driver,
+            budget, method, tuple(sorted(expanded)),
+        )
+
+        # Define the configuration for the graph visualization
+        config = Config(
+            width=800,
+            height=600,
+            directed=True,
+            nodeHighlightBehavior=True,
+            node={"color": "lightblue", "size": 20},
+            link={"color": "gray"},
+            physics=False  # Positions are precomputed by the layout cache
+        )
+
+        # Render the graph
+        selected = agraph(
+            nodes=nodes,
+            edges=edges,
+            config=config
+        )
+
+        # Expand a cluster on click, otherwise show the selected node's edges
+        if selected and is_cluster(selected) and selected not in expanded:
+            expanded.add(selected)
+            st.rerun()
+        elif selected:
+            G = load_subgraph(criteria_key, data_version, neo4j_uri, neo4j_user, driver)
+            if selected in G:
+                with st.expander(f"Relationships of {G.nodes[selected].get('label', selected)}", expanded=True):
+                    # Incoming and outgoing relationships; self-loops are in both views
+                    edges = list(G.in_edges(selected, data=True))
+                    edges += [edge for edge in G.out_edges(selected, data=True) if edge[1] != selected]
+                    for source, target, data in edges:
+                        st.text(f"{G.nodes[source].get('label')} -> {G.nodes[target].get('label')}: {edge_tooltip(data)}")
+        if expanded and st.sidebar.button("Collapse clusters"):
+            expanded.clear()
+            st.rerun()
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     st.set_page_config(page_title="Graph Database Visualization", layout="wide")
     visualize_subgraph()
@@ -0,0 +1,212 @@
+"""
+同義語辞書のビルドとロード。
+
+JSON/CSV の辞書からシノニムマップと Aho–Corasick オートマトンをあらかじめコンパイルし、
+内容ハッシュでバージョン付けした成果物として保存します。ワーカーは成果物を読み込むだけで
+よく、長時間動くプロセスは HotReloadingDictionary で再起動せずに新しい版へ切り替えられます。
+
+使い方:
+    python -m kg_merger.synonym_dictionary build dictionary.json artifacts/
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from kg_merger.synonym_transformer import (
+    LabelCanonicalizer,
+    build_synonym_map,
+    compile_automaton,
+    replace_synonyms,
+)
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+ARTIFACT_FORMAT = 'synonyms-{version}.pickle'
+# 成果物の形式の版。CompiledDictionary やオートマトンの構造を変えたら上げてください。
+# 辞書の版に含まれるので、古い形式の成果物が同じ版として読み込まれることはありません。
+ARTIFACT_VERSION = 1
+
+
+def load_dictionary(path):
+    """
+    JSON または CSV の辞書を [{"word": ..., "synonyms": [...]}, ...] の形式で読み込みます。
+
+    CSV は word, synonym の 2 列(ヘッダー付き、1 行 1 シノニム)か、
+    ヘッダーなしで 1 行目が標準語、残りがシノニムの形式に対応します。
+    """
+    if str(path).endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = [row for row in csv.reader(f) if row]
+    if rows and [cell.strip().lower() for cell in rows[0][:2]] == ['word', 'synonym']:
+        grouped = {}
+        for word, synonym, *_ in rows[1:]:
+            grouped.setdefault(word.strip(), []).append(synonym.strip())
+        return [{"word": word, "synonyms": synonyms} for word, synonyms in grouped.items()]
+    return [{"word": row[0].strip(), "synonyms": [cell.strip() for cell in row[1:] if cell.strip()]} for row in rows]
+
+
+def dictionary_version(dictionary):
+    """
+    辞書からビルドしたシノニムマップの内容ハッシュをバージョンとして返します。
+
+    競合するシノニムは後勝ちなので、エントリの順序で結果が変わる場合は版も変わります。
+    ARTIFACT_VERSION も含めるので、成果物の形式が変わった場合も版が変わります。
+    """
+    canonical = [ARTIFACT_VERSION, sorted(build_synonym_map(dictionary).items())]
+    payload = json.dumps(canonical, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+class CompiledDictionary:
+    """
+    コンパイル済みの辞書。シノニムマップとオートマトンを保持します。
+    """
+
+    def __init__(self, version, synonym_map, matcher):
+        self.artifact_version = ARTIFACT_VERSION
+        self.version = version
+        self.synonym_map = synonym_map
+        self.matcher = matcher
+
+    def replace(self, text):
+        return replace_synonyms(text, self.matcher, self.synonym_map)
+
+    def canonicalizer(self):
+        """
+        この辞書を使う merge_graphs 用の LabelCanonicalizer を返します。
+        """
+        return LabelCanonicalizer(self.synonym_map, matcher=self.matcher)
+
+
+def compile_dictionary(dictionary):
+    synonym_map = build_synonym_map(dictionary)
+    return CompiledDictionary(dictionary_version(dictionary), synonym_map, compile_automaton(synonym_map))
+
+
+def save_compiled(compiled, directory):
+    """
+    成果物を保存し、CURRENT をその版に切り替えます。どちらの書き込みもアトミックです。
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, ARTIFACT_FORMAT.format(version=compiled.version))
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    current_path = os.path.join(directory, CURRENT_FILE)
+    tmp_path = f"{current_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(compiled.version)
+    os.replace(tmp_path, current_path)
+    logger.info(f"Synonym dictionary {compiled.version} saved to '{path}'.")
+    return path
+
+
+def current_version(directory):
+    with open(os.path.join(directory, CURRENT_FILE), 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def load_compiled(directory, version=None):
+    """
+    成果物を読み込みます。version を省略すると CURRENT の版を読み込みます。
+
+    形式の版が ARTIFACT_VERSION と異なる成果物は ValueError になります。辞書を build し直してください。
+    """
+    version = version or current_version(directory)
+    path = os.path.join(directory, ARTIFACT_FORMAT.format(version=version))
+    with open(path, 'rb') as f:
+        compiled = pickle.load(f)
+    artifact_version = getattr(compiled, 'artifact_version', None)
+    if artifact_version != ARTIFACT_VERSION:
+        raise ValueError(f"Synonym dictionary artifact '{path}' has format version {artifact_version}, "
+                         f"expected {ARTIFACT_VERSION}; rebuild it.")
+    return compiled
+
+
+def build(source_path, directory):
+    """
+    辞書ファイルをコンパイルして保存し、その版を返します。
+    """
+    compiled = compile_dictionary(load_dictionary(source_path))
+    save_compiled(compiled, directory)
+    return compiled.version
+
+
+class HotReloadingDictionary:
+    """
+    CURRENT を監視し、新しい版が保存されたら再起動なしで差し替える辞書。
+
+    確認は check_interval 秒に 1 回だけ行います。差し替えは参照の置き換えなので、
+    処理中の呼び出しは古い版のまま最後まで実行されます。
+    """
+
+    def __init__(self, directory, check_interval=5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._compiled = load_compiled(directory)
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.current.version
+
+    @property
+    def current(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._compiled
+
+    def reload(self):
+        """
+        CURRENT の版が変わっていれば読み込みます。切り替えた場合は True を返します。
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                version = current_version(self.directory)
+            except OSError as e:
+                logger.warning(f"Could not read the current synonym dictionary version: {e}")
+                return False
+            if version == self._compiled.version:
+                return False
+            try:
+                self._compiled = load_compiled(self.directory, version)
+            except ValueError as e:
+                logger.warning(f"Keeping synonym dictionary version {self._compiled.version}: {e}")
+                return False
+            logger.info(f"Switched synonym dictionary to version {version}.")
+            return True
+
+    def replace(self, text):
+        return self.current.replace(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile synonym dictionaries into versioned artifacts.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Compile a JSON/CSV dictionary and make it current.")
+    build_parser.add_argument('source', help="Dictionary file (.json or .csv).")
+    build_parser.add_argument('directory', help="Artifact directory.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'build':
+        print(build(args.source, args.directory))
+
+
+if __name__ == "__main__":
+    main()
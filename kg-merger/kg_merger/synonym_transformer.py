@@ -1,6 +1,8 @@
 import re
 import json
-from janome.tokenizer import Tokenizer
+import threading
+from functools import lru_cache
+from multiprocessing import Pool
 
 # サンプルの同義語辞書
 sample_dictionary = [
@@ -44,25 +46,267 @@ def compile_pattern_with_extended_boundaries(synonym_map):
     return pattern
 
 
+# 境界判定に使う文字種(漢字・ひらがな・カタカナ・英数字)
+BOUNDARY_CHARACTERS = "\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FFA-Za-z0-9"
+_boundary_char = re.compile(f"[{BOUNDARY_CHARACTERS}]")
+
+
+class _AutomatonMatch:
+    """
+    re.Match と同じ group/start/end を持つ軽量なマッチオブジェクト。
+    """
+    __slots__ = ("string", "_start", "_end")
+
+    def __init__(self, string, start, end):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def group(self, index=0):
+        if index not in (0, 1):
+            raise IndexError("no such group")
+        return self.string[self._start:self._end]
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+
+class SynonymAutomaton:
+    """
+    Aho–Corasick オートマトンによるシノニム検索。
+
+    正規表現の巨大な選択パターンと異なり、辞書サイズに関係なくテキスト長に線形な時間で
+    マッチします。各開始位置で最長のシノニムを優先する(長い順に並べた選択パターンと同じ)
+    左最長一致で、boundaries=True の場合は compile_pattern_with_extended_boundaries と
+    同じ前後の境界条件を満たすマッチだけを採用します。
+    sub/finditer を持つため replace_synonyms にそのまま渡せます。
+    """
+
+    def __init__(self, synonyms, boundaries=False):
+        self.boundaries = boundaries
+        self._goto = [{}]
+        self._fail = [0]
+        self._length = [0]       # この状態で終わるシノニムの長さ(なければ 0)
+        self._output_link = [0]  # 失敗リンクをたどって最初に出力を持つ状態
+        for synonym in synonyms:
+            if synonym:
+                self._add(synonym)
+        self._build_links()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._length.append(0)
+                self._output_link.append(0)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._length[state] = len(word)
+
+    def _build_links(self):
+        # 幅優先で失敗リンクと出力リンクを張る
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                if fail == child:
+                    fail = 0  # 深さ 1 の状態の失敗リンクはルート
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._length[fail] else self._output_link[fail]
+                queue.append(child)
+
+    def _longest_at(self, text):
+        """
+        開始位置ごとに条件を満たす最長マッチの終了位置を返します。
+        """
+        n = len(text)
+        longest = [0] * (n + 1)
+        goto, fail, length, output_link = self._goto, self._fail, self._length, self._output_link
+        boundaries = self.boundaries
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            end = i + 1
+            if boundaries and end < n and _boundary_char.match(text, end):
+                continue  # 後ろが単語の続きなのでこの位置で終わるマッチはない
+            out = state if length[state] else output_link[state]
+            while out:
+                start = end - length[out]
+                if end > longest[start] and not (boundaries and start > 0 and _boundary_char.match(text, start - 1)):
+                    longest[start] = end
+                out = output_link[out]
+        return longest
+
+    def finditer(self, text):
+        longest = self._longest_at(text)
+        position = 0
+        n = len(text)
+        while position < n:
+            end = longest[position]
+            if end:
+                yield _AutomatonMatch(text, position, end)
+                position = end
+            else:
+                position += 1
+
+    def sub(self, repl, text):
+        parts = []
+        last = 0
+        for match in self.finditer(text):
+            parts.append(text[last:match.start()])
+            parts.append(repl(match) if callable(repl) else repl)
+            last = match.end()
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return ''.join(parts)
+
+
+def compile_automaton(synonym_map, boundaries=True):
+    """
+    compile_pattern / compile_pattern_with_extended_boundaries の代わりに使える
+    Aho–Corasick オートマトンを作成します。大規模な辞書向けです。
+    """
+    return SynonymAutomaton(synonym_map.keys(), boundaries=boundaries)
+
+
 def replace_synonyms(text, pattern, synonym_map):
     # マッチしたシノニムを対応する標準語に置換
     return pattern.sub(lambda match: synonym_map[match.group(0)], text)
 
 
-def replace_synonyms_with_tokenizer(text, synonym_map):
+class LabelCanonicalizer:
+    """
+    ノードのラベルを標準語に正規化する merge_graphs 用の label_normalizer。
+
+    ラベル全体がシノニムであれば標準語に置き換え、そうでなければラベル内のシノニムを
+    境界付きで置換します。結果はラベルごとにメモ化されるため、同じインスタンスを
+    複数のバッチのマージに使い回すと、各ラベルの正規化は全体で 1 回だけになります。
+    """
+
+    def __init__(self, synonym_map, matcher=None):
+        self.synonym_map = synonym_map
+        self.matcher = matcher or compile_automaton(synonym_map, boundaries=True)
+        self._cache = {}
+
+    def __call__(self, label):
+        canonical = self._cache.get(label)
+        if canonical is None:
+            stripped = label.strip()
+            if stripped in self.synonym_map:
+                canonical = self.synonym_map[stripped]
+            else:
+                canonical = replace_synonyms(label, self.matcher, self.synonym_map)
+            self._cache[label] = canonical
+        return canonical
+
+    def __len__(self):
+        return len(self._cache)
+
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    プロセス内で共有する Tokenizer を返します。
+    システム辞書のロードは最初の呼び出しの 1 回だけです。
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from janome.tokenizer import Tokenizer
+
+                _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+def replace_synonyms_with_tokenizer(text, synonym_map, tokenizer=None):
     """
     形態素解析を使用して単語単位でシノニムを置換します。
     """
-    tokenizer = Tokenizer()
-    tokens = tokenizer.tokenize(text)
+    tokenizer = tokenizer or get_tokenizer()
+    # 表層形だけを使うので、品詞情報付きの Token を作らない分かち書きモードで解析する
+    surfaces = tokenizer.tokenize(text, wakati=True)
     replaced_tokens = []
-    for token in tokens:
-        surface = token.surface
+    for surface in surfaces:
         # シノニムマップに存在する場合は置換
         replaced = synonym_map.get(surface, surface)
         replaced_tokens.append(replaced)
     return ''.join(replaced_tokens)
 
+
+class TokenizingReplacer:
+    """
+    形態素解析によるシノニム置換を大量のテキストに適用するためのサービス。
+
+    共有の Tokenizer を使い、同じテキスト(ラベルなど)は繰り返し現れるため
+    置換結果をテキストごとにメモ化します。表層形ごとの置換は辞書を 1 回引くだけで、
+    コストのほとんどは形態素解析なので、解析を省けるテキスト単位でメモ化しています。replace_many は重複を除いてから処理し、
+    processes を指定すると大規模なコーパスをマルチプロセスで処理します。
+    """
+
+    def __init__(self, synonym_map, cache_size=100_000):
+        self.synonym_map = synonym_map
+        self.cache_size = cache_size
+        self.replace = lru_cache(maxsize=cache_size)(self._replace)
+
+    def _replace(self, text):
+        return replace_synonyms_with_tokenizer(text, self.synonym_map)
+
+    def replace_many(self, texts, processes=None, chunksize=256):
+        """
+        複数のテキストを置換し、入力と同じ順序で結果を返します。
+
+        Args:
+            texts (iterable of str): 置換するテキスト。
+            processes (int): ワーカープロセス数。None または 1 の場合は現在のプロセスで処理します。
+            chunksize (int): ワーカーに一度に渡すテキスト数。
+
+        Returns:
+            list of str: 置換後のテキスト。
+        """
+        texts = list(texts)
+        unique_texts = list(dict.fromkeys(texts))
+        if processes and processes > 1 and len(unique_texts) > chunksize:
+            with Pool(processes, initializer=_init_worker, initargs=(self.synonym_map, self.cache_size)) as pool:
+                replaced = dict(zip(unique_texts, pool.map(_replace_in_worker, unique_texts, chunksize=chunksize)))
+        else:
+            replaced = {text: self.replace(text) for text in unique_texts}
+        return [replaced[text] for text in texts]
+
+    def cache_info(self):
+        return self.replace.cache_info()
+
+
+_worker_replacer = None
+
+
+def _init_worker(synonym_map, cache_size):
+    # ワーカープロセスごとに 1 度だけ辞書をロードする
+    global _worker_replacer
+    _worker_replacer = TokenizingReplacer(synonym_map, cache_size=cache_size)
+    get_tokenizer()
+
+
+def _replace_in_worker(text):
+    return _worker_replacer.replace(text)
+
+
 def main():
     # シノニムマップの構築
     synonym_map = build_synonym_map(sample_dictionary)
@@ -70,6 +314,7 @@ def main():
     # 正規表現パターンのコンパイル
     pattern = compile_pattern(synonym_map)
     pattern_with_boundaries = compile_pattern_with_extended_boundaries(synonym_map)
+    automaton = compile_automaton(synonym_map, boundaries=True)
     
     # 置換したいテキスト
     text = "このデバイスの容量は重要です。誘電体厚もチェックしてください。Cは容量を表します。CapやCap.も使われます。"
@@ -77,11 +322,13 @@ def main():
     # シノニムの置換
     replaced_text = replace_synonyms(text, pattern, synonym_map)
     replaced_text_with_bouldary = replace_synonyms(text, pattern_with_boundaries, synonym_map)
+    replaced_text_with_automaton = replace_synonyms(text, automaton, synonym_map)
     replaced_text_with_tokenizer = replace_synonyms_with_tokenizer(text, synonym_map)
     
     print("元のテキスト:", text)
     print("置換後のテキスト:", replaced_text)
     print("置換後のテキスト(boundary):", replaced_text_with_bouldary)
+    print("置換後のテキスト(automaton):", replaced_text_with_automaton)
     print("置換後のテキスト(tokenizer):", replaced_text_with_tokenizer)
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+from kg_merger.backends import InMemoryBackend, Neo4jBackend
+from kg_merger.data_loader import dot_to_csv, load_csvs_into_neo4j
+from kg_merger.query_subgraph import query_subgraph, query_subgraph_nx
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+@pytest.fixture
+def backend(tmp_path):
+    nodes_csv, relationships_csv, facets = tmp_path / 'nodes.csv', tmp_path / 'relationships.csv', tmp_path / 'facets.json'
+    assert dot_to_csv(str(GRAPH_DIR / 'expected_graph.dot'), nodes_csv, relationships_csv, facets_path=facets)
+    backend = InMemoryBackend()
+    assert load_csvs_into_neo4j(nodes_csv, relationships_csv, None, None, None, facets_path=facets, backend=backend)
+    return backend
+
+
+def test_in_memory_backend_answers_the_subgraph_queries(backend):
+    G = query_subgraph_nx({'provider': ['Provider2', 'Provider_y'], 'label': ['EdgeAC', 'EdgeAB']}, None, None, None,
+                          backend=backend)
+
+    assert list(G.edges(data=True)) == [('uuid1___uuid3___uuid_a', 'uuid4___uuid6___uuid_c', {
+        'provider': ['Provider2', 'Provider_x'], 'label': ['EdgeAC', 'EdgeAC'],
+    })]
+    assert G.nodes['uuid4___uuid6___uuid_c'] == {'label': 'NodeC'}
+
+    subgraph = query_subgraph({'ref': ['Ref1', 'Ref Y']}, None, None, None, backend=backend)
+    assert [node['label'] for node in subgraph['nodes']] == ['NodeA', 'NodeB', 'NodeD']
+    assert subgraph['relationships'][0]['attributes'] == {'ref': ['Ref1']}
+
+    assert backend.query_edges({'provider': ['unknown']}) == []
+    assert len(backend.query_edges({})) == 4
+    assert backend.data_version() is not None
+    assert backend.facet_catalogue().count('provider', 'Provider3') == 1
+
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class FakeDriver:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.closed = False
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        return [FakeRecord(row) for row in self.rows]
+
+    def close(self):
+        self.closed = True
+
+
+def test_neo4j_backend_returns_the_same_rows_as_in_memory(backend):
+    criteria = {'provider': ['Provider1', 'Provider3']}
+    expected = backend.query_edges(criteria)
+    driver = FakeDriver(expected)
+
+    G = query_subgraph_nx(criteria, None, None, None, driver=driver)
+
+    query, params = driver.queries[0]
+    assert 'WHERE ANY(val IN $criteria.provider WHERE val IN r.provider)' in query
+    assert 'r.provider AS provider' in query and params == {'criteria': criteria}
+    assert G.number_of_edges() == 2
+    assert not driver.closed  # A shared driver is left open
+    assert Neo4jBackend(driver=driver).query_edges(criteria) == expected
@@ -0,0 +1,104 @@
+import json
+
+import networkx as nx
+import pytest
+
+from kg_merger.candidate import PublishedGraph, candidate_delta, generate_candidate
+from kg_merger.merge import merge_graphs, merged_node_id
+
+
+def make_graph(edges, labels):
+    G = nx.MultiDiGraph()
+    for node_id, label in labels.items():
+        G.add_node(node_id, label=label)
+    for u, v, attrs in edges:
+        G.add_edge(u, v, **attrs)
+    return G
+
+
+def published_graph():
+    G = make_graph(
+        [('a', 'b', {'label': 'has', 'provider': 'P1', 'id': 'edge0'})],
+        {'a': 'Device', 'b': 'Cap'},
+    )
+    return PublishedGraph(G)
+
+
+def test_delta_contains_only_new_nodes_edges_and_provenance():
+    batch = make_graph(
+        [
+            ('x1', 'x2', {'label': 'has', 'provider': 'P2'}),  # new provenance on an existing edge
+            ('x1', 'x3', {'label': 'measures', 'provider': 'P3'}),  # new edge to a new node
+        ],
+        {'x1': 'Device', 'x2': 'Cap', 'x3': 'Voltage'},
+    )
+
+    delta, stats = candidate_delta(published_graph(), [batch])
+
+    assert stats['new_nodes'] == 1 and stats['existing_nodes'] == 2
+    assert stats['new_edges'] == 1 and stats['updated_edges'] == 1
+    assert delta.nodes['a'] == {'label': 'Device', 'status': 'existing'}
+    assert delta.nodes['x3'] == {'label': 'Voltage', 'status': 'new'}  # The published graph uses 'concat' IDs
+
+    updated = list(delta.get_edge_data('a', 'b').values())
+    assert updated == [{'label': 'has___has', 'provider': 'P1___P2', 'added_label': 'has', 'added_provider': 'P2',
+                        'status': 'updated'}]
+
+
+@pytest.mark.parametrize('edge_merge', ['first', 'label'])
+def test_updated_edges_match_a_full_merge(edge_merge):
+    published = make_graph([('a', 'b', {'label': 'has', 'provider': 'P1'})], {'a': 'Device', 'b': 'Cap'})
+    batch = [
+        make_graph([('x1', 'x2', {'label': 'has', 'provider': 'P1'})], {'x1': 'Device', 'x2': 'Cap'}),
+        make_graph([('y1', 'y2', {'label': 'has', 'provider': 'P2'})], {'y1': 'Device', 'y2': 'Cap'}),
+    ]
+
+    delta, _ = candidate_delta(PublishedGraph(published, edge_merge=edge_merge), batch)
+
+    merged = merge_graphs([published] + batch, attribute_separator='___', edge_merge=edge_merge)
+    expected = [attrs for _, _, attrs in merged.edges(data=True)]
+    updated = [{key: value for key, value in attrs.items() if key != 'status' and not key.startswith('added_')}
+               for _, _, attrs in delta.edges(data=True)]
+    assert updated == expected
+
+
+def test_new_node_ids_follow_the_published_id_scheme():
+    batch = make_graph([('x1', 'x3', {'label': 'measures'})], {'x1': 'Device', 'x3': 'Voltage'})
+    published = merge_graphs([make_graph([('a', 'b', {'label': 'has'})], {'a': 'Device', 'b': 'Cap'})],
+                             attribute_separator='___', id_scheme='hash')
+
+    delta, stats = candidate_delta(PublishedGraph(published), [batch])
+
+    assert stats['id_scheme'] == 'hash'
+    assert delta.nodes[merged_node_id('Voltage')] == {'label': 'Voltage', 'source_ids': 'x3', 'status': 'new'}
+    assert delta.nodes[merged_node_id('Device')]['status'] == 'existing'
+    assert 'x3' in candidate_delta(PublishedGraph(published, id_scheme='concat'), [batch])[0]
+
+
+def test_edge_adding_only_its_merged_label_is_unchanged():
+    published = make_graph([('a', 'b', {'label': 'has', 'provider': 'P1'})], {'a': 'Device', 'b': 'Cap'})
+    batch = make_graph([('x1', 'x2', {'label': 'has'})], {'x1': 'Device', 'x2': 'Cap'})
+    delta, stats = candidate_delta(PublishedGraph(published, edge_merge='label'), [batch])
+    assert delta.number_of_nodes() == 0
+    assert stats['unchanged_edges'] == 1
+
+
+def test_generate_candidate_writes_dot_and_stats(tmp_path):
+    batch_directory = tmp_path / 'batch'
+    batch_directory.mkdir()
+    (batch_directory / 'kg.dot').write_text(
+        'digraph G { n1 [label="Device"]; n2 [label="Te\\"mp"]; n1 -> n2 [label="has", provider="P9"]; }',
+        encoding='utf-8',
+    )
+
+    stats = generate_candidate(str(batch_directory), published_graph())
+
+    candidate = nx.drawing.nx_pydot.read_dot(stats['path'])
+    assert candidate.number_of_nodes() == 2 and candidate.number_of_edges() == 1
+    saved = json.loads((batch_directory / 'kg_candidate_stats.json').read_text(encoding='utf-8'))
+    assert saved['new_edges'] == 1 and saved['batch_graphs'] == 1 and saved['edge_merge'] == 'first'
+    manifest = json.loads((batch_directory / 'snapshot' / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['etag'] == saved['snapshot_etag'] and manifest['source']['file'] == 'kg_candidate.dot'
+
+    # The candidate itself is not read back as an extracted graph
+    assert generate_candidate(str(batch_directory), published_graph())['batch_graphs'] == 1
@@ -0,0 +1,109 @@
+import importlib.util
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+WORKER_SCRIPT = Path(__file__).resolve().parents[2] / 'kg-console' / 'scripts' / 'generate_candidate.py'
+if not WORKER_SCRIPT.exists():
+    pytest.skip("kg-console is not checked out next to kg-merger", allow_module_level=True)
+
+spec = importlib.util.spec_from_file_location('generate_candidate', WORKER_SCRIPT)
+worker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(worker)
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate(self, batch_directory):
+        self.release.wait(5)
+        if batch_directory.endswith('broken'):
+            raise FileNotFoundError(f"Batch directory '{batch_directory}' does not exist.")
+        return {'path': f'{batch_directory}/kg_candidate.dot'}
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(workers=1, queue_size=4, root=None):
+        generator = FakeGenerator()
+        jobs = worker.JobQueue(generator, workers=workers, queue_size=queue_size)
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), worker.make_handler(jobs, root))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f'http://127.0.0.1:{httpd.server_address[1]}', jobs, generator
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def request(url, body=None, data=None):
+    if body is not None:
+        data = json.dumps(body).encode('utf-8')
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, method='POST' if data is not None else 'GET')) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_job_queue_runs_jobs_and_reports_failures():
+    jobs = worker.JobQueue(FakeGenerator(), workers=2)
+    done, failed = jobs.submit('/tmp/batch'), jobs.submit('/tmp/broken')
+
+    assert done.finished.wait(5) and failed.finished.wait(5)
+    assert done.status == 'done' and done.result == {'path': '/tmp/batch/kg_candidate.dot'}
+    assert failed.status == 'failed' and 'does not exist' in failed.error
+    assert jobs.get(done.id) is done
+
+
+def test_full_queue_rejects_jobs():
+    jobs = worker.JobQueue(FakeGenerator(), workers=0, queue_size=1)
+    jobs.submit('/tmp/batch')
+    with pytest.raises(worker.queue.Full):
+        jobs.submit('/tmp/batch')
+
+
+def test_parse_wait_clamps_and_rejects_invalid_values():
+    assert worker.parse_wait('') is None
+    assert worker.parse_wait('wait=2.5') == 2.5
+    assert worker.parse_wait('wait=1e9') == worker.MAX_WAIT
+    for query in ('wait=abc', 'wait=-1', 'wait=nan', 'wait=inf'):
+        with pytest.raises(ValueError):
+            worker.parse_wait(query)
+
+
+def test_submit_and_wait(server, tmp_path):
+    url, _, generator = server()
+
+    status, job = request(f'{url}/jobs?wait=5', {'batchDirectory': str(tmp_path)})
+    assert status == 200 and job['status'] == 'done'
+    assert request(f'{url}/jobs/{job["id"]}') == (200, job)
+
+    generator.release.clear()
+    status, job = request(f'{url}/jobs', {'batchDirectory': str(tmp_path)})
+    assert status == 202 and job['status'] in ('queued', 'running')
+    generator.release.set()
+
+
+def test_error_responses(server, tmp_path):
+    url, jobs, _ = server(workers=0, queue_size=1, root=str(tmp_path))
+
+    assert request(f'{url}/jobs/unknown')[0] == 404
+    assert request(f'{url}/jobs', data=b'not json')[0] == 400
+    assert request(f'{url}/jobs', {'batchDirectory': '/elsewhere'})[0] == 400
+    assert request(f'{url}/jobs?wait=abc', {'batchDirectory': str(tmp_path)})[0] == 400
+    assert jobs.health()['queued'] == 0  # Rejected requests do not queue a job
+
+    assert request(f'{url}/jobs', {'batchDirectory': str(tmp_path)})[0] == 202
+    assert request(f'{url}/jobs', {'batchDirectory': str(tmp_path)})[0] == 503
@@ -0,0 +1,215 @@
+import csv
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from kg_merger import cli
+from kg_merger.instrumentation import disable, enable, get_instrumentation
+from kg_merger.merge import load_dot_files, merge_graphs
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+GRAPHS = [str(GRAPH_DIR / f'graph{i}.dot') for i in (1, 2, 3)]
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+class RecordingLoader:
+    def __init__(self, fail=False):
+        self.items = []
+        self.fail = fail
+
+    def consume(self, load_queue, abort):
+        while True:
+            item = cli.get(load_queue, abort)
+            if item is cli.DONE:
+                return
+            if self.fail:
+                raise RuntimeError("load failed")
+            self.items.append(item)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_pipeline_matches_merge_graphs(tmp_path, workers):
+    out = tmp_path / 'out'
+    assert cli.main(GRAPHS + ['--out', str(out), '--parse-workers', str(workers), '--queue-size', '1']) == 0
+
+    expected = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___')
+    nodes = read_csv(out / 'nodes.csv')
+    assert {row['id']: row['label'] for row in nodes} == {n: attrs['label'] for n, attrs in expected.nodes(data=True)}
+    assert len(read_csv(out / 'relationships.csv')) == expected.number_of_edges()
+    assert json.loads((out / 'facets.json').read_text(encoding='utf-8'))['total_edges'] == expected.number_of_edges()
+
+
+def test_export_and_load_tees_rows_to_loader(tmp_path):
+    G = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___', id_scheme='hash')
+    loader = RecordingLoader()
+
+    counts = cli.export_and_load(G, tmp_path, loader=loader, batch_size=2)
+
+    kinds = [kind for kind, _ in loader.items]
+    assert kinds[-1] == 'facets'
+    assert sum(len(rows) for kind, rows in loader.items if kind == 'nodes') == counts['nodes']
+    assert sum(len(rows) for kind, rows in loader.items if kind == 'edges') == counts['relationships']
+    assert kinds.index('edges') > max(i for i, kind in enumerate(kinds) if kind == 'nodes')
+    assert counts['provenance'] == len(read_csv(tmp_path / 'provenance.csv'))
+
+
+def test_loader_failure_is_raised(tmp_path):
+    G = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___')
+    with pytest.raises(RuntimeError, match="load failed"):
+        cli.export_and_load(G, tmp_path, loader=RecordingLoader(fail=True), batch_size=1, queue_size=1)
+
+
+def test_resume_skips_merged_files_and_done_stages(tmp_path, caplog):
+    checkpoint = tmp_path / 'checkpoint'
+    out = tmp_path / 'out'
+    common = ['--out', str(out), '--parse-workers', '0', '--checkpoint-dir', str(checkpoint)]
+
+    assert cli.main(GRAPHS[:2] + common + ['--checkpoint-every', '1']) == 0
+    manifest = json.loads((checkpoint / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['stages'] == ['merged', 'exported']
+
+    # A finished run is not repeated
+    (out / 'nodes.csv').unlink()
+    assert cli.main(GRAPHS[:2] + common + ['--resume']) == 0
+    assert not (out / 'nodes.csv').exists()
+
+    # Options must match the checkpoint
+    assert cli.main(GRAPHS + common + ['--resume', '--id-scheme', 'hash']) == 1
+
+
+def test_resume_merges_new_files_and_rejects_other_inputs(tmp_path):
+    checkpoint = tmp_path / 'checkpoint'
+    out = tmp_path / 'out'
+    common = ['--out', str(out), '--parse-workers', '0', '--checkpoint-dir', str(checkpoint)]
+    assert cli.main(GRAPHS[:2] + common) == 0
+
+    # Files added after the merged ones are merged and the later stages redone
+    assert cli.main(GRAPHS + common + ['--resume']) == 0
+    expected = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___')
+    assert len(read_csv(out / 'relationships.csv')) == expected.number_of_edges()
+    manifest = json.loads((checkpoint / 'manifest.json').read_text(encoding='utf-8'))
+    assert list(manifest['files']) == GRAPHS and manifest['stages'] == ['merged', 'exported']
+
+    # Dropped or reordered inputs do not match the saved merge
+    assert cli.main(GRAPHS[1:] + common + ['--resume']) == 1
+    assert cli.main([GRAPHS[1], GRAPHS[0], GRAPHS[2]] + common + ['--resume']) == 1
+
+
+def test_resume_after_a_crash_between_checkpoint_writes_merges_each_file_once(tmp_path):
+    checkpoint = tmp_path / 'checkpoint'
+    common = ['--parse-workers', '0', '--checkpoint-dir', str(checkpoint)]
+    assert cli.main(GRAPHS + ['--out', str(tmp_path / 'expected')] + common) == 0
+
+    assert cli.main(GRAPHS[:2] + ['--out', str(tmp_path / 'out'), '--checkpoint-every', '1'] + common) == 0
+    # The merger was saved with two files, but the crash left the manifest of the first one
+    manifest_path = checkpoint / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    manifest['files'] = dict(list(manifest['files'].items())[:1])
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+
+    assert cli.main(GRAPHS + ['--out', str(tmp_path / 'out'), '--resume'] + common) == 0
+    assert read_csv(tmp_path / 'out' / 'relationships.csv') == read_csv(tmp_path / 'expected' / 'relationships.csv')
+
+
+@pytest.fixture
+def recorded():
+    instrumentation = get_instrumentation()
+    enable()
+    instrumentation.reset()
+    yield instrumentation
+    disable()
+    instrumentation.reset()
+
+
+def test_pipeline_stages_are_recorded(tmp_path, recorded):
+    out = tmp_path / 'out'
+    assert cli.main(GRAPHS + ['--out', str(out), '--parse-workers', '0']) == 0
+    stages = recorded.report()['stages']
+
+    expected = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___')
+    assert stages['merge']['calls'] == 1 and stages['merge']['rows'] == expected.number_of_edges()
+    assert stages['parse']['calls'] == len(GRAPHS)
+    assert stages['export']['rows'] == expected.number_of_nodes() + expected.number_of_edges()
+    assert stages['export']['bytes'] == (out / 'nodes.csv').stat().st_size + (out / 'relationships.csv').stat().st_size
+
+
+def test_resumed_merge_counts_only_new_edges(tmp_path, recorded):
+    common = ['--out', str(tmp_path / 'out'), '--parse-workers', '0', '--checkpoint-dir', str(tmp_path / 'checkpoint')]
+    assert cli.main(GRAPHS[:2] + common) == 0
+    recorded.reset()
+    assert cli.main(GRAPHS + common + ['--resume']) == 0
+    merge = recorded.report()['stages']['merge']
+
+    before = merge_graphs(load_dot_files(GRAPHS[:2]), attribute_separator='___').number_of_edges()
+    after = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___').number_of_edges()
+    assert merge['rows'] == after - before
+
+
+class FakeSession:
+    def __init__(self):
+        self.writes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query, **params):
+        pass
+
+    def execute_write(self, work):
+        self.writes += 1
+
+
+def test_neo4j_load_is_recorded(tmp_path, recorded, monkeypatch):
+    driver = types.SimpleNamespace(session=FakeSession, close=lambda: None)
+    neo4j = types.SimpleNamespace(GraphDatabase=types.SimpleNamespace(driver=lambda uri, auth: driver),
+                                  basic_auth=lambda user, password: None)
+    monkeypatch.setitem(sys.modules, 'neo4j', neo4j)
+    G = merge_graphs(load_dot_files(GRAPHS), attribute_separator='___')
+
+    counts = cli.export_and_load(G, tmp_path, loader=cli.Neo4jLoader('bolt://x', 'u', 'p'), batch_size=2)
+
+    load = recorded.report()['stages']['load']
+    assert load['calls'] == 1 and load['rows'] == counts['nodes'] + counts['relationships']
+
+
+def test_parse_workers_report_to_the_parent(tmp_path, recorded, monkeypatch):
+    metrics = tmp_path / 'metrics'
+    monkeypatch.setenv('KG_MERGER_METRICS', str(metrics))
+    assert cli.main(GRAPHS + ['--out', str(tmp_path / 'out'), '--parse-workers', '2']) == 0
+    parse = recorded.report()['stages']['parse']
+
+    graphs = load_dot_files(GRAPHS)
+    assert parse['calls'] == len(GRAPHS)
+    assert parse['rows'] == sum(G.number_of_nodes() + G.number_of_edges() for G in graphs)
+    assert not metrics.exists()  # The workers wrote no reports of their own
+
+
+def test_dry_run_reports_volumes_without_writing(tmp_path, capsys):
+    out = tmp_path / 'out'
+    assert cli.main([str(GRAPH_DIR / 'graph1.dot'), str(GRAPH_DIR / 'graph2.dot'), '--out', str(out), '--dry-run']) == 0
+
+    report = json.loads(capsys.readouterr().out)
+    assert report['totals']['files'] == 2
+    assert report['totals']['nodes'] == sum(G.number_of_nodes() for G in load_dot_files(GRAPHS[:2]))
+    assert report['totals']['edges'] == sum(G.number_of_edges() for G in load_dot_files(GRAPHS[:2]))
+    assert not out.exists()
+
+
+def test_snapshot_is_written_for_the_merged_graph(tmp_path):
+    dot_path, snapshot = tmp_path / 'merged.dot', tmp_path / 'snapshot'
+    assert cli.main(GRAPHS + ['--out', str(tmp_path / 'out'), '--parse-workers', '0',
+                              '--write-dot', str(dot_path), '--snapshot', str(snapshot)]) == 0
+
+    manifest = json.loads((snapshot / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['source']['file'] == 'merged.dot'
+    assert manifest['nodes'] == len(read_csv(tmp_path / 'out' / 'nodes.csv'))
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pytest
+
+from kg_merger.columnar_export import dot_to_columnar, load_npz
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+def test_npz_export_round_trips_list_columns(tmp_path):
+    nodes_path, edges_path = dot_to_columnar(str(GRAPH_DIR / 'expected_graph.dot'), tmp_path, format='npz')
+
+    nodes = load_npz(nodes_path)
+    assert sorted(nodes['label'].tolist()) == ['NodeA', 'NodeB', 'NodeC', 'NodeD']
+
+    edges = load_npz(edges_path)
+    row = edges['source'].tolist().index('uuid2___uuid5')
+    assert edges['provider'][row] == ['Provider3', 'Provider3_Duplicate']
+
+
+def test_parquet_export_uses_list_and_dictionary_columns(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    pc = pytest.importorskip('pyarrow.compute')
+    _, edges_path = dot_to_columnar(str(GRAPH_DIR / 'expected_graph.dot'), tmp_path, row_group_size=2)
+
+    parquet_file = pq.ParquetFile(edges_path)
+    assert parquet_file.metadata.num_row_groups == 2
+    table = pq.read_table(edges_path, columns=['source', 'provider'])
+    matches = table.filter(pc.greater(pc.list_value_length(table['provider']), 1))
+    assert matches.num_rows == 2
+    assert str(table.schema.field('provider').type) == 'list<element: dictionary<values=string, indices=int32, ordered=0>>'
@@ -0,0 +1,51 @@
+import csv
+import gzip
+from pathlib import Path
+
+import pytest
+
+from kg_merger.csv_writer import export_edges, write_csv
+from kg_merger.data_loader import dot_to_csv
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+def test_write_csv_streams_gzip_with_discovered_columns(tmp_path):
+    edges = ((f'n{i}', f'n{i + 1}', {'label': ['rel', 'other'], 'provider': f'"p{i}"'}) for i in range(25))
+    path = tmp_path / 'edges.csv.gz'
+
+    assert export_edges(edges, path, chunk_rows=10, sample_size=5) == 25
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ['source', 'target', 'label', 'provider']
+    assert rows[3] == {'source': 'n3', 'target': 'n4', 'label': 'rel___other', 'provider': 'p3'}
+
+
+def test_write_csv_rejects_columns_missing_from_sample(tmp_path):
+    rows = [{'id': 'a'}, {'id': 'b', 'extra': 'x'}]
+    path = tmp_path / 'nodes.csv'
+    path.write_text('id\nprevious\n', encoding='utf-8')
+    with pytest.raises(ValueError, match="extra"):
+        write_csv(rows, path, sample_size=1, chunk_rows=1)
+    assert path.read_text(encoding='utf-8') == 'id\nprevious\n'  # No partial file replaced the previous one
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_write_csv_can_drop_columns_missing_from_sample(tmp_path, caplog):
+    rows = [{'id': 'a'}, {'id': 'b', 'extra': 'x'}]
+    path = tmp_path / 'nodes.csv'
+    assert write_csv(rows, path, sample_size=1, extrasaction='ignore') == 2
+    assert path.read_text(encoding='utf-8').splitlines() == ['id', 'a', 'b']
+    assert "['extra']" in caplog.text
+
+
+def test_dot_to_csv_writes_unquoted_rows(tmp_path):
+    nodes_csv, relationships_csv = tmp_path / 'nodes.csv', tmp_path / 'relationships.csv'
+    assert dot_to_csv(str(GRAPH_DIR / 'expected_graph.dot'), nodes_csv, relationships_csv)
+
+    with open(relationships_csv, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    assert rows[1] == {'source': 'uuid1___uuid3___uuid_a', 'target': 'uuid4___uuid6___uuid_c',
+                       'label': 'EdgeAC___EdgeAC', 'provider': 'Provider2___Provider_x', 'ref': 'Ref2___Ref X'}
+    assert nodes_csv.read_text(encoding='utf-8').splitlines()[1] == 'uuid1___uuid3___uuid_a,NodeA'
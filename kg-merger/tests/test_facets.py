@@ -0,0 +1,44 @@
+import networkx as nx
+import pytest
+
+from kg_merger.facets import FacetCatalogue, get_facet_catalogue
+
+
+def build_graph():
+    G = nx.MultiDiGraph()
+    G.add_edge('A', 'B', label='label1___label2', product='a___b', provider='provider1')
+    G.add_edge('A', 'C', label='label3', product='c', provider='provider3')
+    G.add_edge('B', 'D', label='label2', product='b___b', provider='provider2')
+    return G
+
+
+def test_facet_counts_and_estimate():
+    catalogue = FacetCatalogue.from_graph(build_graph())
+
+    assert catalogue.facets() == ['label', 'product', 'provider']
+    assert catalogue.values('product') == ['b', 'a', 'c']
+    assert catalogue.count('product', 'b') == 2
+    assert catalogue.estimate_count({'product': ['a', 'c'], 'provider': ['provider3']}) == 1
+    assert catalogue.estimate_count({'product': ['x']}) == 0
+
+
+def test_facet_incremental_update_and_cached_load(tmp_path):
+    catalogue = FacetCatalogue.from_graph(build_graph())
+    catalogue.update_edge({'label': 'label3', 'provider': 'provider3'},
+                          {'label': 'label3', 'provider': 'provider3___provider4'})
+    catalogue.remove_edge({'label': 'label2', 'product': 'b___b', 'provider': 'provider2'})
+
+    assert catalogue.total_edges == 2
+    assert 'provider2' not in catalogue.values('provider')
+    assert catalogue.count('provider', 'provider4') == 1
+
+    path = tmp_path / 'facets.json'
+    catalogue.save(path)
+    loaded = get_facet_catalogue(str(path))
+    assert loaded.to_dict() == catalogue.to_dict()
+    assert get_facet_catalogue(str(path)) is loaded
+    with pytest.raises(TypeError):
+        loaded.add_edge({'provider': 'provider5'})  # The cached catalogue is shared
+    with pytest.raises(TypeError):
+        loaded.counts['provider']['provider5'] = 1
+    assert get_facet_catalogue(str(tmp_path / 'missing.json')) is None
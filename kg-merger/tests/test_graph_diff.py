@@ -0,0 +1,148 @@
+from pathlib import Path
+
+import networkx as nx
+
+from kg_merger.candidate import to_dot
+from kg_merger.facets import FacetCatalogue
+from kg_merger.graph_diff import apply_patch, apply_patch_to_neo4j, diff_dot_files, diff_graphs, graph_records
+from kg_merger.merge import clean_graph, load_dot_files, merge_graphs
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+def as_set(G):
+    return sorted(map(repr, graph_records(G)))
+
+
+def versions():
+    graphs = load_dot_files([GRAPH_DIR / f'graph{i}.dot' for i in (1, 2, 3, 4)])
+    old = merge_graphs(graphs[:2], attribute_separator='___', id_scheme='hash')
+    new = merge_graphs(graphs, attribute_separator='___', id_scheme='hash')
+    new.add_edge(*list(new.edges())[0], label='again')
+    new.add_edge(*list(new.edges())[0], label='again', provider='P')
+    return old, new
+
+
+def test_diff_graphs_round_trips_with_apply_patch():
+    old, new = versions()
+    patch = diff_graphs(old, new)
+
+    assert patch['stats']['edges_added'] > 0 and patch['stats']['nodes_changed'] > 0
+    assert as_set(apply_patch(old.copy(), patch)) == as_set(new)
+    assert as_set(apply_patch(new.copy(), diff_graphs(new, old))) == as_set(old)
+    assert diff_graphs(new, new)['stats']['edges_changed'] == 0
+
+
+def test_apply_patch_keeps_the_facet_catalogue_up_to_date():
+    old, new = versions()
+    for before, after in ((old, new), (new, old)):
+        facets = FacetCatalogue.from_graph(before)
+        apply_patch(before.copy(), diff_graphs(before, after), facets=facets)
+        assert facets.to_dict() == FacetCatalogue.from_graph(after).to_dict()
+
+
+def test_streaming_diff_matches_in_memory_diff(tmp_path):
+    old, new = versions()
+    old_path, new_path = tmp_path / 'old.dot', tmp_path / 'new.dot'
+    old_path.write_text(to_dot(old), encoding='utf-8')
+    new_path.write_text(to_dot(new), encoding='utf-8')
+
+    in_memory = diff_dot_files(old_path, new_path)
+    streaming = diff_dot_files(old_path, new_path, buckets=7, tmp_dir=tmp_path)
+
+    for kind in ('nodes', 'edges'):
+        for change in ('added', 'removed', 'changed'):
+            assert sorted(map(repr, in_memory[kind][change])) == sorted(map(repr, streaming[kind][change]))
+    applied = apply_patch(clean_graph(nx.drawing.nx_pydot.read_dot(old_path)), streaming)
+    assert as_set(applied) == as_set(new)
+    assert sorted(tmp_path.iterdir()) == sorted([old_path, new_path])  # Bucket files are removed
+
+
+def test_view_attributes_are_ignored():
+    old = nx.MultiDiGraph()
+    old.add_node('a', label='A', x='1')
+    new = nx.MultiDiGraph()
+    new.add_node('a', label='A', x='2')
+    assert diff_graphs(old, new)['stats']['nodes_changed'] == 0
+
+
+def test_pydot_edge_keys_are_not_data(tmp_path):
+    old, new = nx.MultiDiGraph(), nx.MultiDiGraph()
+    old.add_edge('a', 'b', label='x')
+    new.add_edge('a', 'b', label='y')
+    new.add_edge('a', 'b', label='x')
+    old_path, new_path = tmp_path / 'old.dot', tmp_path / 'new.dot'
+    nx.drawing.nx_pydot.write_dot(old, old_path)
+    nx.drawing.nx_pydot.write_dot(new, new_path)
+
+    patch = diff_dot_files(old_path, new_path)
+
+    assert patch['stats']['edges_added'] == 1 and patch['stats']['edges_changed'] == 0
+    applied = apply_patch(clean_graph(nx.drawing.nx_pydot.read_dot(old_path)), patch)
+    assert sorted(label for _, _, label in applied.edges(data='label')) == ['x', 'y']
+
+    reordered = nx.MultiDiGraph()
+    reordered.add_edge('a', 'b', label='x')
+    reordered.add_edge('a', 'b', label='y')
+    reordered_path = tmp_path / 'reordered.dot'
+    nx.drawing.nx_pydot.write_dot(reordered, reordered_path)
+    stats = diff_dot_files(new_path, reordered_path)['stats']
+    assert stats['edges_added'] == stats['edges_removed'] == stats['edges_changed'] == 0
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, query, **params):
+        self.calls.append((query, params))
+        return self
+
+    def consume(self):
+        pass
+
+
+def test_apply_patch_to_neo4j_batches_rows():
+    old, new = versions()
+    patch = diff_graphs(old, new)
+    session = RecordingSession()
+
+    apply_patch_to_neo4j(session, patch, separator='___', batch_size=2)
+
+    created = [params['rows'] for query, params in session.calls if 'CREATE (a)-[r:RELATED]->(b)' in query]
+    assert all(len(rows) <= 2 for rows in created)
+    assert sum(len(rows) for rows in created) == patch['stats']['edges_added']
+    assert isinstance(created[0][0]['properties']['label'], list)
+    assert 'DataVersion' in session.calls[-1][0]
+
+
+class FacetSession(RecordingSession):
+    def run(self, query, **params):
+        super().run(query, **params)
+        if 'DELETE r RETURN old' in query:
+            return [{'old': {'label': ['x'], 'provider': ['P1']}}]
+        if 'RETURN old, properties(r) AS new' in query:
+            return [{'old': {'label': ['y'], 'provider': ['P1']}, 'new': {'label': ['y'], 'provider': ['P1', 'P2']}}]
+        return self
+
+
+def test_apply_patch_to_neo4j_updates_the_stored_facets():
+    facets = FacetCatalogue()
+    facets.add_edge({'label': 'x', 'provider': 'P1'})
+    facets.add_edge({'label': 'y', 'provider': 'P1'})
+    patch = {
+        'format': 'kg-merger-patch/1',
+        'nodes': {'added': [], 'removed': [], 'changed': []},
+        'edges': {'added': [['a', 'c', {'label': 'z', 'provider': 'P3'}]],
+                  'removed': [['a', 'b', 'x', 0]],
+                  'changed': [['b', 'c', 'y', 0, {'provider': 'P1___P2'}, []]]},
+        'stats': {},
+    }
+    session = FacetSession()
+
+    apply_patch_to_neo4j(session, patch, separator='___', facets=facets)
+
+    assert facets.total_edges == 2
+    assert facets.to_dict()['facets'] == {'label': {'y': 1, 'z': 1}, 'provider': {'P1': 1, 'P2': 1, 'P3': 1}}
+    stored = next(params['rows'] for query, params in session.calls if 'CREATE (:Facet' in query)
+    assert {'attribute': 'provider', 'value': 'P2', 'count': 1} in stored
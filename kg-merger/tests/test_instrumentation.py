@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from kg_merger import instrumentation
+from kg_merger.data_loader import dot_to_csv
+from kg_merger.merge import load_dot_files, merge_graphs
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+@pytest.fixture
+def metrics():
+    recorder = instrumentation.get_instrumentation()
+    enabled = recorder.enabled
+    recorder.reset()
+    instrumentation.enable()
+    yield recorder
+    recorder.enabled = enabled
+    recorder.reset()
+
+
+def test_disabled_stage_records_nothing():
+    recorder = instrumentation.get_instrumentation()
+    enabled = recorder.enabled
+    instrumentation.disable()
+    recorder.reset()
+    try:
+        merge_graphs(load_dot_files([GRAPH_DIR / 'graph1.dot']))
+        with instrumentation.span('manual') as current:
+            current.count(rows=1)
+        assert recorder.stages == {}
+    finally:
+        recorder.enabled = enabled
+
+
+def test_pipeline_stages_are_recorded(metrics, tmp_path):
+    graphs = load_dot_files([GRAPH_DIR / f'graph{i}.dot' for i in (1, 2, 3)])
+    merged = merge_graphs(graphs)
+    assert dot_to_csv(GRAPH_DIR / 'graph1.dot', tmp_path / 'nodes.csv', tmp_path / 'relationships.csv')
+
+    report = metrics.report()
+    stages = report['stages']
+    assert stages['parse']['calls'] == 1
+    assert stages['clean']['calls'] == 3
+    assert stages['merge']['rows'] == merged.number_of_edges()
+    assert stages['export']['bytes'] > 0
+    assert stages['export']['rows'] > 0
+    assert stages['merge']['wall_time_seconds'] >= 0
+    assert report['peak_rss_bytes'] is None or report['peak_rss_bytes'] > 0
+    assert stages['merge']['peak_rss_growth_bytes'] is None or stages['merge']['peak_rss_growth_bytes'] >= 0
+
+
+def test_stage_records_its_peak_rss_growth(metrics):
+    if instrumentation.peak_rss_bytes() is None:
+        pytest.skip("resource is not available")
+    with instrumentation.span('grow'):
+        block = bytearray(instrumentation.peak_rss_bytes() + (64 << 20))
+        block[::4096] = b'x' * len(block[::4096])
+    with instrumentation.span('idle'):
+        pass
+    del block
+
+    stages = metrics.report()['stages']
+    assert stages['grow']['peak_rss_growth_bytes'] >= 64 << 20
+    assert stages['idle']['peak_rss_growth_bytes'] == 0
+
+
+def test_reports_in_json_and_prometheus_format(metrics, tmp_path):
+    with instrumentation.span('export') as current:
+        current.count(rows=10, bytes=2048, skipped=2)
+
+    json_path, prom_path = metrics.write_reports(tmp_path)
+    with open(json_path, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['stages']['export']['rows'] == 10
+    assert report['stages']['export']['counters'] == {'skipped': 2}
+
+    text = Path(prom_path).read_text(encoding='utf-8')
+    assert '# TYPE kg_merger_stage_rows_total counter' in text
+    assert f'kg_merger_stage_bytes_total{{stage="export",run_id="{metrics.run_id}"}} 2048' in text
+    assert 'counter="skipped"' in text
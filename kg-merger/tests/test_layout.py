@@ -0,0 +1,34 @@
+import networkx as nx
+
+from kg_merger.layout import LayoutCache
+
+
+def test_layout_reuses_cached_positions_for_overlapping_subgraphs():
+    G = nx.path_graph(30, create_using=nx.DiGraph)
+    cache = LayoutCache(iterations=20)
+    first = cache.layout(G)
+    assert len(first) == 30 and len(cache) == 30
+
+    H = G.subgraph(range(10)).copy()
+    H.add_edge(9, 'new')
+    second = cache.layout(H)
+
+    # Known nodes keep their position, only the new node is laid out
+    assert all(second[node] == first[node] for node in range(10))
+    assert 'new' in second and len(cache) == 31
+
+
+def test_saved_positions_are_reused_for_integer_node_ids(tmp_path):
+    G = nx.path_graph(10, create_using=nx.DiGraph)
+    cache = LayoutCache(iterations=20)
+    first = cache.layout(G)
+    cache.save(tmp_path / 'layout.json')
+
+    reloaded = LayoutCache(iterations=20).load(tmp_path / 'layout.json')
+    G.add_edge(9, 10)
+    second = reloaded.layout(G)
+
+    assert all(second[node] == first[node] for node in range(10))
+    assert len(reloaded) == 11
+    reloaded.save(tmp_path / 'layout.json')
+    assert len(LayoutCache().load(tmp_path / 'layout.json')) == 11
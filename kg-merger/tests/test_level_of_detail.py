@@ -0,0 +1,47 @@
+import networkx as nx
+
+from kg_merger.level_of_detail import OTHER_CLUSTER, is_cluster, summarize_graph
+
+
+def star_graph(leaves=50):
+    G = nx.DiGraph()
+    G.add_node('hub', label='Hub')
+    for i in range(leaves):
+        G.add_node(f'n{i}', label=f'Leaf {i}')
+        G.add_edge('hub', f'n{i}', label=['rel'], provider=[f'p{i % 3}'])
+    return G
+
+
+def test_small_graph_is_rendered_as_is():
+    G = star_graph(5)
+    summary = summarize_graph(G, budget=10)
+    assert set(summary.nodes()) == set(G.nodes())
+    assert all(data['weight'] == 1 for _, _, data in summary.edges(data=True))
+
+
+def test_large_graph_is_collapsed_within_budget_and_expandable():
+    G = star_graph(50)
+    summary = summarize_graph(G, budget=10)
+    assert summary.number_of_nodes() <= 10
+    clusters = [node for node in summary if is_cluster(node)]
+    assert clusters == ['cluster:hub']
+
+    # Parallel edges created by collapsing are aggregated
+    data = summary.get_edge_data('hub', 'cluster:hub')
+    assert data['weight'] == summary.nodes['cluster:hub']['size']
+    assert sorted(data['provider']) == ['p0', 'p1', 'p2']
+
+    expanded = summarize_graph(G, budget=10, expanded=clusters)
+    assert set(expanded.nodes()) == set(G.nodes())
+
+
+def test_many_small_clusters_stay_within_budget():
+    G = nx.DiGraph()
+    for i in range(200):
+        G.add_edge(f'a{i}', f'b{i}', label=['rel'])
+    summary = summarize_graph(G, budget=20)
+
+    assert summary.number_of_nodes() <= 20
+    clusters = [node for node in summary if is_cluster(node)]
+    assert len(clusters) <= 20 // 4 and OTHER_CLUSTER in clusters
+    assert sum(summary.nodes[node]['size'] for node in summary) == G.number_of_nodes()
@@ -0,0 +1,89 @@
+import pickle
+
+import networkx as nx
+import pytest
+
+from kg_merger.merge import GraphMerger, merge_graphs, merged_node_id, provenance_table
+from kg_merger.synonym_transformer import LabelCanonicalizer, build_synonym_map, sample_dictionary
+
+
+def make_graph(edges, labels):
+    G = nx.MultiDiGraph()
+    for node_id, label in labels.items():
+        G.add_node(node_id, label=label)
+    for u, v, attrs in edges:
+        G.add_edge(u, v, **attrs)
+    return G
+
+
+def test_merge_graphs_canonicalizes_synonym_labels():
+    g1 = make_graph([('u1', 'u2', {'label': 'has', 'provider': 'P1'})], {'u1': 'Device', 'u2': '容量'})
+    g2 = make_graph([('u3', 'u4', {'label': 'has', 'provider': 'P2'})], {'u3': 'Device', 'u4': 'Cap'})
+    canonicalizer = LabelCanonicalizer(build_synonym_map(sample_dictionary))
+
+    merged = merge_graphs([g1, g2], attribute_separator='___', label_normalizer=canonicalizer)
+
+    assert merged.number_of_nodes() == 2
+    assert merged.nodes['u2___u4'] == {'label': 'Cap', 'original_labels': 'Cap___容量'}
+    assert len(canonicalizer) == 3  # Each distinct label is normalized once
+
+
+def test_merge_graphs_hash_ids_are_compact_and_stable():
+    g1 = make_graph([('u1', 'u2', {'label': 'has'})], {'u1': 'Device', 'u2': 'Cap'})
+    g2 = make_graph([('u3', 'u4', {'label': 'has'})], {'u3': 'Device', 'u4': 'Voltage'})
+
+    first = merge_graphs([g1], attribute_separator='___', id_scheme='hash')
+    second = merge_graphs([g1, g2], attribute_separator='___', id_scheme='hash')
+
+    device_id = merged_node_id('Device')
+    assert len(device_id) == 16
+    assert device_id in first and device_id in second
+    assert second.nodes[device_id] == {'label': 'Device', 'source_ids': 'u1___u3'}
+    assert second.has_edge(device_id, merged_node_id('Voltage'))
+    assert [row for row in provenance_table(second, '___') if row[0] == device_id] == [(device_id, 'u1'), (device_id, 'u3')]
+
+
+def test_merged_node_id_collisions_are_detected(monkeypatch):
+    g1 = make_graph([('u1', 'u2', {'label': 'has'})], {'u1': 'Device', 'u2': 'Cap'})
+    monkeypatch.setattr('kg_merger.merge.merged_node_id', lambda label: 'same')
+    with pytest.raises(ValueError, match="'Device' and 'Cap'"):
+        merge_graphs([g1], id_scheme='hash')
+
+    # A node ID reused for another label in a later graph would collide as well
+    g2 = make_graph([], {'u1': 'Voltage'})
+    with pytest.raises(ValueError, match="merged node ID 'u1'"):
+        merge_graphs([make_graph([], {'u1': 'Device'}), g2])
+
+
+def test_merge_graphs_by_label_keeps_distinct_relations():
+    labels = {'u1': 'Device', 'u2': 'Cap'}
+    g1 = make_graph([('u1', 'u2', {'label': 'has', 'provider': 'P1'})], labels)
+    g2 = make_graph([('u1', 'u2', {'label': 'measures', 'provider': 'P2'}),
+                     ('u1', 'u2', {'label': 'has', 'provider': 'P3'})], labels)
+
+    merged = merge_graphs([g1, g2], attribute_separator='___', edge_merge='label')
+
+    edges = sorted(attrs.items() for _, _, attrs in merged.edges(data=True))
+    assert [dict(items) for items in edges] == [
+        {'label': 'has', 'provider': 'P1___P3'},
+        {'label': 'measures', 'provider': 'P2'},
+    ]
+
+
+def test_graph_merger_resumes_from_pickle():
+    g1 = make_graph([('u1', 'u2', {'label': 'has', 'provider': 'P1'})], {'u1': 'Device', 'u2': 'Cap'})
+    g2 = make_graph([('u3', 'u4', {'label': 'has', 'provider': 'P2'})], {'u3': 'Device', 'u4': 'Cap'})
+    canonicalizer = LabelCanonicalizer(build_synonym_map(sample_dictionary))
+
+    merger = GraphMerger('___', label_normalizer=canonicalizer)
+    merger.add_graph(g1)
+    resumed = pickle.loads(pickle.dumps(merger))
+    assert resumed.label_normalizer is None
+    resumed.label_normalizer = canonicalizer
+    resumed.add_graph(g2)
+
+    expected = merge_graphs([g1, g2], attribute_separator='___', label_normalizer=canonicalizer)
+    result = resumed.result()
+    assert resumed.graph_count == 2
+    assert dict(result.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert list(result.edges(data=True)) == list(expected.edges(data=True))
@@ -0,0 +1,29 @@
+from collections import Counter
+
+import networkx as nx
+
+from kg_merger.merge import merge_graphs
+from kg_merger.near_duplicates import find_near_duplicates, groups_to_normalizer, normalize_label
+
+
+def test_normalize_label_folds_width_case_kana_and_punctuation():
+    assert normalize_label('Cap.') == normalize_label('ＣＡＰ') == normalize_label(' cap ')
+    assert normalize_label('きゃぱ') == normalize_label('キャパ')
+
+
+def test_near_duplicate_groups_feed_merge_graphs():
+    labels = Counter({'Cap': 5, 'Cap.': 1, 'CAP': 2, 'Dielectric thickness': 3,
+                      'dielectric thicknes': 1, 'Voltage': 4})
+    groups = find_near_duplicates(labels + Counter({'...': 1, '-': 2, ' ': 1}))
+
+    assert [group['labels'] for group in groups] == [
+        ['Cap', 'CAP', 'Cap.'],
+        ['Dielectric thickness', 'dielectric thicknes'],
+    ]
+
+    G = nx.MultiDiGraph()
+    G.add_node('u1', label='Cap.')
+    G.add_node('u2', label='CAP')
+    G.add_edge('u1', 'u2', label='same')
+    merged = merge_graphs([G], attribute_separator='___', label_normalizer=groups_to_normalizer(groups))
+    assert list(merged.nodes(data='label')) == [('u1___u2', 'Cap')]
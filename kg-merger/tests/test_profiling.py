@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from kg_merger import profiling
+from kg_merger.instrumentation import stage
+from kg_merger.merge import load_dot_files
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    yield tmp_path
+    profiling.disable()
+
+
+@stage('busy')
+def busy(seconds):
+    data = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        data.append([0] * 100)
+    return data
+
+
+def test_selected_stage_writes_reports(profile_dir):
+    profiling.configure('busy', directory=profile_dir, interval=0.001)
+    busy(0.05)
+
+    names = sorted(path.name.split('.', 1)[1] for path in profile_dir.iterdir())
+    assert names == ['alloc.txt', 'collapsed', 'prof', 'txt']
+    collapsed = next(profile_dir.glob('*.collapsed')).read_text(encoding='utf-8')
+    assert 'test_profiling.py:busy' in collapsed
+    assert 'peak traced memory' in next(profile_dir.glob('*.alloc.txt')).read_text(encoding='utf-8')
+
+
+def test_sample_mode_skips_cprofile_and_tracemalloc(profile_dir):
+    profiling.configure('all', directory=profile_dir, mode='sample', interval=0.001)
+    busy(0.02)
+    assert [path.suffix for path in profile_dir.iterdir()] == ['.collapsed']
+    assert not tracemalloc.is_tracing()
+
+
+def test_sample_mode_traces_memory_on_request(profile_dir):
+    profiling.configure('all', directory=profile_dir, mode='sample', interval=0.001, memory=True)
+    busy(0.02)
+    assert sorted(path.name.split('.', 1)[1] for path in profile_dir.iterdir()) == ['alloc.txt', 'collapsed']
+
+
+def test_nested_stages_are_profiled_once(profile_dir):
+    profiling.configure('all', directory=profile_dir)
+    load_dot_files([GRAPH_DIR / 'graph1.dot', GRAPH_DIR / 'graph2.dot'])
+    assert [path.name.split('-')[0] for path in profile_dir.glob('*.prof')] == ['parse']
+
+
+def test_unselected_stage_is_not_profiled(profile_dir):
+    profiling.configure('merge', directory=profile_dir)
+    busy(0.01)
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        profiling.configure('all', mode='perf')
@@ -0,0 +1,72 @@
+import hashlib
+import json
+from pathlib import Path
+
+import networkx as nx
+
+from kg_merger.render_snapshot import build_snapshot, snapshot_dot_file
+
+GRAPH_DIR = Path(__file__).resolve().parent.parent / 'kg_merger' / 'graphs'
+
+
+def read_chunks(directory, manifest):
+    nodes, edges = [], []
+    for entry in manifest['chunks']:
+        data = (directory / entry['file']).read_bytes()
+        assert hashlib.sha256(data).hexdigest()[:32] == entry['etag']
+        chunk = json.loads(data)
+        nodes += chunk['nodes']
+        edges += chunk['edges']
+    return nodes, edges
+
+
+def test_snapshot_chunks_hold_every_node_and_edge_in_vis_format(tmp_path):
+    dot_path = GRAPH_DIR / 'expected_graph.dot'
+    manifest = snapshot_dot_file(str(dot_path), str(tmp_path), chunk_nodes=1)
+
+    assert manifest == json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['source'] == {'file': 'expected_graph.dot', 'size': dot_path.stat().st_size,
+                                  'mtime_ns': str(dot_path.stat().st_mtime_ns)}
+    assert manifest['nodes'] == 4 and manifest['edges'] == 4
+
+    nodes, edges = read_chunks(tmp_path, manifest)
+    assert sorted(node['rank'] for node in nodes) == [0, 1, 2, 3]
+    hub = next(node for node in nodes if node['rank'] == 0)
+    assert hub['id'] == 'uuid1___uuid3___uuid_a' and hub['label'] == 'NodeA'
+    assert {'x', 'y', 'cluster'} <= set(hub)
+    assert len(edges) == 4
+    assert {'id': 'edge0', 'from': 'uuid1___uuid3___uuid_a', 'to': 'uuid2___uuid5', 'label': 'EdgeAB',
+            'provider': 'Provider1', 'ref': 'Ref1'} in edges
+
+
+def star_graphs(leaves_of_b):
+    G = nx.MultiDiGraph()
+    for hub, count in (('a', 3), ('b', leaves_of_b)):
+        G.add_node(hub, label=hub.upper())
+        for i in range(count):
+            G.add_node(f'{hub}{i}', label=f'{hub.upper()}{i}')
+            G.add_edge(hub, f'{hub}{i}', label='has')
+    return G
+
+
+def test_rebuilding_reuses_layout_and_unchanged_chunks(tmp_path):
+    first = build_snapshot(star_graphs(2), str(tmp_path), chunk_nodes=1)
+    assert [entry['clusters'] for entry in first['chunks']] == [['cluster:a'], ['cluster:b']]
+    first_nodes = {node['id']: node for node in read_chunks(tmp_path, first)[0]}
+    assert build_snapshot(star_graphs(2), str(tmp_path), chunk_nodes=1)['etag'] == first['etag']
+
+    second = build_snapshot(star_graphs(3), str(tmp_path), chunk_nodes=1)
+
+    assert second['etag'] != first['etag']
+    assert second['chunks'][0]['etag'] == first['chunks'][0]['etag']
+    assert second['chunks'][1]['etag'] != first['chunks'][1]['etag']
+    # The replaced chunk is kept for clients of the previous manifest, for one more build
+    assert second['previous_chunks'] == [{'etag': first['chunks'][1]['etag'], 'file': first['chunks'][1]['file']}]
+    assert sorted(path.name for path in (tmp_path / 'chunks').iterdir()) == sorted(
+        f"{entry['etag']}.json" for entry in second['chunks'] + second['previous_chunks'])
+    third = build_snapshot(star_graphs(3), str(tmp_path), chunk_nodes=1)
+    assert third['previous_chunks'] == []
+    assert sorted(path.name for path in (tmp_path / 'chunks').iterdir()) == sorted(
+        f"{entry['etag']}.json" for entry in third['chunks'])
+    second_nodes = {node['id']: node for node in read_chunks(tmp_path, second)[0]}
+    assert (second_nodes['b']['x'], second_nodes['b']['y']) == (first_nodes['b']['x'], first_nodes['b']['y'])
@@ -0,0 +1,28 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ['neo4j', 'janome', 'pydot', 'matplotlib', 'streamlit', 'pytest', 'dotenv']
+
+
+@pytest.mark.parametrize('module', [
+    'kg_merger.cli',
+    'kg_merger.candidate',
+    'kg_merger.data_loader',
+    'kg_merger.graph_diff',
+    'kg_merger.query_subgraph',
+    'kg_merger.synonym_dictionary',
+])
+def test_import_has_no_heavy_dependencies_or_side_effects(module):
+    code = (
+        f"import json, logging, sys; import {module}; "
+        f"print(json.dumps([[m for m in {HEAVY_MODULES!r} if m in sys.modules], len(logging.getLogger().handlers), "
+        f"getattr(sys.modules.get('kg_merger.instrumentation'), '_exit_reports_registered', False)]))"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    loaded, root_handlers, exit_reports = json.loads(output.stdout)
+    assert loaded == []
+    assert root_handlers == 0  # logging is configured by the entry points, not on import
+    assert not exit_reports  # registered on the first recorded stage
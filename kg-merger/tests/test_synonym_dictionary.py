@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from kg_merger.synonym_dictionary import (
+    ARTIFACT_FORMAT,
+    HotReloadingDictionary,
+    build,
+    dictionary_version,
+    load_compiled,
+    load_dictionary,
+)
+from kg_merger.synonym_transformer import sample_dictionary
+
+
+def test_build_load_and_hot_reload(tmp_path):
+    source = tmp_path / 'dictionary.json'
+    source.write_text(json.dumps(sample_dictionary, ensure_ascii=False), encoding='utf-8')
+    artifacts = tmp_path / 'artifacts'
+
+    version = build(str(source), str(artifacts))
+    assert version == dictionary_version(sample_dictionary)
+    assert load_compiled(str(artifacts)).replace('容量') == 'Cap'
+
+    dictionary = HotReloadingDictionary(str(artifacts), check_interval=0)
+    assert dictionary.version == version
+
+    csv_source = tmp_path / 'dictionary.csv'
+    csv_source.write_text('word,synonym\n厚さ,厚み\n厚さ,膜厚\n', encoding='utf-8')
+    assert load_dictionary(str(csv_source)) == [{'word': '厚さ', 'synonyms': ['厚み', '膜厚']}]
+    new_version = build(str(csv_source), str(artifacts))
+
+    assert dictionary.replace('膜厚') == '厚さ'
+    assert dictionary.version == new_version != version
+
+
+def test_version_follows_the_built_map(tmp_path):
+    first = {'word': 'A', 'synonyms': ['x', 'y']}
+    second = {'word': 'B', 'synonyms': ['x']}
+    assert dictionary_version([first, second]) != dictionary_version([second, first])
+    assert dictionary_version([first, {'word': 'B', 'synonyms': ['z']}]) == dictionary_version(
+        [{'word': 'B', 'synonyms': ['z']}, first])
+
+    # A reordered dictionary that resolves differently is saved as a new artifact
+    source = tmp_path / 'dictionary.json'
+    source.write_text(json.dumps([first, second]), encoding='utf-8')
+    build(str(source), str(tmp_path / 'artifacts'))
+    source.write_text(json.dumps([second, first]), encoding='utf-8')
+    build(str(source), str(tmp_path / 'artifacts'))
+    assert load_compiled(str(tmp_path / 'artifacts')).synonym_map['x'] == 'A'
+
+
+def test_artifacts_of_another_format_are_not_loaded(tmp_path, monkeypatch):
+    source = tmp_path / 'dictionary.json'
+    source.write_text(json.dumps(sample_dictionary), encoding='utf-8')
+    artifacts = tmp_path / 'artifacts'
+    version = build(str(source), str(artifacts))
+    dictionary = HotReloadingDictionary(str(artifacts), check_interval=0)
+
+    # The format version is part of the dictionary version
+    monkeypatch.setattr('kg_merger.synonym_dictionary.ARTIFACT_VERSION', 2)
+    assert dictionary_version(sample_dictionary) != version
+
+    # An artifact pickled with another format under the same version is rejected
+    path = artifacts / ARTIFACT_FORMAT.format(version=version)
+    (artifacts / 'CURRENT').write_text('stale', encoding='utf-8')
+    path.rename(artifacts / ARTIFACT_FORMAT.format(version='stale'))
+    with pytest.raises(ValueError, match="format version 1"):
+        load_compiled(str(artifacts))
+    assert dictionary.version == version  # The running dictionary keeps its version
@@ -0,0 +1,47 @@
+import random
+
+from kg_merger.synonym_transformer import (
+    TokenizingReplacer,
+    build_synonym_map,
+    compile_automaton,
+    compile_pattern,
+    compile_pattern_with_extended_boundaries,
+    get_tokenizer,
+    replace_synonyms,
+    replace_synonyms_with_tokenizer,
+    sample_dictionary,
+)
+
+TEXT = "このデバイスの容量は重要です。誘電体厚もチェックしてください。Cは容量を表します。CapやCap.も使われます。"
+
+
+def test_automaton_matches_regex_backends_on_sample():
+    synonym_map = build_synonym_map(sample_dictionary)
+    for boundaries, pattern in ((False, compile_pattern(synonym_map)),
+                                (True, compile_pattern_with_extended_boundaries(synonym_map))):
+        automaton = compile_automaton(synonym_map, boundaries=boundaries)
+        assert replace_synonyms(TEXT, automaton, synonym_map) == replace_synonyms(TEXT, pattern, synonym_map)
+
+
+def test_automaton_matches_regex_backends_on_random_dictionaries():
+    rng = random.Random(0)
+    alphabet = 'abAB容量C.x '
+    for _ in range(500):
+        words = {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))}
+        synonym_map = {word: f'<{i}>' for i, word in enumerate(sorted(words))}
+        text = ''.join(rng.choice(alphabet) for _ in range(30))
+        for boundaries, pattern in ((False, compile_pattern(synonym_map)),
+                                    (True, compile_pattern_with_extended_boundaries(synonym_map))):
+            automaton = compile_automaton(synonym_map, boundaries=boundaries)
+            assert replace_synonyms(text, automaton, synonym_map) == replace_synonyms(text, pattern, synonym_map)
+
+
+def test_tokenizing_replacer_batches_and_memoizes():
+    synonym_map = build_synonym_map(sample_dictionary)
+    replacer = TokenizingReplacer(synonym_map)
+    texts = ['容量', 'Cの値', '容量']
+
+    assert replacer.replace_many(texts) == [replace_synonyms_with_tokenizer(text, synonym_map) for text in texts]
+    assert replacer.replace_many(texts) == ['Cap', 'Capの値', 'Cap']
+    assert replacer.cache_info().currsize == 2
+    assert get_tokenizer() is get_tokenizer()